@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+from argparse import ArgumentParser
+from statistics import median
+from time import perf_counter
+
+PROMPT = b'Enter your choice: '
+
+
+def time_to_first_prompt(script: str = 'main.py') -> float:
+    """
+    Starts the application and returns the number of seconds
+    until it asks for the first choice. The application is then
+    closed with the exit option.
+    """
+    env = dict(os.environ, PYTHONUNBUFFERED='1')
+    start = perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, script],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        env=env,
+    )
+    output = b''
+    while not output.endswith(PROMPT):
+        chunk = os.read(process.stdout.fileno(), 4096)
+        if not chunk:
+            process.wait()
+            raise RuntimeError(f'{script} exited before the first prompt')
+        output += chunk
+    elapsed = perf_counter() - start
+    process.communicate(b'3\n')
+    return elapsed
+
+
+def main():
+    parser = ArgumentParser(
+        description='Measure the time to the first prompt of the application.'
+    )
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--limit', type=float, default=None,
+                        help='fail if the median time (s) is above the limit')
+    args = parser.parse_args()
+    times = [time_to_first_prompt() for _ in range(args.runs)]
+    result = median(times)
+    print(f'Time to first prompt: {result * 1000:.1f} ms ' +
+          f'(median of {args.runs} runs, best {min(times) * 1000:.1f} ms).')
+    if args.limit is not None and result > args.limit:
+        sys.exit(f'Above the limit of {args.limit * 1000:.1f} ms.')
+
+
+if __name__ == "__main__":
+    main()
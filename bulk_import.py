@@ -0,0 +1,117 @@
+import csv
+import json
+from argparse import ArgumentParser
+from time import perf_counter
+from class_book import Book
+from class_library import Library
+from generate_id import allocate_ids, release_ids
+from errors import (
+    EmptyTitleError,
+    NoAuthorError,
+    NoReleaseYearError,
+    NoGenreError,
+    InvalidRowError,
+    InvalidReleaseYearError,
+)
+
+FIELDS = ('title', 'author', 'release_year', 'genre')
+
+ROW_ERRORS = (
+    EmptyTitleError,
+    NoAuthorError,
+    NoReleaseYearError,
+    NoGenreError,
+    InvalidRowError,
+    InvalidReleaseYearError,
+)
+
+
+def read_rows(path: str):
+    """
+    Yields the line number and the fields of every row of a CSV file
+    (with a header line) or of a JSON Lines file (.jsonl), read one line
+    at a time. Rows which cannot be read are yielded as None.
+    """
+    with open(path, newline='') as file_handle:
+        if path.endswith('.jsonl'):
+            for line_number, line in enumerate(file_handle, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    row = None
+                yield line_number, row if isinstance(row, dict) else None
+        else:
+            reader = csv.DictReader(file_handle)
+            for row in reader:
+                yield reader.line_num, row
+
+
+def book_from_row(row) -> Book:
+    """
+    Returns a new book (without an ID yet) with the fields of the row,
+    checked the same way as books added one at a time. The release
+    year has to be a whole number (or a string of digits).
+    """
+    if row is None:
+        raise InvalidRowError
+    values = {}
+    for field in FIELDS:
+        value = row.get(field)
+        values[field] = value.strip() if isinstance(value, str) else value
+    year = values["release_year"]
+    if year not in (None, ''):
+        if isinstance(year, str) and year.isdigit():
+            values["release_year"] = int(year)
+        elif isinstance(year, bool) or not isinstance(year, int) or \
+                year < 0:
+            raise InvalidReleaseYearError
+    return Book(None, **values)
+
+
+def import_books(path: str, library=None, dry_run: bool = False):
+    """
+    Imports the books of a CSV or JSON Lines file. The rows are checked
+    first, then the valid books get their IDs in one allocation and are
+    added to the library in a single write. Returns the number of books
+    imported and the list of rejected rows (line number and error).
+    The IDs are released again if the books cannot be saved.
+    """
+    books = []
+    errors = []
+    for line_number, row in read_rows(path):
+        try:
+            books.append(book_from_row(row))
+        except ROW_ERRORS as e:
+            errors.append((line_number, str(e)))
+    if books and not dry_run:
+        ids = allocate_ids('books.json', len(books))
+        books = [Book(id, book.title, book.author, book.release_year,
+                      book.genre) for id, book in zip(ids, books)]
+        try:
+            (library or Library()).add_new_books(books)
+        except Exception:
+            release_ids('books.json', ids)
+            raise
+    return len(books), errors
+
+
+def main():
+    parser = ArgumentParser(description='Import books from CSV or JSONL.')
+    parser.add_argument('file', help='CSV file with a header line or .jsonl')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='only check the rows')
+    args = parser.parse_args()
+    start = perf_counter()
+    count, errors = import_books(args.file, dry_run=args.dry_run)
+    elapsed = perf_counter() - start
+    for line_number, error in errors:
+        print(f'Line {line_number}: {error}')
+    action = 'checked' if args.dry_run else 'imported'
+    print(f'{count} books {action}, {len(errors)} rows rejected ' +
+          f'in {elapsed:.2f} s ({count / max(elapsed, 1e-9):.0f} books/s).')
+
+
+if __name__ == "__main__":
+    main()
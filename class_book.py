@@ -5,15 +5,36 @@ from errors import (
     NoGenreError,
     NegativeExtensionsError,
 )
-from datetime import date, timedelta, datetime
-from json_methods import read_json, write_json
+from array import array
+from datetime import date, timedelta
+from transaction import save_record
+
+# Number of days a book is lent for.
+LOAN_DAYS = 30
+
+
+def id_list(ids, compact: bool = False):
+    """
+    Returns the list of IDs, or with compact set, an array
+    of 64-bit integers taking a fraction of the memory.
+    """
+    ids = ids or []
+    return array('q', ids) if compact else ids
+
+
+def plain_list(ids) -> list:
+    """
+    Returns IDs kept in an array as a list, as saved in the data files.
+    """
+    return ids.tolist() if isinstance(ids, array) else ids
 
 
 class Book:
     """
     Book class representing a book in the library.
     Attributes:
-    - id: Unique identifier for the book (ID range: 1000 - 9999).
+    - id: Unique identifier for the book (ID range: 1000 - 2^63-1,
+      1000 - 9999 in the legacy ID space, see generate_id.id_ranges).
     - title: Title of the book.
     - author: Author of the book.
     - release_year: Release year of the book.
@@ -23,7 +44,21 @@ class Book:
     - extensions: Number of remaining extensions for the book.
     - reservations: List of user IDs who have reserved the book.
     - return_date: Date when the book is expected to be returned.
+    With compact set, loan_history and reservations are kept in arrays.
     """
+    __slots__ = (
+        '_id',
+        '_title',
+        '_author',
+        '_release_year',
+        '_genre',
+        '_loan_history',
+        '_current_owner',
+        '_extensions',
+        '_reservations',
+        '_return_date',
+    )
+
     def __init__(
             self,
             id: int,
@@ -36,6 +71,7 @@ class Book:
             extensions=0,
             reservations=None,
             return_date=None,
+            compact=False,
             ):
         if not title:
             raise EmptyTitleError
@@ -50,12 +86,10 @@ class Book:
         self._author = author
         self._release_year = release_year
         self._genre = genre
-        self._loan_history = loan_history or []
+        self._loan_history = id_list(loan_history, compact)
         self._current_owner = current_owner
         self._extensions = extensions
-        self._reservations = reservations or []
-        if return_date:
-            return_date = datetime.strptime(return_date, '%Y-%m-%d').date()
+        self._reservations = id_list(reservations, compact)
         self._return_date = return_date
 
     @property
@@ -96,21 +130,22 @@ class Book:
 
     @property
     def return_date(self):
+        """
+        Returns the return date. Dates read from the data files are
+        kept as ISO strings and parsed only on first access.
+        """
+        if isinstance(self._return_date, str):
+            self._return_date = date.fromisoformat(self._return_date)
         return self._return_date
 
     def dict_update(self):
         """
         Updates the book's information in the library's JSON database.
 
-        Reads the existing database, finds the book by ID, updates its
-        information, and writes the modified database back to the file.
+        Inside a transaction the change is staged and written together
+        with the other changes of the operation on commit.
         """
-        books = read_json("books.json")
-        for index, book_info in enumerate(books):
-            if book_info["id"] == self.id:
-                books[index].update(self.__dict__())
-                break
-        write_json('books.json', books)
+        save_record('books.json', self.__dict__())
 
     def set_extensions(self, new_extensions: int):
         """
@@ -166,10 +201,13 @@ class Book:
         self._loan_history.append(loan)
         self.dict_update()
 
-    def set_return_date(self, default=date.today() + timedelta(days=30)):
+    def set_return_date(self, default=LOAN_DAYS):
         """
-        Sets the return date for the book (default: 30 days from today).
+        Sets the return date for the book: a date, None, or a number
+        of days from today (default: 30 days from the day of the call).
         """
+        if isinstance(default, int):
+            default = date.today() + timedelta(days=default)
         self._return_date = (default if default else None)
         self.dict_update()
 
@@ -177,7 +215,7 @@ class Book:
         """
         Extends the return date of the book by 30 days.
         """
-        self._return_date += timedelta(days=30)
+        self._return_date = self.return_date + timedelta(days=30)
         self.dict_update()
 
     def borrow_info(self) -> str:
@@ -223,11 +261,11 @@ class Book:
             "author": self.author,
             "release_year": self.release_year,
             "genre": self.genre,
-            "loan_history": self.loan_history,
+            "loan_history": plain_list(self.loan_history),
             "current_owner": self.current_owner,
             "extensions": self.extensions,
-            "reservations": self.reservations,
-            "return_date": self.return_date
+            "reservations": plain_list(self.reservations),
+            "return_date": self._return_date
         }
 
     def list_info(self):
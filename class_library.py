@@ -1,8 +1,27 @@
-from json_methods import read_json, write_json
+from json_methods import (
+    read_json,
+    insert_record,
+    delete_record,
+    add_listener,
+    data_version,
+    write_json,
+    lock_files,
+    find_record,
+)
+from generate_id import release_id
 from class_book import Book
 from class_user import User, Librarian
-from datetime import date
+from datetime import date, timedelta
+from functools import wraps
+from threading import Lock, RLock
 from print_methods import red, green
+from indexes import (
+    IdIndex,
+    InvertedIndex,
+    FacetIndex,
+    DueDateIndex,
+    CountIndex,
+)
 from errors import (
     NoBookIDError,
     NoUserIDError,
@@ -22,15 +41,79 @@ from errors import (
 )
 
 
+COLLECTIONS = ('books', 'users', 'librarians')
+
+SEARCH_FIELDS = ('title', 'author', 'genre', 'release_year')
+
+INDEX_TYPES = {
+    'ids': IdIndex,
+    'search': lambda: InvertedIndex(SEARCH_FIELDS),
+    'genre': lambda: FacetIndex('genre'),
+    'author': lambda: FacetIndex('author'),
+    'release_year': lambda: FacetIndex('release_year', str),
+    'due': DueDateIndex,
+    'loans': lambda: CountIndex('loan_history'),
+    'borrowings': lambda: CountIndex('borrowing_history'),
+}
+
+FACET_ERRORS = {
+    'genre': (GenresNotFoundError, UnavailableGenreError),
+    'author': (AuthorsNotFoundError, UnavailableAuthorError),
+    'release_year': (YearsNotFoundError, UnavailableYearError),
+}
+
+
+def locked(method):
+    """
+    Runs the method under the lock of the library, so that it does
+    not see records and indexes half way through a refresh.
+    """
+    @wraps(method)
+    def locked_method(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return locked_method
+
+
 class Library:
     """
     Library class representing a library with books, users, and librarians.
-    Reads books, users, and librarians data from JSON files.
+    Reads books, users, and librarians data from storage and keeps
+    an index from ID to record for each of them, a keyword index
+    of the books, book indexes by genre, author and release year
+    an index of borrowed books by return date and loan counters
+    of books and users. Records updated
+    by books and users are applied to the library and its indexes,
+    so only data changed by other processes has to be read again.
+    Changes are applied and the public methods run under a lock,
+    so a watcher thread can refresh the library while it is in use.
     """
     def __init__(self):
-        self._books = read_json('books.json')
-        self._users = read_json('users.json')
-        self._librarians = read_json('librarians.json')
+        self._lock = RLock()
+        self._versions = {}
+        for name in COLLECTIONS:
+            self._load(name)
+        self._indexes = {}
+        add_listener(self._records_updated)
+
+    def _load(self, name: str):
+        """
+        Reads books, users or librarians from storage and
+        remembers the version of the data file read.
+        """
+        version = data_version(f'{name}.json')
+        records = read_json(f'{name}.json')
+        with self._lock:
+            self._versions[name] = version
+            setattr(self, f'_{name}', records)
+
+    def _written(self, name: str, version):
+        """
+        Marks the data file as up to date after a change made by this
+        library, unless it had been changed by another process before.
+        """
+        if self._versions.get(name) == version:
+            self._versions[name] = data_version(f'{name}.json')
 
     @property
     def books(self):
@@ -44,42 +127,111 @@ class Library:
     def librarians(self):
         return self._librarians
 
+    def _index(self, name: str, kind: str = 'ids'):
+        """
+        Returns an index of books, users or librarians. The index is
+        built on first use and rebuilt only when the list of records
+        has been replaced.
+        """
+        records = getattr(self, f'_{name}')
+        source, index = self._indexes.get((name, kind), (None, None))
+        if source is not records:
+            index = INDEX_TYPES[kind]()
+            for info in records:
+                index.add(info)
+            self._indexes[(name, kind)] = (records, index)
+        return index
+
+    def _current_indexes(self, name: str):
+        """
+        Returns the built indexes which are up to date
+        with books, users or librarians.
+        """
+        records = getattr(self, f'_{name}')
+        for (index_name, _), (source, index) in self._indexes.items():
+            if index_name == name and source is records:
+                yield index
+
+    def _records_updated(self, file: str, records: list, version):
+        """
+        Applies records updated in storage to books,
+        users or librarians and to their indexes.
+        """
+        name = file.rsplit('.', 1)[0]
+        if name not in COLLECTIONS:
+            return
+        with self._lock:
+            index = self._index(name)
+            for record in records:
+                info = index.get(record["id"])
+                if info is None:
+                    continue
+                old = dict(info)
+                info.update(record)
+                for current in self._current_indexes(name):
+                    current.update(old, info)
+            self._written(name, version)
+
+    @locked
+    def get_book(self, book_id: int):
+        """
+        Returns the book record with the given ID or None.
+        """
+        return self._index('books').get(book_id)
+
+    @locked
+    def get_user(self, user_id: int):
+        """
+        Returns the user record with the given ID or None.
+        """
+        return self._index('users').get(user_id)
+
+    @locked
+    def get_librarian(self, librarian_id: int):
+        """
+        Returns the librarian record with the given ID or None.
+        """
+        return self._index('librarians').get(librarian_id)
+
+    def is_librarian(self, id: int) -> bool:
+        """
+        Checks whether the ID belongs to a librarian.
+        """
+        return self.get_librarian(id) is not None
+
+    @locked
     def login_role_check(self, id: int, password: str):
         """
         Checks the login credentials for a user or librarian.
         """
-        for user_info in self.users:
-            if user_info["id"] == id:
-                if user_info["password"] != password:
-                    raise WrongPasswordError
-                return user_info
-        for librarian_info in self.librarians:
-            if librarian_info["id"] == id:
-                if librarian_info["password"] != password:
-                    raise WrongPasswordError
-                return librarian_info
+        info = self.get_user(id) or self.get_librarian(id)
+        if info and info["password"] != password:
+            raise WrongPasswordError
+        return info
 
+    @locked
     def return_date_check(self, id: int):
         """
         Check the due dates for books borrowed by the user.
         """
-        for user_info in self.users:
-            if user_info["id"] == id:
-                user = User(**user_info)
+        user_info = self.get_user(id)
+        if not user_info:
+            raise NoUserIDError(id)
+        user = User(**user_info)
         if not user.borrowed_books:
             return green('All your borrowed books are within the due date.')
         approaching_books = []
         overdue_books = []
+        today = date.today()
+        due_dates = self._index('books', 'due')
         for book_id in user.borrowed_books:
-            for book_info in self.books:
-                if book_info["id"] == book_id:
-                    book = Book(**book_info)
-                    today = date.today()
-                    diff = book.return_date - today
-                    if 0 < diff.days < 7:
-                        approaching_books.append(book.id)
-                    elif diff.days < 0:
-                        overdue_books.append(book.id)
+            return_date = due_dates.due_date(book_id)
+            if return_date:
+                diff = date.fromisoformat(return_date) - today
+                if 0 < diff.days < 7:
+                    approaching_books.append(book_id)
+                elif diff.days < 0:
+                    overdue_books.append(book_id)
         if approaching_books and overdue_books:
             return (red('The due date for the following books is approaching' +
                         f": {', '.join(map(str, approaching_books))}. ") +
@@ -96,46 +248,178 @@ class Library:
         else:
             return green('All your borrowed books are within the due date.')
 
+    def _due_books_info(self, book_ids: list, today: date) -> list:
+        """
+        Returns information on borrowed books with days left until
+        their return date (negative for overdue books).
+        """
+        info = []
+        for book_id in book_ids:
+            book = Book(**self.get_book(book_id))
+            days = (book.return_date - today).days
+            info.append([book.id,
+                         book.title,
+                         book.current_owner,
+                         book.return_date,
+                         days])
+        return info
+
+    @locked
+    def overdue_books(self, today=None) -> list:
+        """
+        Returns information on books which should have
+        been returned before today, most overdue first.
+        """
+        today = today or date.today()
+        book_ids = self._index('books', 'due').due_between(last=today)
+        return self._due_books_info(book_ids, today)
+
+    @locked
+    def approaching_books(self, today=None, days: int = 7) -> list:
+        """
+        Returns information on books which have to be
+        returned within the given number of days.
+        """
+        today = today or date.today()
+        last = today + timedelta(days=days)
+        book_ids = self._index('books', 'due').due_between(today, last)
+        return self._due_books_info(book_ids, today)
+
     def update_data(self):
         """
-        Updates library data by re-reading information from JSON files.
+        Updates library data by re-reading it from storage.
         """
-        self._books = read_json('books.json')
-        self._users = read_json('users.json')
-        self._librarians = read_json('librarians.json')
+        for name in COLLECTIONS:
+            self._load(name)
+
+    def refresh(self) -> list:
+        """
+        Re-reads only the books, users or librarians whose data files
+        have been changed by other processes and applies the records
+        that differ. Returns the names of the changed collections.
+        The files are read before taking the lock of the library, as
+        storage locks are taken before it when records are written.
+        """
+        changed = []
+        for name in COLLECTIONS:
+            seen = self._versions[name]
+            version = data_version(f'{name}.json')
+            if version == seen:
+                continue
+            records = read_json(f'{name}.json')
+            with self._lock:
+                if self._versions[name] != seen:
+                    continue
+                self._apply_records(name, records)
+                self._versions[name] = version
+                changed.append(name)
+        return changed
+
+    def _apply_records(self, name: str, records: list):
+        """
+        Brings books, users or librarians in line with the records read
+        from storage. Only added, changed and removed records touch the
+        list and its indexes, which are not rebuilt.
+        """
+        index = self._index(name)
+        infos = getattr(self, f'_{name}')
+        ids = set()
+        for record in records:
+            ids.add(record["id"])
+            info = index.get(record["id"])
+            if info is None:
+                for current in self._current_indexes(name):
+                    current.add(record)
+                infos.append(record)
+            elif info != record:
+                old = dict(info)
+                info.clear()
+                info.update(record)
+                for current in self._current_indexes(name):
+                    current.update(old, info)
+        removed = [info for info in infos if info["id"] not in ids]
+        for info in removed:
+            for current in self._current_indexes(name):
+                current.remove(info)
+        if removed:
+            infos[:] = [info for info in infos if info["id"] in ids]
+
+    def _add_record(self, name: str, info: dict):
+        """
+        Appends a record to books, users or librarians,
+        adds it to the indexes and saves it. The data file stays locked
+        from reading its version to the write, so that no change made
+        by another process is skipped.
+        """
+        with lock_files([f'{name}.json']), self._lock:
+            for index in self._current_indexes(name):
+                index.add(info)
+            getattr(self, f'_{name}').append(info)
+            version = data_version(f'{name}.json')
+            insert_record(f'{name}.json', info)
+            self._written(name, version)
+
+    def _remove_record(self, name: str, info: dict):
+        """
+        Removes a record from books, users or librarians, from
+        the indexes and from storage. Its ID is released by the caller
+        once the data file is unlocked.
+        """
+        with lock_files([f'{name}.json']), self._lock:
+            for index in self._current_indexes(name):
+                index.remove(info)
+            getattr(self, f'_{name}').remove(info)
+            version = data_version(f'{name}.json')
+            delete_record(f'{name}.json', info["id"])
+            self._written(name, version)
 
     def add_new_book(self, new_book: Book) -> str:
         """
         Adds a new book to the library.
         """
-        self._books.append(new_book.__dict__())
-        write_json('books.json', self.books)
+        self._add_record('books', new_book.__dict__())
         return f'The book {new_book.id} has been successfully added.'
 
+    def add_new_books(self, new_books: list) -> str:
+        """
+        Adds many new books to the library at once. The books are added
+        to the indexes one by one and saved in a single write.
+        """
+        infos = [book.__dict__() for book in new_books]
+        with lock_files(['books.json']):
+            self.refresh()
+            with self._lock:
+                for info in infos:
+                    for index in self._current_indexes('books'):
+                        index.add(info)
+                self._books.extend(infos)
+                version = data_version('books.json')
+                write_json('books.json', self._books)
+                self._written('books', version)
+        return f'{len(infos)} books have been successfully added.'
+
     def remove_book(self, book_id: int) -> str:
         """
-        Removes a book from the library.
+        Removes a book from the library. The book is checked against
+        its stored record under the lock of the data file, as it may
+        have been borrowed by another terminal in the meantime.
         """
-        updated_books = []
-        for book_info in self.books:
-            if book_info["id"] != book_id:
-                updated_books.append(book_info)
-            elif book_info["id"] == book_id and book_info["current_owner"]:
+        with lock_files(['books.json']):
+            book_info = self.get_book(book_id)
+            stored_info = find_record('books.json', book_id)
+            if not book_info or not stored_info:
+                raise NoBookIDError(book_id)
+            if book_info["current_owner"] or stored_info["current_owner"]:
                 raise BorrowedBookError
-        if updated_books == self.books:
-            raise NoBookIDError(book_id)
-        self._books = updated_books
-        write_json('books.json', self.books)
+            self._remove_record('books', book_info)
+        release_id('books.json', book_id)
         return f'The book {book_id} has been successfully removed.'
 
     def add_copy_of_book(self, book_id: int, new_id: int) -> str:
         """
         Adds a copy of an existing book to the library.
         """
-        book_copy = None
-        for book_info in self.books:
-            if book_info["id"] == book_id:
-                book_copy = book_info
+        book_copy = self.get_book(book_id)
         if not book_copy:
             raise NoBookIDError(book_id)
         title = book_copy["title"]
@@ -146,125 +430,117 @@ class Library:
         self.add_new_book(book)
         return f'The copy of book {book_id} has been successfully added.'
 
+    @locked
     def search_book_by_keyword(self, keyword: str) -> str:
         """
-        Searches for books in the library by a keyword.
+        Searches for books in the library by a keyword. Every word
+        of the keyword has to start a word of the title, author,
+        genre or release year of the book.
         """
         if not keyword:
             raise NoKeywordError
         searches = []
-        for book_info in self.books:
-            values = list(book_info.values())
-            for value in values:
-                if str(keyword).lower() in str(value).lower():
-                    book = Book(**book_info)
-                    searches.append(book.list_info())
-                    break
+        for book_id in self._index('books', 'search').search(keyword):
+            book = Book(**self.get_book(book_id))
+            searches.append(book.list_info())
         if not searches:
             raise KeywordNotFoundError
         return searches
 
+    @locked
+    def facet_counts(self, field: str) -> dict:
+        """
+        Returns the number of books for every genre,
+        author or release year in the library.
+        """
+        counts = self._index('books', field).counts()
+        if not counts:
+            raise FACET_ERRORS[field][0]
+        return counts
+
+    @locked
+    def search_book_by_facet(self, field: str, value) -> list:
+        """
+        Searches for books with the given genre, author or release year.
+        """
+        facet = self._index('books', field)
+        if value not in facet:
+            raise FACET_ERRORS[field][1]
+        searches = []
+        for book_id in facet.ids(value):
+            book = Book(**self.get_book(book_id))
+            searches.append(book.list_info())
+        return searches
+
     def available_genres(self):
         """
         Returns a list of available genres in the library.
         """
-        genres = [book_info["genre"] for book_info in self.books]
-        if not genres:
-            raise GenresNotFoundError
-        return genres
+        return list(self.facet_counts('genre'))
 
     def search_book_by_genre(self, chosen_genre: str) -> str:
         """
         Searches for books in the library by genre.
         """
-        if chosen_genre not in self.available_genres():
-            raise UnavailableGenreError
-        searches = []
-        for book_info in self.books:
-            if chosen_genre == book_info["genre"]:
-                book = Book(**book_info)
-                searches.append(book.list_info())
-        return searches
+        return self.search_book_by_facet('genre', chosen_genre)
 
     def available_authors(self):
         """
         Returns a list of available authors in the library.
         """
-        authors = [book_info["author"] for book_info in self.books]
-        if not authors:
-            raise AuthorsNotFoundError
-        return authors
+        return list(self.facet_counts('author'))
 
     def search_book_by_author(self, chosen_author: str) -> str:
         """
         Searches for books in the library by author.
         """
-        if chosen_author not in self.available_authors():
-            raise UnavailableAuthorError
-        searches = []
-        for book_info in self.books:
-            if chosen_author == book_info["author"]:
-                book = Book(**book_info)
-                searches.append(book.list_info())
-        return searches
+        return self.search_book_by_facet('author', chosen_author)
 
     def available_years(self):
         """
         Returns a list of available release years in the library.
         """
-        years = [str(book_info["release_year"]) for book_info in self.books]
-        if not years:
-            raise YearsNotFoundError
-        return years
+        return list(self.facet_counts('release_year'))
 
     def search_book_by_year(self, chosen_year: str) -> str:
         """
         Searches for books in the library by release year.
         """
-        if chosen_year not in self.available_years():
-            raise UnavailableYearError
-        searches = []
-        for book_info in self.books:
-            if chosen_year == str(book_info["release_year"]):
-                book = Book(**book_info)
-                searches.append(book.list_info())
-        return searches
+        return self.search_book_by_facet('release_year', chosen_year)
 
     def add_new_user(self, new_user: User):
         """
         Adds a new user to the library.
         """
-        self._users.append(new_user.__dict__())
-        write_json('users.json', self.users)
+        self._add_record('users', new_user.__dict__())
         name = new_user.name
         id = new_user.id
         return f"New user {name} has been added with ID {id}."
 
     def remove_user(self, user_id: int):
         """
-        Removes a user from the library.
-        """
-        updated_users = []
-        for user_info in self.users:
-            borrowed = user_info["borrowed_books"]
-            reserved = user_info["reservations"]
-            if user_info["id"] != user_id:
-                updated_users.append(user_info)
-            elif user_info["id"] == user_id and (borrowed or reserved):
-                raise UserWithBooksError
+        Removes a user from the library. The user is checked against
+        the stored record under the lock of the data file, as books
+        may have been borrowed or reserved on another terminal.
+        """
+        with lock_files(['users.json']):
+            user_info = self.get_user(user_id)
+            stored_info = find_record('users.json', user_id)
+            if not user_info or not stored_info:
+                raise NoUserIDError(user_id)
+            for info in (user_info, stored_info):
+                if info["borrowed_books"] or info["reservations"]:
+                    raise UserWithBooksError
             name = user_info["name"]
-        if updated_users == self.users:
-            raise NoUserIDError(user_id)
-        self._users = updated_users
-        write_json('users.json', self.users)
+            self._remove_record('users', user_info)
+        release_id('users.json', user_id)
         return f"User {name} has been removed."
 
     def add_new_librarian(self, new_librarian: Librarian):
         """
         Adds a new librarian to the library.
         """
-        self._librarians.append(new_librarian.__dict__())
-        write_json('librarians.json', self.librarians)
+        self._add_record('librarians', new_librarian.__dict__())
         name = new_librarian.name
         id = new_librarian.id
         return f"New librarian {name} has been added with ID {id}."
@@ -275,38 +551,90 @@ class Library:
         """
         if librarian_id == remove_id:
             raise RemoveYourselfError
-        updated_librarians = []
-        for librarian_info in self.librarians:
-            id = librarian_info["id"]
-            if id != remove_id:
-                updated_librarians.append(librarian_info)
-            name = librarian_info["name"]
-        if updated_librarians == self.librarians:
+        librarian_info = self.get_librarian(remove_id)
+        if not librarian_info:
             raise NoLibrarianIDError(remove_id)
-        self._librarians = updated_librarians
-        write_json('librarians.json', self.librarians)
+        name = librarian_info["name"]
+        self._remove_record('librarians', librarian_info)
+        release_id('librarians.json', remove_id)
         return f"Librarian {name} has been removed."
 
+    def _book_label(self, book_id: int) -> str:
+        return f'{self.get_book(book_id)["title"]} ({book_id})'
+
+    def _user_label(self, user_id: int) -> str:
+        return f'{self.get_user(user_id)["name"]} ({user_id})'
+
+    @locked
+    def book_loans(self, book_id: int) -> int:
+        """
+        Returns the number of times the book has been borrowed.
+        """
+        return self._index('books', 'loans').count(book_id)
+
+    @locked
+    def user_loans(self, user_id: int) -> int:
+        """
+        Returns the number of books borrowed by the user.
+        """
+        return self._index('users', 'borrowings').count(user_id)
+
+    @locked
     def get_books_stats(self):
         """
         Returns statistics on the number of times each book has been borrowed.
         """
-        stats = {}
-        for book_info in self.books:
-            book = Book(**book_info)
-            stats[f'{book.title} ({book.id})'] = len(book.loan_history)
-        return stats
+        loans = self._index('books', 'loans')
+        return {self._book_label(id): count for id, count in loans.items()}
 
+    @locked
     def get_users_stats(self):
         """
         Returns statistics on the number of books borrowed by each user.
         """
-        stats = {}
-        for user_info in self.users:
-            user = User(**user_info)
-            stats[f'{user.name} ({user.id})'] = len(user.borrowing_history)
-        return stats
+        loans = self._index('users', 'borrowings')
+        return {self._user_label(id): count for id, count in loans.items()}
+
+    @locked
+    def top_books(self, n: int = 10) -> dict:
+        """
+        Returns the n most borrowed books with their number of loans.
+        """
+        loans = self._index('books', 'loans')
+        return {self._book_label(id): count for id, count in loans.top(n)}
 
+    @locked
+    def top_users(self, n: int = 10) -> dict:
+        """
+        Returns the n users who have borrowed the most books.
+        """
+        loans = self._index('users', 'borrowings')
+        return {self._user_label(id): count for id, count in loans.top(n)}
+
+    @locked
+    def loans_by(self, field: str) -> dict:
+        """
+        Returns the total number of loans of books
+        of every genre, author or release year.
+        """
+        loans = self._index('books', 'loans')
+        facet = self._index('books', field)
+        totals = {
+            value: sum(loans.count(id) for id in facet.ids(value))
+            for value in facet.counts()
+        }
+        if not totals:
+            raise FACET_ERRORS[field][0]
+        return totals
+
+    @locked
+    def due_by_month(self) -> dict:
+        """
+        Returns the number of borrowed books due in every month.
+        """
+        return self._index('books', 'due').months()
+
+    @locked
     def available_books_info(self) -> str:
         """
         Returns information on all available books in the library.
@@ -317,6 +645,7 @@ class Library:
             info.append(book.list_info())
         return info
 
+    @locked
     def users_librarians(self) -> str:
         """
         Returns information on all users and librarians in the library.
@@ -331,6 +660,7 @@ class Library:
             librarians.append(librarian.search_info())
         return (users, librarians)
 
+    @locked
     def search_user(self, keyword) -> str:
         """
         Searches for users or librarians in the library by a keyword.
@@ -356,3 +686,20 @@ class Library:
         if not users and not librarians:
             raise KeywordNotFoundError
         return (users, librarians)
+
+
+class LazyLibrary:
+    """
+    Library read from storage on first use, so that the
+    application can show its first prompt before loading the data.
+    """
+    def __init__(self):
+        self._library = None
+        self._lock = Lock()
+
+    def __getattr__(self, name: str):
+        if self._library is None:
+            with self._lock:
+                if self._library is None:
+                    self._library = Library()
+        return getattr(self._library, name)
@@ -12,21 +12,34 @@ from errors import (
     NotReservedError,
     DoubleReservationBookError
 )
-from class_book import Book
-from json_methods import read_json, write_json
+from array import array
+from class_book import Book, id_list, plain_list
+from json_methods import find_records
+from transaction import transaction, get_record, save_record
 
 
 class User:
     """
     User class representing a library reader.
     Attributes:
-    - id: The user's ID (ID range: 2000 - 9999).
+    - id: The user's ID (ID range: 2000 - 2^63-1,
+      2000 - 9999 in the legacy ID space, see generate_id.id_ranges).
     - name: The user's name.
     - password: The user's password.
     - borrowed_books: List of book IDs currently borrowed by the user.
     - reservations: List of book IDs reserved by the user.
     - borrowing_history: List of book IDs the user has borrowed in the past.
+    With compact set, the lists of book IDs are kept in arrays.
     """
+    __slots__ = (
+        '_id',
+        '_name',
+        '_password',
+        '_borrowed_books',
+        '_reservations',
+        '_borrowing_history',
+    )
+
     def __init__(
             self: str,
             id: int,
@@ -35,6 +48,7 @@ class User:
             borrowed_books=None,
             reservations=None,
             borrowing_history=None,
+            compact=False,
             ):
         if not name:
             raise EmptyNameError
@@ -45,9 +59,9 @@ class User:
         self._id = id
         self._name = name
         self._password = password
-        self._borrowed_books = borrowed_books or []
-        self._reservations = reservations or []
-        self._borrowing_history = borrowing_history or []
+        self._borrowed_books = id_list(borrowed_books, compact)
+        self._reservations = id_list(reservations, compact)
+        self._borrowing_history = id_list(borrowing_history, compact)
 
     @property
     def name(self):
@@ -79,19 +93,32 @@ class User:
         """
         if len(new_password) < 6:
             raise ShortPasswordError
-        self._password = new_password
-        self.dict_update()
+        with transaction():
+            self.reload()
+            self._password = new_password
+            self.dict_update()
+
+    def reload(self):
+        """
+        Reads the user's record (within the current transaction, so that
+        it is checked for changes by others on commit) and brings the
+        user's information up to date with it.
+        """
+        user_info = get_record('users.json', self.id)
+        if not user_info:
+            return
+        compact = isinstance(self._borrowed_books, array)
+        self._name = user_info["name"]
+        self._password = user_info["password"]
+        for field in ('borrowed_books', 'reservations', 'borrowing_history'):
+            ids = list(user_info[field] or [])
+            setattr(self, f'_{field}', id_list(ids, compact))
 
     def dict_update(self):
         """
         Updates the user's information in the JSON file.
         """
-        users = read_json("users.json")
-        for index, user_info in enumerate(users):
-            if user_info["id"] == self.id:
-                users[index].update(self.__dict__())
-                break
-        write_json('users.json', users)
+        save_record('users.json', self.__dict__())
 
     def history_append(self, book_id: int):
         """
@@ -137,12 +164,12 @@ class User:
         if not self.borrowed_books:
             return info
         else:
+            books_info = find_records('books.json', self.borrowed_books)
             books = []
             for book_id in self.borrowed_books:
-                for book_info in read_json('books.json'):
-                    if book_info["id"] == book_id:
-                        book = Book(**book_info)
-                        books.append(book.borrow_info())
+                if book_id in books_info:
+                    book = Book(**books_info[book_id])
+                    books.append(book.borrow_info())
             return books
 
     def get_history(self):
@@ -153,12 +180,12 @@ class User:
         if not self.borrowing_history:
             return info
         else:
+            books_info = find_records('books.json', self.borrowing_history)
             books = []
             for book_id in self.borrowing_history:
-                for book_info in read_json('books.json'):
-                    if book_info["id"] == book_id:
-                        book = Book(**book_info)
-                        books.append(book.history_info())
+                if book_id in books_info:
+                    book = Book(**books_info[book_id])
+                    books.append(book.history_info())
             return books
 
     def get_reservations(self):
@@ -169,131 +196,120 @@ class User:
         if not self.reservations:
             return info
         else:
+            books_info = find_records('books.json', self.reservations)
             books = []
             for book_id in self.reservations:
-                for book_info in read_json('books.json'):
-                    if book_info["id"] == book_id:
-                        book = Book(**book_info)
-                        books.append(book.reservation_info(self.id))
+                if book_id in books_info:
+                    book = Book(**books_info[book_id])
+                    books.append(book.reservation_info(self.id))
             return books
 
     def borrow_book(self, book_id: int):
         """
         Borrows a book with the given book ID.
-        """
-        books = read_json('books.json')
-        title = None
-        for book_info in books:
-            if book_info["id"] == book_id:
-                book = Book(**book_info)
-                if book.id in self.borrowed_books:
-                    raise UsersBookError
-                if book.current_owner:
-                    raise BorrowedBookError('')
-                book.set_owner(self.id)
-                book.set_extensions(3)
-                book.set_return_date()
-                book.history_append(self.id)
-                title = book.title
-                break
-        if books == read_json('books.json'):
-            raise NoBookIDError(book_id)
-        self.history_append(book_id)
-        self.borrowed_append(book_id)
-        return f"You have successfully borrowed the book '{title}'."
+        All changes are written in a single transaction.
+        """
+        with transaction():
+            self.reload()
+            book_info = get_record('books.json', book_id)
+            if not book_info:
+                raise NoBookIDError(book_id)
+            book = Book(**book_info)
+            if book.id in self.borrowed_books:
+                raise UsersBookError
+            if book.current_owner:
+                raise BorrowedBookError('')
+            book.set_owner(self.id)
+            book.set_extensions(3)
+            book.set_return_date()
+            book.history_append(self.id)
+            self.history_append(book_id)
+            self.borrowed_append(book_id)
+        return f"You have successfully borrowed the book '{book.title}'."
 
     def use_extension(self, book_id: int):
         """
         Extends the return date for a borrowed book.
         """
-        if book_id not in self.borrowed_books:
-            raise NotUsersBookError
-        books = read_json('books.json')
-        for book_info in books:
-            if book_info["id"] == book_id:
-                book = Book(**book_info)
-                if book.reservations:
-                    raise ReservedBookError
-                if book.extensions < 1:
-                    raise NotEnoughExtensionsError
-                book.remove_extension()
-                book.extend_return_date()
-                break
-        if books == read_json('books.json'):
-            raise NoBookIDError(book_id)
+        with transaction():
+            self.reload()
+            if book_id not in self.borrowed_books:
+                raise NotUsersBookError
+            book_info = get_record('books.json', book_id)
+            if not book_info:
+                raise NoBookIDError(book_id)
+            book = Book(**book_info)
+            if book.reservations:
+                raise ReservedBookError
+            if book.extensions < 1:
+                raise NotEnoughExtensionsError
+            book.remove_extension()
+            book.extend_return_date()
         return "You have successfully extended the reservation."
 
     def reserve_book(self, book_id: int):
         """
         Reserves a book with the given book ID.
         """
-        books = read_json('books.json')
-        title = None
-        found_book = False
-        for book_info in books:
-            if book_info["id"] == book_id:
-                book = Book(**book_info)
-                if book.current_owner == self.id:
-                    raise UsersBookError
-                if not book.current_owner:
-                    raise NoBookOwnerError
-                if self.id in book.reservations:
-                    raise DoubleReservationBookError
-                book.add_reservation(self.id)
-                title = book.title
-                found_book = True
-                break
-        if not found_book:
-            raise NoBookIDError(book_id)
-        self.reservations_append(book.id)
-        return f"You have successfully reserved the book '{title}'."
+        with transaction():
+            self.reload()
+            book_info = get_record('books.json', book_id)
+            if not book_info:
+                raise NoBookIDError(book_id)
+            book = Book(**book_info)
+            if book.current_owner == self.id:
+                raise UsersBookError
+            if not book.current_owner:
+                raise NoBookOwnerError
+            if self.id in book.reservations:
+                raise DoubleReservationBookError
+            book.add_reservation(self.id)
+            self.reservations_append(book.id)
+        return f"You have successfully reserved the book '{book.title}'."
 
     def cancel_reservation(self, book_id: int):
         """
         Cancels a reservation for a book with the given book ID.
         """
-        books = read_json('books.json')
-        users = read_json('users.json')
-        title = None
-        for book_info in books:
-            if book_info["id"] == book_id:
-                book = Book(**book_info)
-                if self.id not in book.reservations:
-                    raise NotReservedError
-                book.remove_reservation(self.id)
-                self.reservations_remove(book.id)
-                title = book.title
-        if users == read_json('users.json'):
-            raise NoBookIDError(book_id)
+        with transaction():
+            self.reload()
+            book_info = get_record('books.json', book_id)
+            if not book_info:
+                raise NoBookIDError(book_id)
+            book = Book(**book_info)
+            if self.id not in book.reservations:
+                raise NotReservedError
+            book.remove_reservation(self.id)
+            self.reservations_remove(book.id)
         return ('You have successfully canceled' +
-                f" the reservation for the book '{title}'.")
+                f" the reservation for the book '{book.title}'.")
 
     def return_book(self, book_id: int):
         """
-        Returns a borrowed book with the given book ID.
-        """
-        if book_id not in self.borrowed_books:
-            raise NotUsersBookError
-        books = read_json('books.json')
-        title = None
-        for book_info in books:
-            if book_info["id"] == book_id:
-                book = Book(**book_info)
-                book.set_owner(None)
-                book.set_extensions(0)
-                book.set_return_date(None)
-                title = book.title
-                if book.reservations:
-                    removed = book.remove_first_reservation()
-                    for user_info in read_json('users.json'):
-                        if user_info["id"] == removed:
-                            rm_user = User(**user_info)
-                            rm_user.borrow_book(book_id)
-                            rm_user.reservations_remove(book_id)
-        if books == read_json('books.json'):
-            raise NoBookIDError(book_id)
-        self.borrowed_remove(book_id)
-        return f"You have returned the book {title}. Thank you!"
+        Returns a borrowed book with the given book ID. If the book
+        is reserved, it is lent to the first user in the queue
+        within the same transaction.
+        """
+        with transaction():
+            self.reload()
+            if book_id not in self.borrowed_books:
+                raise NotUsersBookError
+            book_info = get_record('books.json', book_id)
+            if not book_info:
+                raise NoBookIDError(book_id)
+            book = Book(**book_info)
+            book.set_owner(None)
+            book.set_extensions(0)
+            book.set_return_date(None)
+            if book.reservations:
+                removed = book.remove_first_reservation()
+                user_info = get_record('users.json', removed)
+                if user_info:
+                    rm_user = User(**user_info)
+                    rm_user.borrow_book(book_id)
+                    rm_user.reservations_remove(book_id)
+            self.borrowed_remove(book_id)
+        return f"You have returned the book {book.title}. Thank you!"
 
     def search_info(self):
         """
@@ -321,9 +337,9 @@ class User:
             "id": self.id,
             "name": self.name,
             "password": self.password,
-            "borrowed_books": self.borrowed_books,
-            "reservations": self.reservations,
-            "borrowing_history": self.borrowing_history,
+            "borrowed_books": plain_list(self.borrowed_books),
+            "reservations": plain_list(self.reservations),
+            "borrowing_history": plain_list(self.borrowing_history),
         }
 
 
@@ -335,6 +351,8 @@ class Librarian(User):
     - name: The librarian's name.
     - password: The librarian's password.
     """
+    __slots__ = ()
+
     def __init__(
             self,
             id: int,
@@ -0,0 +1,20 @@
+from class_library import Library
+import shutil
+import pytest
+
+
+@pytest.fixture
+def library_dir(tmp_path, monkeypatch):
+    """
+    Runs the test in a temporary directory with copies
+    of the books, users and librarians data files.
+    """
+    for file in ('books.json', 'users.json', 'librarians.json'):
+        shutil.copy(file, tmp_path / file)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def library(library_dir):
+    return Library()
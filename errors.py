@@ -151,3 +151,60 @@ class RemoveYourselfError(Exception):
 class DoubleReservationBookError(Exception):
     def __str__(self):
         return 'You have already reserved this book.'
+
+
+class UnknownStorageError(Exception):
+    def __init__(self, name):
+        super().__init__(f'Unknown storage: {name}.')
+
+
+class IdRangeExhaustedError(Exception):
+    def __init__(self, min_id, max_id):
+        super().__init__(f'No free IDs left in the range {min_id} - {max_id}.')
+
+
+class UnknownIdSpaceError(Exception):
+    def __init__(self, name):
+        super().__init__(f'Unknown ID space: {name}.')
+
+
+class RecordConflictError(Exception):
+    def __init__(self, file, id):
+        super().__init__(f'The record {id} in {file} has been changed ' +
+                         'by someone else in the meantime, try again.')
+
+
+class NotLoggedInError(Exception):
+    def __str__(self):
+        return 'You have to log in first.'
+
+
+class LibrarianOnlyError(Exception):
+    def __str__(self):
+        return 'Only librarians can do this.'
+
+
+class UnknownOperationError(Exception):
+    def __init__(self, name):
+        super().__init__(f'Unknown operation: {name}.')
+
+
+class UnknownDurabilityError(Exception):
+    def __init__(self, name):
+        super().__init__(f'Unknown durability: {name}.')
+
+
+class InvalidRowError(Exception):
+    def __str__(self):
+        return 'The row is not a valid book record.'
+
+
+class InvalidReleaseYearError(Exception):
+    def __str__(self):
+        return 'Release year has to be a whole number.'
+
+
+class InvalidBranchError(Exception):
+    def __init__(self, branch):
+        super().__init__(f'Invalid branch: {branch}. ' +
+                         'Branches are numbered from 1.')
@@ -1,43 +1,262 @@
-from random import randint
-from class_book import Book
-from class_user import User, Librarian
-from json_methods import read_json
+import os
+from contextlib import contextmanager
+from json_methods import read_json, read_meta, write_meta, lock_files
+from storage import META_FILE
+from errors import (
+    IdRangeExhaustedError,
+    UnknownIdSpaceError,
+    InvalidBranchError,
+)
+
+MAX_ID = 2 ** 63 - 1
+
+# Number of IDs in the partition of every branch. IDs of a branch
+# start with its number followed by 12 digits of local ID.
+BRANCH_SIZE = 10 ** 12
+
+# Highest branch number whose partition fits in 64-bit IDs. Branch 0
+# would overlap the 4-digit IDs (and allow ID 0), so branches start at 1.
+MAX_BRANCH = (MAX_ID + 1) // BRANCH_SIZE - 1
+
+ID_SPACES = {
+    'legacy': {
+        'books.json': (1000, 9999),
+        'users.json': (2000, 9999),
+        'librarians.json': (1000, 1999),
+    },
+    'wide': {
+        'books.json': (1000, MAX_ID),
+        'users.json': (2000, MAX_ID),
+        'librarians.json': (1000, 1999),
+    },
+}
+
+
+def check_branch(branch) -> int:
+    """
+    Returns the branch number, raising InvalidBranchError
+    if it is not a whole number from 1 to MAX_BRANCH.
+    """
+    try:
+        number = int(branch)
+    except (TypeError, ValueError):
+        raise InvalidBranchError(branch)
+    if not 1 <= number <= MAX_BRANCH:
+        raise InvalidBranchError(branch)
+    return number
+
+
+def id_ranges() -> dict:
+    """
+    Returns the ID range of every data file. The ranges are chosen with
+    the LIBRARY_ID_SPACE environment variable ('wide' by default, which
+    allows 64-bit IDs, or 'legacy' for 4-digit IDs). If LIBRARY_BRANCH
+    is set, book and user IDs are limited to the partition of the branch.
+    Librarian IDs always stay in the range 1000 - 1999.
+    """
+    name = os.environ.get('LIBRARY_ID_SPACE', 'wide')
+    if name not in ID_SPACES:
+        raise UnknownIdSpaceError(name)
+    ranges = dict(ID_SPACES[name])
+    branch = os.environ.get('LIBRARY_BRANCH')
+    if branch:
+        first = check_branch(branch) * BRANCH_SIZE
+        for file in ('books.json', 'users.json'):
+            ranges[file] = (first, first + BRANCH_SIZE - 1)
+    return ranges
+
+
+class IdAllocator:
+    """
+    Allocator handing out unused IDs from the range min_id - max_id.
+    Free IDs are kept as a list of [first, last] ranges, so allocating
+    an ID takes constant time. Checking and releasing an ID go through
+    the free ranges. An ID released right after the one allocated
+    last is merged back into its range.
+    """
+    def __init__(self, min_id: int, max_id: int, free=None):
+        self._min_id = min_id
+        self._max_id = max_id
+        if free is None:
+            free = [[min_id, max_id]]
+        self._free = [list(free_range) for free_range in free]
+
+    @classmethod
+    def from_ids(cls, min_id: int, max_id: int, used_ids):
+        """
+        Creates an allocator with all IDs of the range
+        free except the used ones.
+        """
+        free = []
+        first = min_id
+        for id in sorted(set(used_ids)):
+            if id < first or id > max_id:
+                continue
+            if id > first:
+                free.append([first, id - 1])
+            first = id + 1
+        if first <= max_id:
+            free.append([first, max_id])
+        return cls(min_id, max_id, free)
+
+    @property
+    def min_id(self):
+        return self._min_id
+
+    @property
+    def max_id(self):
+        return self._max_id
+
+    def allocate(self) -> int:
+        """
+        Returns a free ID and marks it as used.
+        """
+        if not self._free:
+            raise IdRangeExhaustedError(self.min_id, self.max_id)
+        free_range = self._free[-1]
+        id = free_range[0]
+        if free_range[0] == free_range[1]:
+            self._free.pop()
+        else:
+            free_range[0] += 1
+        return id
+
+    def is_free(self, id: int) -> bool:
+        """
+        Checks whether the ID can still be allocated.
+        """
+        return any(first <= id <= last for first, last in self._free)
+
+    def release(self, id: int):
+        """
+        Marks an ID as free again.
+        """
+        if self.min_id <= id <= self.max_id and not self.is_free(id):
+            if self._free and self._free[-1][0] == id + 1:
+                self._free[-1][0] = id
+            else:
+                self._free.append([id, id])
+
+    def state(self) -> dict:
+        """
+        Returns the allocator state to be saved.
+        """
+        return {
+            "min_id": self.min_id,
+            "max_id": self.max_id,
+            "free": self._free,
+        }
+
+
+def load_allocator(file: str) -> IdAllocator:
+    """
+    Returns the ID allocator of a data file saved alongside the data.
+    When there is none, or the configured range has changed,
+    the allocator is built from the IDs in the file.
+    """
+    min_id, max_id = id_ranges()[file]
+    state = (read_meta('ids') or {}).get(file)
+    if state and (state["min_id"], state["max_id"]) == (min_id, max_id):
+        return IdAllocator(min_id, max_id, state["free"])
+    used_ids = [info["id"] for info in read_json(file)]
+    return IdAllocator.from_ids(min_id, max_id, used_ids)
+
+
+def save_allocator(file: str, allocator: IdAllocator):
+    """
+    Saves the ID allocator of a data file alongside the data.
+    """
+    states = read_meta('ids') or {}
+    states[file] = allocator.state()
+    write_meta('ids', states)
+
+
+def allocate_id(file: str) -> int:
+    """
+    Allocates a new unique ID for a record of the data file. The
+    allocator is read and saved under the lock of the metadata, so
+    processes adding records at the same time get different IDs.
+    """
+    with lock_files([META_FILE]):
+        allocator = load_allocator(file)
+        id = allocator.allocate()
+        save_allocator(file, allocator)
+    return id
+
+
+@contextmanager
+def reserved_id(file: str):
+    """
+    Allocates an ID for a new record of the data file, which is
+    released again if the block fails (e.g. on invalid input).
+    """
+    id = allocate_id(file)
+    try:
+        yield id
+    except BaseException:
+        release_id(file, id)
+        raise
+
+
+def allocate_ids(file: str, count: int) -> list:
+    """
+    Allocates count new unique IDs for records of the data
+    file, loading and saving the allocator only once.
+    """
+    with lock_files([META_FILE]):
+        allocator = load_allocator(file)
+        ids = [allocator.allocate() for _ in range(count)]
+        save_allocator(file, allocator)
+    return ids
+
+
+def release_ids(file: str, ids: list):
+    """
+    Returns unused IDs (of records which could not be saved) to the
+    allocator of the data file, loading and saving it only once.
+    """
+    with lock_files([META_FILE]):
+        allocator = load_allocator(file)
+        for id in reversed(ids):
+            allocator.release(id)
+        save_allocator(file, allocator)
+
+
+def release_id(file: str, id: int):
+    """
+    Returns the ID of a removed record to the allocator of the data file.
+    """
+    with lock_files([META_FILE]):
+        allocator = load_allocator(file)
+        allocator.release(id)
+        save_allocator(file, allocator)
 
 
 def generate_id(min_range, max_range, objects):
     """
-    Generates a random ID within the specified range
+    Generates an ID within the specified range
     that is not already in use.
     """
-    while True:
-        random_id = randint(min_range, max_range)
-        all_ids = [object.id for object in objects]
-        if random_id not in all_ids:
-            return random_id
+    used_ids = [object.id for object in objects]
+    return IdAllocator.from_ids(min_range, max_range, used_ids).allocate()
 
 
 def generate_book_id():
     """
-    Generates a unique random book ID
-    within the specified range.
+    Generates a unique book ID within the specified range.
     """
-    books = read_json('books.json')
-    return generate_id(1000, 9999, [Book(**book_info) for book_info in books])
+    return allocate_id('books.json')
 
 
 def generate_user_id():
     """
-    Generates a unique random user ID
-    within the specified range.
+    Generates a unique user ID within the specified range.
     """
-    users = read_json('users.json')
-    return generate_id(2000, 9999, [User(**user_info) for user_info in users])
+    return allocate_id('users.json')
 
 
 def generate_librarian_id():
     """
-    Generates a unique random librarian
-    ID within the specified range.
+    Generates a unique librarian ID within the specified range.
     """
-    libs = read_json('librarians.json')
-    return generate_id(1000, 1999, [Librarian(**lib_inf) for lib_inf in libs])
+    return allocate_id('librarians.json')
@@ -0,0 +1,243 @@
+import re
+from bisect import bisect_left, insort
+from heapq import nlargest
+from operator import itemgetter
+
+
+def tokenize(value) -> list:
+    """
+    Splits a value into lowercase words.
+    """
+    return re.findall(r'\w+', str(value).lower())
+
+
+class IdIndex(dict):
+    """
+    Index from record ID to the record.
+    """
+    def add(self, record: dict):
+        self[record["id"]] = record
+
+    def remove(self, record: dict):
+        self.pop(record["id"], None)
+
+    def update(self, old: dict, new: dict):
+        self[new["id"]] = new
+
+
+class InvertedIndex:
+    """
+    Index from the words of the given record fields to the IDs
+    of records containing them. Words are kept sorted, so every
+    query term matches all words starting with it.
+    """
+    def __init__(self, fields: tuple):
+        self._fields = fields
+        self._postings = {}
+        self._words = []
+        self._record_words = {}
+        self._positions = {}
+        self._counter = 0
+
+    def add(self, record: dict):
+        """
+        Adds the words of a record to the index.
+        """
+        words = set()
+        for field in self._fields:
+            words.update(tokenize(record.get(field, '')))
+        for word in words:
+            if word not in self._postings:
+                self._postings[word] = set()
+                insort(self._words, word)
+            self._postings[word].add(record["id"])
+        self._record_words[record["id"]] = words
+        self._positions[record["id"]] = self._counter
+        self._counter += 1
+
+    def remove(self, record: dict):
+        """
+        Removes the words of a record from the index.
+        """
+        for word in self._record_words.pop(record["id"], ()):
+            self._postings[word].discard(record["id"])
+            if not self._postings[word]:
+                del self._postings[word]
+                del self._words[bisect_left(self._words, word)]
+        self._positions.pop(record["id"], None)
+
+    def update(self, old: dict, new: dict):
+        """
+        Reindexes a changed record if any of the indexed fields changed.
+        """
+        if any(old.get(field) != new.get(field) for field in self._fields):
+            position = self._positions[old["id"]]
+            self.remove(old)
+            self.add(new)
+            self._positions[new["id"]] = position
+
+    def _prefix_ids(self, prefix: str) -> set:
+        """
+        Returns IDs of records with a word starting with the prefix.
+        """
+        ids = set()
+        position = bisect_left(self._words, prefix)
+        while (position < len(self._words) and
+               self._words[position].startswith(prefix)):
+            ids.update(self._postings[self._words[position]])
+            position += 1
+        return ids
+
+    def search(self, query) -> list:
+        """
+        Returns IDs of records matching every term of the query,
+        in the order the records were added.
+        """
+        ids = None
+        for term in sorted(tokenize(query), key=len, reverse=True):
+            matches = self._prefix_ids(term)
+            ids = matches if ids is None else ids & matches
+            if not ids:
+                return []
+        if ids is None:
+            return []
+        return sorted(ids, key=self._positions.__getitem__)
+
+
+class FacetIndex:
+    """
+    Index from the values of a record field to the IDs of the records
+    with that value. Values and IDs keep the order they were added in.
+    """
+    def __init__(self, field: str, key=None):
+        self._field = field
+        self._key = key or (lambda value: value)
+        self._values = {}
+
+    def add(self, record: dict):
+        value = self._key(record[self._field])
+        self._values.setdefault(value, {})[record["id"]] = None
+
+    def remove(self, record: dict):
+        value = self._key(record[self._field])
+        ids = self._values.get(value, {})
+        ids.pop(record["id"], None)
+        if not ids:
+            self._values.pop(value, None)
+
+    def update(self, old: dict, new: dict):
+        """
+        Moves a changed record to its new value.
+        """
+        if self._key(old[self._field]) != self._key(new[self._field]):
+            self.remove(old)
+            self.add(new)
+
+    def __contains__(self, value) -> bool:
+        return value in self._values
+
+    def ids(self, value) -> list:
+        """
+        Returns IDs of records with the given value.
+        """
+        return list(self._values.get(value, ()))
+
+    def counts(self) -> dict:
+        """
+        Returns the number of records for every value.
+        """
+        return {value: len(ids) for value, ids in self._values.items()}
+
+
+class DueDateIndex:
+    """
+    Index of borrowed books sorted by return date. Dates are compared
+    as ISO strings, which sort in the same order as the dates.
+    """
+    def __init__(self):
+        self._entries = []
+        self._dates = {}
+
+    def add(self, record: dict):
+        if record.get("current_owner") and record.get("return_date"):
+            return_date = str(record["return_date"])
+            insort(self._entries, (return_date, record["id"]))
+            self._dates[record["id"]] = return_date
+
+    def remove(self, record: dict):
+        return_date = self._dates.pop(record["id"], None)
+        if return_date is not None:
+            entry = (return_date, record["id"])
+            del self._entries[bisect_left(self._entries, entry)]
+
+    def update(self, old: dict, new: dict):
+        self.remove(old)
+        self.add(new)
+
+    def due_date(self, id: int):
+        """
+        Returns the return date of a borrowed book or None.
+        """
+        return self._dates.get(id)
+
+    def due_between(self, first=None, last=None) -> list:
+        """
+        Returns IDs of books due after the first and before
+        the last date (both optional), earliest first.
+        """
+        start = 0
+        end = len(self._entries)
+        if first is not None:
+            start = bisect_left(self._entries, (str(first), float('inf')))
+        if last is not None:
+            end = bisect_left(self._entries, (str(last),))
+        return [id for _, id in self._entries[start:end]]
+
+    def months(self) -> dict:
+        """
+        Returns the number of borrowed books due in every
+        month (as YYYY-MM), earliest first.
+        """
+        counts = {}
+        for return_date, _ in self._entries:
+            month = return_date[:7]
+            counts[month] = counts.get(month, 0) + 1
+        return counts
+
+
+class CountIndex:
+    """
+    Number of entries in a list field (such as the loan history)
+    of every record, in the order the records were added.
+    """
+    def __init__(self, field: str):
+        self._field = field
+        self._counts = {}
+
+    def add(self, record: dict):
+        self._counts[record["id"]] = len(record.get(self._field) or ())
+
+    def remove(self, record: dict):
+        self._counts.pop(record["id"], None)
+
+    def update(self, old: dict, new: dict):
+        self.add(new)
+
+    def count(self, id: int) -> int:
+        """
+        Returns the count of the record with the given ID.
+        """
+        return self._counts.get(id, 0)
+
+    def items(self):
+        """
+        Returns pairs of record ID and count.
+        """
+        return self._counts.items()
+
+    def top(self, n: int) -> list:
+        """
+        Returns pairs of record ID and count for the
+        n records with the highest counts.
+        """
+        return nlargest(n, self._counts.items(), key=itemgetter(1))
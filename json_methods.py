@@ -1,17 +1,118 @@
 import json
+from weakref import WeakMethod
+from storage import get_storage, encode_value
+
+_listeners = []
+
+
+def add_listener(method):
+    """
+    Registers a method called with the file name, the list of records
+    and the version of the file before the change after every update
+    of records. Only a weak reference is kept, so the listener does
+    not keep its object alive.
+    """
+    _listeners.append(WeakMethod(method))
+
+
+def _notify(file, records, version):
+    records = json.loads(json.dumps(records, default=encode_value))
+    for listener in list(_listeners):
+        method = listener()
+        if method is None:
+            _listeners.remove(listener)
+        else:
+            method(file, records, version)
 
 
 def read_json(file):
     """
-    Reads and parses JSON data from a file.
+    Reads all records of a data file from the storage backend in use.
+    """
+    return get_storage().load(file)
+
+
+def iter_records(file):
+    """
+    Yields the records of a data file one by one,
+    for read-only passes over large files.
     """
-    with open(file) as file_handle:
-        return json.load(file_handle)
+    return get_storage().iter_records(file)
 
 
 def write_json(file, dump_list):
     """
-    Writes a list or dictionary as JSON data to a file.
+    Writes a list of records to a data file in the storage backend in use.
+    """
+    get_storage().save(file, dump_list)
+
+
+def update_records(file, records):
+    """
+    Updates the records with matching IDs in a data file
+    and notifies the listeners. The file is locked from reading
+    its version until the listeners have been notified.
+    """
+    records = list(records)
+    with lock_files([file]):
+        version = data_version(file)
+        get_storage().update(file, records)
+        _notify(file, records, version)
+
+
+def data_version(file):
+    """
+    Returns a stamp which changes whenever a data file is written.
+    """
+    return get_storage().version(file)
+
+
+def find_record(file, id):
+    """
+    Returns the record with the given ID from a data file or None.
+    """
+    return get_storage().get(file, id)
+
+
+def find_records(file, ids):
+    """
+    Returns the records with the given IDs from a data file,
+    as a dictionary by ID, in a single pass.
+    """
+    return get_storage().get_many(file, ids)
+
+
+def insert_record(file, record):
+    """
+    Adds a new record to a data file.
+    """
+    get_storage().insert(file, record)
+
+
+def delete_record(file, id):
+    """
+    Removes the record with the given ID from a data file.
+    """
+    get_storage().delete(file, id)
+
+
+def lock_files(files):
+    """
+    Returns a context manager holding exclusive locks of the data
+    files, so that other processes cannot change them in the meantime.
+    """
+    return get_storage().lock(files)
+
+
+def read_meta(key):
+    """
+    Returns a value from the metadata kept alongside the data or None.
+    """
+    return get_storage().load_meta(key)
+
+
+def write_meta(key, value):
+    """
+    Stores a value in the metadata kept alongside the data.
     """
-    with open(file, 'w') as file_handle:
-        json.dump(dump_list, file_handle, indent=4, default=str)
+    get_storage().save_meta(key, value)
@@ -0,0 +1,78 @@
+import asyncio
+import random
+from argparse import ArgumentParser
+from time import perf_counter
+from server import LibraryClient, HOST, PORT
+
+
+async def desk(client: LibraryClient, deadline: float, keywords: list,
+               session=None, book_id=None) -> tuple:
+    """
+    Sends requests until the deadline: keyword searches and, when logged
+    in, a borrow and return of the book every tenth request. Returns the
+    numbers of successful and failed requests.
+    """
+    done = failed = 0
+    borrowed = False
+    while perf_counter() < deadline:
+        if session and book_id and done % 10 == 9:
+            op = 'return_book' if borrowed else 'borrow'
+            response = await client.request(
+                op, token=session["token"], book_id=book_id
+            )
+            if response["ok"]:
+                borrowed = not borrowed
+        else:
+            response = await client.request(
+                'search', keyword=random.choice(keywords)
+            )
+        done += 1
+        failed += not response["ok"]
+    return done, failed
+
+
+async def run(args) -> float:
+    clients = [LibraryClient(args.host, args.port)
+               for _ in range(args.clients)]
+    for client in clients:
+        await client.connect()
+    facets = await clients[0].request('facets', field='author')
+    keywords = [word for author in facets["result"]
+                for word in author.split()] or ['a']
+    session = None
+    if args.user:
+        session = (await clients[0].request(
+            'login', id=args.user, password=args.password))["result"]
+    books = (args.books or []) + [None] * len(clients)
+    deadline = perf_counter() + args.duration
+    start = perf_counter()
+    results = await asyncio.gather(*(
+        desk(client, deadline, keywords, session, book_id)
+        for client, book_id in zip(clients, books)
+    ))
+    elapsed = perf_counter() - start
+    for client in clients:
+        await client.close()
+    done = sum(result[0] for result in results)
+    failed = sum(result[1] for result in results)
+    print(f'{done} requests ({failed} failed) from {args.clients} desks ' +
+          f'in {elapsed:.1f} s: {done / elapsed:.0f} requests/s.')
+    return done / elapsed
+
+
+def main():
+    parser = ArgumentParser(description='Measure requests per second ' +
+                            'of the library server.')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--user', type=int, help='user ID for borrowing')
+    parser.add_argument('--password')
+    parser.add_argument('--books', type=int, nargs='*',
+                        help='IDs of books borrowed and returned by desks')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,11 @@
 from class_book import Book
-from class_library import Library
+from class_library import LazyLibrary
 from class_user import User, Librarian
 from getpass import getpass
-from matplotlib import pyplot as plt
-from matplotlib.ticker import MaxNLocator as max
-from prettytable import PrettyTable
-from generate_id import (
-    generate_book_id,
-    generate_user_id,
-    generate_librarian_id
-)
+from snapshot import open_snapshot
+from stats import plot_stats
+from watcher import Watcher
+from generate_id import reserved_id
 from print_methods import (
     print_with_box,
     print_with_box_up,
@@ -57,10 +53,14 @@ from errors import (
     RemoveYourselfError,
     NoUserIDError,
     NotReservedError,
-    DoubleReservationBookError
+    DoubleReservationBookError,
+    RecordConflictError,
 )
 
-library = Library()
+# Charts of the stats menu, in the order of its options.
+STATS_CHARTS = ['books', 'users', 'genre', 'author', 'release_year', 'month']
+
+library = LazyLibrary()
 current_user = None
 current_librarian = None
 
@@ -68,7 +68,9 @@ current_librarian = None
 def main():
     """
     Entry point of the library management system.
+    Changes made by other terminals are picked up in the background.
     """
+    Watcher(library).start()
     print_with_box_up(' '*9 + 'Library' + ' '*9, 27)
     library_start()
 
@@ -94,11 +96,28 @@ def error_message(message, interface):
         interface()
 
 
+def catalog():
+    """
+    Returns the catalog snapshot for the book lists and searches if one
+    is set (LIBRARY_SNAPSHOT) and up to date, otherwise the library.
+    """
+    return open_snapshot() or library
+
+
+def new_table():
+    """
+    Returns an empty table. PrettyTable is imported on first use,
+    so that it does not slow down the start of the application.
+    """
+    from prettytable import PrettyTable
+    return PrettyTable()
+
+
 def books_table():
     """
     Prints a table with information about available books.
     """
-    result = PrettyTable()
+    result = new_table()
     result.field_names = ["ID",
                           "Title",
                           "Author",
@@ -107,7 +126,7 @@ def books_table():
                           "Available",
                           "Reserv.",
                           "Return date"]
-    rows = library.available_books_info()
+    rows = catalog().available_books_info()
     result.add_rows(rows)
     print(result)
 
@@ -119,7 +138,7 @@ def users_librarians_table(users, librarians):
     if not users:
         print('Users: ' + red('None'))
     else:
-        users_table = PrettyTable()
+        users_table = new_table()
         users_table.field_names = ["ID",
                                    "Name",
                                    "Password",
@@ -131,7 +150,7 @@ def users_librarians_table(users, librarians):
     if not librarians:
         print('Librarians: ' + red('None'))
     else:
-        librarians_table = PrettyTable()
+        librarians_table = new_table()
         librarians_table.field_names = ["ID",
                                         "Name",
                                         "Password"]
@@ -147,7 +166,7 @@ def users_books_table():
     if not current_user.borrowed_books:
         print('Borrowed books: ' + red('None'))
     else:
-        borrowed = PrettyTable()
+        borrowed = new_table()
         borrowed.field_names = ["ID",
                                 "Title",
                                 "Author",
@@ -159,7 +178,7 @@ def users_books_table():
     if not current_user.borrowing_history:
         print('Borrowing history: ' + red('None'))
     else:
-        history = PrettyTable()
+        history = new_table()
         history.field_names = ["ID",
                                "Title",
                                "Author"]
@@ -169,7 +188,7 @@ def users_books_table():
     if not current_user.reservations:
         print('Reservations: ' + red('None'))
     else:
-        reservations = PrettyTable()
+        reservations = new_table()
         reservations.field_names = ["ID",
                                     "Title",
                                     "Author",
@@ -180,6 +199,26 @@ def users_books_table():
         print('Reservations:\n' + reservations.get_string())
 
 
+def overdue_table():
+    """
+    Prints tables with overdue books and books due within a week.
+    """
+    reports = (('Overdue books', library.overdue_books()),
+               ('Due within a week', library.approaching_books()))
+    for name, rows in reports:
+        if not rows:
+            print(f'{name}: ' + green('None'))
+        else:
+            table = new_table()
+            table.field_names = ["ID",
+                                 "Title",
+                                 "User ID",
+                                 "Return date",
+                                 "Days left"]
+            table.add_rows(rows)
+            print(f'{name}:\n' + table.get_string())
+
+
 def library_start():
     """
     Displays start options and handles user input.
@@ -218,7 +257,7 @@ def login():
             password = getpass('Enter your password: ')
             check = library.login_role_check(id, password)
             if check:
-                if str(check["id"]).startswith('1'):
+                if library.is_librarian(check["id"]):
                     current_librarian = Librarian(**check)
                     message = f'Welcome, {current_librarian.name}!'
                     print_with_box(message, len(message) + 2)
@@ -246,8 +285,9 @@ def create_account():
         try:
             name = input('Enter your name: ')
             password = getpass('Enter your password: ')
-            current_user = User(generate_user_id(), name, password)
-            library.add_new_user(current_user)
+            with reserved_id('users.json') as id:
+                current_user = User(id, name, password)
+                library.add_new_user(current_user)
             id = current_user.id
             name = current_user.name
             message = f'Welcome to our library, {name}! Your ID is {id}'
@@ -287,6 +327,15 @@ def user_interface():
         break
 
 
+def print_facet(field):
+    """
+    Prints available genres, authors or release years
+    with the number of books for each of them.
+    """
+    counts = catalog().facet_counts(field)
+    print('\n'.join(f'{value} ({count})' for value, count in counts.items()))
+
+
 def search_book_user_interface():
     """
     Displays search options for users and handles user input.
@@ -301,7 +350,7 @@ def search_book_user_interface():
                     library_books_user_interface()
                 elif choice == 2:
                     try:
-                        print('\n'.join(library.available_genres()))
+                        print_facet('genre')
                         search_genre(search_book_user_interface)
                         library_books_user_interface()
                     except GenresNotFoundError as e:
@@ -309,7 +358,7 @@ def search_book_user_interface():
                         search_book_user_interface()
                 elif choice == 3:
                     try:
-                        print('\n'.join(library.available_authors()))
+                        print_facet('author')
                         search_author(search_book_user_interface)
                         library_books_user_interface()
                     except AuthorsNotFoundError as e:
@@ -317,7 +366,7 @@ def search_book_user_interface():
                         search_book_user_interface()
                 elif choice == 4:
                     try:
-                        print('\n'.join(library.available_years()))
+                        print_facet('release_year')
                         search_year(search_book_user_interface)
                         library_books_user_interface()
                     except YearsNotFoundError as e:
@@ -355,7 +404,7 @@ def search_keyword(search_interface):
     def keyword():
         global library
         keyword = input('Enter the keyword: ')
-        result = PrettyTable()
+        result = new_table()
         result.field_names = ["ID",
                               "Title",
                               "Author",
@@ -366,7 +415,7 @@ def search_keyword(search_interface):
                               "Extensions",
                               "Reservations",
                               "Return date"]
-        rows = library.search_book_by_keyword(keyword)
+        rows = catalog().search_book_by_keyword(keyword)
         result.add_rows(rows)
         return result
     search_by(
@@ -383,7 +432,7 @@ def search_genre(search_interface):
     def genre():
         global library
         genre = input('Enter the genre: ')
-        result = PrettyTable()
+        result = new_table()
         result.field_names = ["ID",
                               "Title",
                               "Author",
@@ -394,7 +443,7 @@ def search_genre(search_interface):
                               "Extensions",
                               "Reservations",
                               "Return date"]
-        rows = library.search_book_by_genre(genre)
+        rows = catalog().search_book_by_genre(genre)
         result.add_rows(rows)
         return result
     search_by(
@@ -411,7 +460,7 @@ def search_author(search_interface):
     def author():
         global library
         author = input('Enter the author: ')
-        result = PrettyTable()
+        result = new_table()
         result.field_names = ["ID",
                               "Title",
                               "Author",
@@ -422,7 +471,7 @@ def search_author(search_interface):
                               "Extensions",
                               "Reservations",
                               "Return date"]
-        rows = library.search_book_by_author(author)
+        rows = catalog().search_book_by_author(author)
         result.add_rows(rows)
         return result
     search_by(
@@ -439,7 +488,7 @@ def search_year(search_interface):
     def year():
         global library
         year = input('Enter the year: ')
-        result = PrettyTable()
+        result = new_table()
         result.field_names = ["ID",
                               "Title",
                               "Author",
@@ -450,7 +499,7 @@ def search_year(search_interface):
                               "Extensions",
                               "Reservations",
                               "Return date"]
-        rows = library.search_book_by_year(year)
+        rows = catalog().search_book_by_year(year)
         result.add_rows(rows)
         return result
     search_by(
@@ -491,13 +540,17 @@ def user_operation(operation, errors, interface, table):
         try:
             book_id = int(input('Enter book ID: '))
             message = operation(book_id)
-            library.update_data()
+            library.refresh()
             table()
             print(green(str(message)))
             interface()
         except errors as e:
             error_message(e, user_interface)
             interface()
+        except RecordConflictError as e:
+            library.refresh()
+            error_message(e, user_interface)
+            interface()
 
         except ValueError:
             error_message('Incorrect ID.', user_interface)
@@ -604,29 +657,17 @@ def get_stats(interface):
         for _ in range(3):
             try:
                 choice = int(input('Enter your choice: '))
-                if choice == 1:
-                    books = list(library.get_books_stats().keys())
-                    stats = list(library.get_books_stats().values())
-                    plt.barh(books, stats)
-                    plt.xlabel("Titles")
-                    plt.ylabel("Total loans")
-                    plt.title("Books stats")
-                    plt.gca().xaxis.set_major_locator(max(integer=True))
-                    plt.tight_layout()
-                    plt.show()
-                    get_stats(interface)
-                elif choice == 2:
-                    users = list(library.get_users_stats().keys())
-                    stats = list(library.get_users_stats().values())
-                    plt.barh(users, stats)
-                    plt.ylabel("Names")
-                    plt.xlabel("Borrowed books")
-                    plt.title("Users stats")
-                    plt.gca().xaxis.set_major_locator(max(integer=True))
-                    plt.tight_layout()
-                    plt.show()
+                if 1 <= choice <= len(STATS_CHARTS):
+                    try:
+                        plot_stats(library, STATS_CHARTS[choice - 1])
+                    except (
+                        GenresNotFoundError,
+                        AuthorsNotFoundError,
+                        YearsNotFoundError,
+                    ) as e:
+                        error_message(e, interface)
                     get_stats(interface)
-                elif choice == 3:
+                elif choice == len(STATS_CHARTS) + 1:
                     interface()
                 else:
                     raise ValueError
@@ -658,8 +699,11 @@ def librarian_interface():
                     search_users_librarian()
                     library_users_librarian_interface()
                 elif choice == 5:
-                    get_stats(librarian_interface)
+                    overdue_table()
+                    librarian_interface()
                 elif choice == 6:
+                    get_stats(librarian_interface)
+                elif choice == 7:
                     library_start()
                 else:
                     raise ValueError
@@ -701,24 +745,26 @@ def librarian_id_operation(
         interface,
         obj_id,
         table=books_table,
-        new_id=None,
+        id_file=None,
         librarian_id=None,
         ):
     """
     Generic function to perform librarian operations
-    like adding, removing, etc.
+    like adding, removing, etc. With id_file set, the operation
+    gets a new ID for a record of that data file.
     """
     global librarian
     while True:
         try:
             id = int(input(f'Enter {obj_id} ID: '))
-            if new_id:
-                message = operation(id, new_id)
+            if id_file:
+                with reserved_id(id_file) as new_id:
+                    message = operation(id, new_id)
             elif librarian_id:
                 message = operation(id, librarian_id)
             else:
                 message = operation(id)
-            library.update_data()
+            library.refresh()
             if table == users_librarians_table:
                 users, librarians = library.users_librarians()
                 table(users, librarians)
@@ -744,8 +790,9 @@ def add_book():
             author = input('Enter the author: ')
             release_year = input('Enter the release year: ')
             genre = input('Enter the genre: ')
-            book = Book(generate_book_id(), title, author, release_year, genre)
-            message = library.add_new_book(book)
+            with reserved_id('books.json') as id:
+                book = Book(id, title, author, release_year, genre)
+                message = library.add_new_book(book)
             books_table()
             print(green(str(message)))
             library_books_librarian_interface()
@@ -767,14 +814,16 @@ def add_user(is_librarian=False):
             name = input('Enter the name: ')
             password = getpass('Enter the password: ')
             if is_librarian:
-                librarian = Librarian(generate_librarian_id(), name, password)
-                message = library.add_new_librarian(librarian)
+                with reserved_id('librarians.json') as id:
+                    librarian = Librarian(id, name, password)
+                    message = library.add_new_librarian(librarian)
                 users, librarians = library.users_librarians()
                 users_librarians_table(users, librarians)
                 print(green(str(message)))
             else:
-                user = User(generate_user_id(), name, password)
-                message = library.add_new_user(user)
+                with reserved_id('users.json') as id:
+                    user = User(id, name, password)
+                    message = library.add_new_user(user)
                 users, librarians = library.users_librarians()
                 users_librarians_table(users, librarians)
                 print(green(str(message)))
@@ -792,7 +841,7 @@ def add_book_copy():
         NoBookIDError,
         library_books_librarian_interface,
         'book',
-        new_id=generate_book_id(),
+        id_file='books.json',
     )
 
 
@@ -850,7 +899,7 @@ def search_book_librarian_interface():
                     library_books_librarian_interface()
                 elif choice == 2:
                     try:
-                        print('\n'.join(library.available_genres()))
+                        print_facet('genre')
                         search_genre(search_book_librarian_interface)
                         library_books_librarian_interface()
                     except GenresNotFoundError as e:
@@ -858,7 +907,7 @@ def search_book_librarian_interface():
                         search_book_librarian_interface()
                 elif choice == 3:
                     try:
-                        print('\n'.join(library.available_authors()))
+                        print_facet('author')
                         search_author(search_book_librarian_interface)
                         library_books_librarian_interface()
                     except AuthorsNotFoundError as e:
@@ -866,7 +915,7 @@ def search_book_librarian_interface():
                         search_book_librarian_interface()
                 elif choice == 4:
                     try:
-                        print('\n'.join(library.available_years()))
+                        print_facet('release_year')
                         search_year(search_book_librarian_interface)
                         library_books_librarian_interface()
                     except YearsNotFoundError as e:
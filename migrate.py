@@ -0,0 +1,109 @@
+from argparse import ArgumentParser
+from storage import (
+    JSONStorage,
+    JournalStorage,
+    JSONLinesStorage,
+    SQLiteStorage,
+    TABLES,
+)
+from json_methods import read_json, write_json, write_meta
+from generate_id import BRANCH_SIZE, check_branch
+from errors import InvalidBranchError
+
+
+def migrate_to_sqlite(db_path: str = 'library.db'):
+    """
+    Copies books, users and librarians from the JSON files
+    into an SQLite database.
+    """
+    database = SQLiteStorage(db_path)
+    database.import_from(JSONStorage())
+    database.close()
+    return f'Library data has been migrated to {db_path}.'
+
+
+def convert_to_jsonl():
+    """
+    Converts the JSON files of books, users and librarians
+    into JSON Lines files with offset indexes.
+    """
+    JSONLinesStorage().import_from(JSONStorage())
+    return 'Library data has been converted to JSON Lines.'
+
+
+def convert_to_json():
+    """
+    Converts the JSON Lines files of books, users and
+    librarians back into JSON files.
+    """
+    json_lines = JSONLinesStorage()
+    for file in TABLES:
+        JSONStorage().save(file, list(json_lines.iter_records(file)))
+    return 'Library data has been converted to JSON.'
+
+
+def compact_journals():
+    """
+    Folds the journals of books, users and librarians into the JSON files.
+    """
+    journal = JournalStorage()
+    for file in TABLES:
+        journal.compact(file)
+    return 'Journals have been compacted.'
+
+
+def migrate_ids(branch: int):
+    """
+    Moves book and user IDs into the ID partition of the branch and
+    updates all references to them. IDs already moved are left as they
+    are. The ID allocators are rebuilt on next use.
+    """
+    offset = check_branch(branch) * BRANCH_SIZE
+
+    def moved(id):
+        return id + offset if id is not None and id < BRANCH_SIZE else id
+    books = read_json('books.json')
+    for book_info in books:
+        book_info["id"] = moved(book_info["id"])
+        book_info["current_owner"] = moved(book_info["current_owner"])
+        book_info["loan_history"] = list(map(moved, book_info["loan_history"]))
+        book_info["reservations"] = list(map(moved, book_info["reservations"]))
+    users = read_json('users.json')
+    for user_info in users:
+        user_info["id"] = moved(user_info["id"])
+        for field in ('borrowed_books', 'reservations', 'borrowing_history'):
+            user_info[field] = list(map(moved, user_info[field]))
+    write_json('books.json', books)
+    write_json('users.json', users)
+    write_meta('ids', None)
+    return f'Book and user IDs have been moved to branch {branch}.'
+
+
+def main():
+    parser = ArgumentParser(description='Library data migrations.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    sqlite = commands.add_parser('sqlite', help='migrate JSON files to SQLite')
+    sqlite.add_argument('--db', default='library.db')
+    commands.add_parser('jsonl', help='convert JSON files to JSON Lines')
+    commands.add_parser('json', help='convert JSON Lines files to JSON')
+    commands.add_parser('compact', help='fold journals into JSON files')
+    ids = commands.add_parser('ids', help='move IDs to a branch partition')
+    ids.add_argument('--branch', type=int, required=True)
+    args = parser.parse_args()
+    if args.command == 'sqlite':
+        print(migrate_to_sqlite(args.db))
+    elif args.command == 'jsonl':
+        print(convert_to_jsonl())
+    elif args.command == 'json':
+        print(convert_to_json())
+    elif args.command == 'compact':
+        print(compact_journals())
+    elif args.command == 'ids':
+        try:
+            print(migrate_ids(args.branch))
+        except InvalidBranchError as e:
+            parser.error(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -44,8 +44,9 @@ def librarian_options():
     print_with_box_down('2 -> Search a book', 31)
     print_with_box_down('3 -> Library users/librarians', 31)
     print_with_box_down('4 -> Search a user/librarian', 31)
-    print_with_box_down('5 -> Check stats', 31)
-    print_with_box_down('6 -> Log out', 31)
+    print_with_box_down('5 -> Overdue books', 31)
+    print_with_box_down('6 -> Check stats', 31)
+    print_with_box_down('7 -> Log out', 31)
 
 
 def librarians_books_options():
@@ -64,6 +65,10 @@ def librarians_users_options():
 
 
 def stats_options():
-    print_with_box('1 -> Books stats', 18)
-    print_with_box_down('2 -> Users stats', 18)
-    print_with_box_down('3 -> Go back', 18)
+    print_with_box('1 -> Books stats', 27)
+    print_with_box_down('2 -> Users stats', 27)
+    print_with_box_down('3 -> Loans by genre', 27)
+    print_with_box_down('4 -> Loans by author', 27)
+    print_with_box_down('5 -> Loans by release year', 27)
+    print_with_box_down('6 -> Books due by month', 27)
+    print_with_box_down('7 -> Go back', 27)
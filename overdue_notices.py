@@ -0,0 +1,70 @@
+import json
+import os
+from argparse import ArgumentParser
+from datetime import date
+from time import perf_counter
+from json_methods import iter_records, find_records
+
+
+def loan_notices(books, today: date, days: int = 7):
+    """
+    Yields notices for borrowed books which are overdue
+    or have to be returned within the given number of days.
+    """
+    for book_info in books:
+        owner = book_info["current_owner"]
+        return_date = book_info["return_date"]
+        if not owner or not return_date:
+            continue
+        days_left = (date.fromisoformat(str(return_date)) - today).days
+        if days_left < 0:
+            status = 'overdue'
+        elif 0 < days_left < days:
+            status = 'approaching'
+        else:
+            continue
+        yield {
+            "user_id": owner,
+            "book_id": book_info["id"],
+            "title": book_info["title"],
+            "return_date": str(return_date),
+            "days_left": days_left,
+            "status": status,
+        }
+
+
+def write_notices(outbox: str = 'outbox.jsonl', today=None, days: int = 7):
+    """
+    Writes due date notices for all users to the outbox file, one JSON
+    notice per line, in a single pass over the books. The outbox is
+    replaced only once all notices have been written. The books
+    are streamed, so the catalog is never loaded into memory.
+    """
+    today = today or date.today()
+    notices = list(loan_notices(iter_records('books.json'), today, days))
+    users = find_records('users.json', [n["user_id"] for n in notices])
+    temp_file = f'{outbox}.tmp'
+    with open(temp_file, 'w') as file_handle:
+        for notice in notices:
+            user_info = users.get(notice["user_id"])
+            notice["name"] = user_info["name"] if user_info else None
+            notice["date"] = str(today)
+            file_handle.write(json.dumps(notice) + '\n')
+    os.replace(temp_file, outbox)
+    return len(notices)
+
+
+def main():
+    parser = ArgumentParser(description='Write due date notices to a file.')
+    parser.add_argument('--outbox', default='outbox.jsonl')
+    parser.add_argument('--date', type=date.fromisoformat, default=None)
+    parser.add_argument('--days', type=int, default=7)
+    args = parser.parse_args()
+    start = perf_counter()
+    count = write_notices(args.outbox, args.date, args.days)
+    print(f'{count} notices written to {args.outbox} ' +
+          f'in {perf_counter() - start:.2f} s.')
+
+
+if __name__ == "__main__":
+    main()
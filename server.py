@@ -0,0 +1,242 @@
+import asyncio
+import json
+import secrets
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from class_library import Library
+from class_user import User
+from storage import encode_value
+from errors import (
+    WrongIDError,
+    NotLoggedInError,
+    LibrarianOnlyError,
+    UnknownOperationError,
+)
+
+HOST = '127.0.0.1'
+PORT = 8765
+
+# Operations changing the data, run one at a time by the writer task.
+WRITES = ('borrow', 'return_book', 'reserve', 'cancel', 'extend')
+
+
+class LibraryService:
+    """
+    Library operations for many desks, served by one process which owns
+    the data. Reads are answered from the library kept in memory with
+    its indexes. Writes are queued and run one at a time by a single
+    writer task on a thread of their own, so that the event loop keeps
+    answering reads while a file is written, and the library follows
+    them through its listener.
+    """
+    def __init__(self, library=None):
+        self._library = library or Library()
+        self._sessions = {}
+        self._writes = asyncio.Queue()
+        self._writer = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def start(self):
+        """
+        Starts the writer task, from within the event loop.
+        """
+        self._writer = asyncio.create_task(self._write_loop())
+
+    async def stop(self):
+        self._writer.cancel()
+        try:
+            await self._writer
+        except asyncio.CancelledError:
+            pass
+        self._executor.shutdown()
+
+    async def _write_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            operation, future = await self._writes.get()
+            try:
+                future.set_result(
+                    await loop.run_in_executor(self._executor, operation)
+                )
+            except Exception as e:
+                future.set_exception(e)
+
+    async def _write(self, operation):
+        """
+        Queues an operation for the writer task and returns its result.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._writes.put((operation, future))
+        return await future
+
+    def _session(self, token: str, role: str = None) -> dict:
+        session = self._sessions.get(token)
+        if session is None:
+            raise NotLoggedInError
+        if role == 'librarian' and session["role"] != 'librarian':
+            raise LibrarianOnlyError
+        return session
+
+    def _user(self, token: str) -> User:
+        session = self._session(token)
+        user_info = self._library.get_user(session["id"])
+        if user_info is None:
+            raise NotLoggedInError
+        return User(**user_info)
+
+    async def handle(self, request: dict) -> dict:
+        """
+        Runs a request ({"op": name, "args": {...}}) and returns
+        the response with its result or error message.
+        """
+        try:
+            operation = request.get("op")
+            if operation not in OPERATIONS:
+                raise UnknownOperationError(operation)
+            method = getattr(self, operation)
+            result = await method(**request.get("args", {}))
+            return {"ok": True, "result": result}
+        except Exception as e:
+            return {"ok": False, "error": str(e), "type": type(e).__name__}
+
+    async def login(self, id: int, password: str) -> dict:
+        info = self._library.login_role_check(id, password)
+        if not info:
+            raise WrongIDError
+        role = 'librarian' if self._library.is_librarian(id) else 'user'
+        token = secrets.token_hex(16)
+        self._sessions[token] = {"id": id, "role": role}
+        return {"token": token, "name": info["name"], "role": role}
+
+    async def logout(self, token: str):
+        self._sessions.pop(token, None)
+
+    async def books(self) -> list:
+        return self._library.available_books_info()
+
+    async def search(self, keyword: str) -> list:
+        return self._library.search_book_by_keyword(keyword)
+
+    async def facets(self, field: str) -> dict:
+        return self._library.facet_counts(field)
+
+    async def search_facet(self, field: str, value) -> list:
+        return self._library.search_book_by_facet(field, value)
+
+    async def borrowed_books(self, token: str) -> list:
+        return self._user(token).get_borrowed_books()
+
+    async def _user_operation(self, name: str, token: str, book_id: int):
+        """
+        Queues an operation of the logged in user. The user is read
+        when the operation runs, after the writes queued before it.
+        """
+        self._session(token)
+        return await self._write(
+            lambda: getattr(self._user(token), name)(book_id)
+        )
+
+    async def borrow(self, token: str, book_id: int) -> str:
+        return await self._user_operation('borrow_book', token, book_id)
+
+    async def return_book(self, token: str, book_id: int) -> str:
+        return await self._user_operation('return_book', token, book_id)
+
+    async def reserve(self, token: str, book_id: int) -> str:
+        return await self._user_operation('reserve_book', token, book_id)
+
+    async def cancel(self, token: str, book_id: int) -> str:
+        return await self._user_operation(
+            'cancel_reservation', token, book_id
+        )
+
+    async def extend(self, token: str, book_id: int) -> str:
+        return await self._user_operation('use_extension', token, book_id)
+
+    async def stats(self, token: str, n: int = 10) -> dict:
+        self._session(token, 'librarian')
+        return {
+            "books": self._library.top_books(n),
+            "users": self._library.top_users(n),
+            "overdue": self._library.overdue_books(),
+        }
+
+
+# Requests handled by the service methods of the same name.
+OPERATIONS = (
+    'login', 'logout', 'books', 'search', 'facets', 'search_facet',
+    'borrowed_books', 'stats', *WRITES,
+)
+
+
+async def serve(service: LibraryService, host: str = HOST, port: int = PORT):
+    """
+    Returns a server answering requests sent as JSON lines,
+    one response line for every request line.
+    """
+    async def connection(reader, writer):
+        try:
+            async for line in reader:
+                try:
+                    response = await service.handle(json.loads(line))
+                except json.JSONDecodeError:
+                    response = {"ok": False, "error": 'Invalid request.',
+                                "type": 'JSONDecodeError'}
+                writer.write(
+                    json.dumps(response, default=encode_value).encode() +
+                    b'\n'
+                )
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+    service.start()
+    return await asyncio.start_server(connection, host, port)
+
+
+class LibraryClient:
+    """
+    Client of the library server for a single desk.
+    """
+    def __init__(self, host: str = HOST, port: int = PORT):
+        self._address = (host, port)
+        self._reader = None
+        self._writer = None
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.open_connection(
+            *self._address
+        )
+
+    async def close(self):
+        self._writer.close()
+        await self._writer.wait_closed()
+
+    async def request(self, op: str, **args) -> dict:
+        """
+        Sends a request and returns the response.
+        """
+        request = json.dumps({"op": op, "args": args}).encode() + b'\n'
+        self._writer.write(request)
+        await self._writer.drain()
+        return json.loads(await self._reader.readline())
+
+
+async def run(host: str, port: int):
+    server = await serve(LibraryService(), host, port)
+    print(f'Library server listening on {host}:{port}.')
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = ArgumentParser(description='Serve the library to many desks.')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    args = parser.parse_args()
+    asyncio.run(run(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
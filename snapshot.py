@@ -0,0 +1,389 @@
+import json
+import mmap
+import os
+import struct
+from argparse import ArgumentParser
+from bisect import bisect_left
+from datetime import date
+from class_library import FACET_ERRORS, SEARCH_FIELDS
+from indexes import tokenize
+from json_methods import read_json, data_version
+from storage import file_stamps
+from errors import NoKeywordError, KeywordNotFoundError
+
+# Snapshot layout (little-endian): the header, then the book records
+# sorted by ID, the positions of the records in the order of the catalog,
+# the string table (offset and length of every interned UTF-8 string)
+# and its data, the sorted search words with their postings (positions
+# in catalog order) and the loan history and reservation IDs. Release
+# years are interned as JSON, as they may be numbers or strings.
+MAGIC = b'LIBSNAP2'
+HEADER = struct.Struct('<8s4I7Q')
+RECORD = struct.Struct('<q4Iqii4I')
+STRING = struct.Struct('<2I')
+WORD = struct.Struct('<3I')
+POSITION = struct.Struct('<I')
+ID = struct.Struct('<q')
+
+FIELDS = ('title', 'author', 'genre')
+
+
+def _pack(fmt: struct.Struct, rows) -> bytes:
+    return b''.join(fmt.pack(*row) for row in rows)
+
+
+def write_snapshot(path: str = 'catalog.snap', books=None) -> int:
+    """
+    Exports the book catalog to a read-only binary snapshot and returns
+    the number of books. The snapshot replaces the old one only once
+    it is complete, so processes using the old one are not affected.
+    """
+    version = data_version('books.json')
+    if books is None:
+        books = read_json('books.json')
+    strings = {}
+
+    def intern(value: str) -> int:
+        return strings.setdefault(value, len(strings))
+
+    version_id = intern(json.dumps(version))
+    by_id = sorted(range(len(books)), key=lambda i: books[i]["id"])
+    table_position = {book: position for position, book in enumerate(by_id)}
+    ids = []
+    records = []
+    for book in by_id:
+        info = books[book]
+        lists = []
+        for field in ('loan_history', 'reservations'):
+            lists += [len(ids), len(info[field] or ())]
+            ids += [(id,) for id in info[field] or ()]
+        return_date = info["return_date"]
+        records.append((
+            info["id"],
+            *(intern(info[field]) for field in FIELDS),
+            intern(json.dumps(info["release_year"])),
+            info["current_owner"] or 0,
+            info["extensions"],
+            date.fromisoformat(str(return_date)).toordinal()
+            if return_date else 0,
+            *lists,
+        ))
+    postings = {}
+    for position, info in enumerate(books):
+        words = set()
+        for field in SEARCH_FIELDS:
+            words.update(tokenize(info[field]))
+        for word in words:
+            postings.setdefault(word.encode(), []).append(position)
+    words = []
+    positions = []
+    for word in sorted(postings):
+        words.append((intern(word.decode()), len(positions),
+                      len(postings[word])))
+        positions += [(position,) for position in postings[word]]
+    data = [value.encode() for value in strings]
+    string_table = []
+    offset = 0
+    for value in data:
+        string_table.append((offset, len(value)))
+        offset += len(value)
+    sections = [
+        _pack(RECORD, records),
+        _pack(POSITION, [(table_position[i],) for i in range(len(books))]),
+        _pack(STRING, string_table),
+        b''.join(data),
+        _pack(WORD, words),
+        _pack(POSITION, positions),
+        _pack(ID, ids),
+    ]
+    offsets = []
+    offset = HEADER.size
+    for section in sections:
+        offsets.append(offset)
+        offset += len(section)
+    temp_file = f'{path}.{os.getpid()}.tmp'
+    with open(temp_file, 'wb') as file_handle:
+        file_handle.write(HEADER.pack(
+            MAGIC, len(books), len(strings), len(words), version_id, *offsets
+        ))
+        for section in sections:
+            file_handle.write(section)
+    os.replace(temp_file, path)
+    return len(books)
+
+
+class CatalogSnapshot:
+    """
+    Read-only book catalog opened from a snapshot with mmap, so that
+    the processes using it share one page-cached copy. Records are
+    read from the mapping on demand: books by ID with a binary search
+    and keyword searches with the sorted words of the snapshot.
+    Searches give the same results as those of Library.
+    """
+    def __init__(self, path: str = 'catalog.snap'):
+        with open(path, 'rb') as file_handle:
+            self._map = mmap.mmap(
+                file_handle.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        (magic, self._count, self._strings, self._words, version_id,
+         self._records_at, self._order_at, self._table_at, self._data_at,
+         self._words_at, self._postings_at, self._ids_at
+         ) = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a catalog snapshot.')
+        self.version = json.loads(self._string(version_id))
+        self._string_ids = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self):
+        self._map.close()
+
+    def is_current(self) -> bool:
+        """
+        Checks if the books have not been changed since the export.
+        """
+        version = data_version('books.json')
+        return json.loads(json.dumps(version)) == self.version
+
+    def _string(self, index: int) -> str:
+        offset, length = STRING.unpack_from(
+            self._map, self._table_at + index * STRING.size
+        )
+        start = self._data_at + offset
+        return str(self._map[start:start + length], 'utf-8')
+
+    def _string_id(self, value: str):
+        if self._string_ids is None:
+            self._string_ids = {
+                self._string(index): index for index in range(self._strings)
+            }
+        return self._string_ids.get(value)
+
+    def _record(self, index: int) -> tuple:
+        return RECORD.unpack_from(self._map, self._records_at +
+                                  index * RECORD.size)
+
+    def _ids(self, offset: int, count: int) -> list:
+        start = self._ids_at + offset * ID.size
+        return [id for id, in ID.iter_unpack(
+            self._map[start:start + count * ID.size])]
+
+    def _catalog_records(self):
+        """
+        Yields the records in the order of the catalog.
+        """
+        for position in range(self._count):
+            index, = POSITION.unpack_from(
+                self._map, self._order_at + position * POSITION.size
+            )
+            yield self._record(index)
+
+    def _book_info(self, record: tuple) -> dict:
+        (id, title, author, genre, release_year, owner, extensions,
+         return_date, loans_at, loans, reservations_at, reservations
+         ) = record
+        return {
+            "id": id,
+            "title": self._string(title),
+            "author": self._string(author),
+            "release_year": self._year(release_year),
+            "genre": self._string(genre),
+            "loan_history": self._ids(loans_at, loans),
+            "current_owner": owner or None,
+            "extensions": extensions,
+            "reservations": self._ids(reservations_at, reservations),
+            "return_date": (date.fromordinal(return_date).isoformat()
+                            if return_date else None),
+        }
+
+    def _list_info(self, record: tuple) -> list:
+        """
+        Returns the same information as Book.list_info.
+        """
+        (id, title, author, genre, release_year, owner, _,
+         return_date, _, _, _, reservations) = record
+        return [id,
+                self._string(title),
+                self._string(author),
+                self._year(release_year),
+                self._string(genre),
+                "No" if owner else "Yes",
+                reservations,
+                date.fromordinal(return_date) if return_date else None
+                ]
+
+    def get_book(self, book_id: int):
+        """
+        Returns the record of the book with the given ID or None.
+        """
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            id, = ID.unpack_from(self._map, self._records_at +
+                                 middle * RECORD.size)
+            if id < book_id:
+                low = middle + 1
+            elif id > book_id:
+                high = middle
+            else:
+                return self._book_info(self._record(middle))
+        return None
+
+    def _word(self, index: int) -> bytes:
+        string, _, _ = WORD.unpack_from(self._map,
+                                        self._words_at + index * WORD.size)
+        offset, length = STRING.unpack_from(
+            self._map, self._table_at + string * STRING.size
+        )
+        start = self._data_at + offset
+        return self._map[start:start + length]
+
+    def _prefix_positions(self, prefix: bytes) -> set:
+        """
+        Returns the catalog positions of books with
+        a word starting with the prefix.
+        """
+        words = _Words(self)
+        index = bisect_left(words, prefix)
+        positions = set()
+        while index < self._words and self._word(index).startswith(prefix):
+            _, offset, count = WORD.unpack_from(
+                self._map, self._words_at + index * WORD.size
+            )
+            start = self._postings_at + offset * POSITION.size
+            positions.update(position for position, in POSITION.iter_unpack(
+                self._map[start:start + count * POSITION.size]))
+            index += 1
+        return positions
+
+    def _by_position(self, position: int) -> tuple:
+        index, = POSITION.unpack_from(
+            self._map, self._order_at + position * POSITION.size
+        )
+        return self._record(index)
+
+    def search_book_by_keyword(self, keyword: str) -> list:
+        """
+        Searches for books by a keyword, like Library.search_book_by_keyword.
+        """
+        if not keyword:
+            raise NoKeywordError
+        positions = None
+        for term in sorted(tokenize(keyword), key=len, reverse=True):
+            matches = self._prefix_positions(term.encode())
+            positions = matches if positions is None else positions & matches
+            if not positions:
+                break
+        if not positions:
+            raise KeywordNotFoundError
+        return [self._list_info(self._by_position(position))
+                for position in sorted(positions)]
+
+    def _year(self, index: int):
+        return json.loads(self._string(index))
+
+    def _value(self, record: tuple, field: str):
+        if field == 'release_year':
+            return str(self._year(record[4]))
+        return record[1 + FIELDS.index(field)]
+
+    def facet_counts(self, field: str) -> dict:
+        """
+        Returns the number of books for every genre,
+        author or release year.
+        """
+        counts = {}
+        for record in self._catalog_records():
+            value = self._value(record, field)
+            counts[value] = counts.get(value, 0) + 1
+        if not counts:
+            raise FACET_ERRORS[field][0]
+        if field == 'release_year':
+            return counts
+        return {self._string(value): count for value, count in counts.items()}
+
+    def search_book_by_facet(self, field: str, value) -> list:
+        """
+        Searches for books with the given genre, author or release year.
+        """
+        if field != 'release_year':
+            value = self._string_id(value)
+        searches = [self._list_info(record)
+                    for record in self._catalog_records()
+                    if value is not None and
+                    self._value(record, field) == value]
+        if not searches:
+            raise FACET_ERRORS[field][1]
+        return searches
+
+    def available_genres(self):
+        return list(self.facet_counts('genre'))
+
+    def search_book_by_genre(self, chosen_genre: str) -> list:
+        return self.search_book_by_facet('genre', chosen_genre)
+
+    def available_authors(self):
+        return list(self.facet_counts('author'))
+
+    def search_book_by_author(self, chosen_author: str) -> list:
+        return self.search_book_by_facet('author', chosen_author)
+
+    def available_years(self):
+        return list(self.facet_counts('release_year'))
+
+    def search_book_by_year(self, chosen_year: str) -> list:
+        return self.search_book_by_facet('release_year', chosen_year)
+
+    def available_books_info(self) -> list:
+        """
+        Returns information on all books in the catalog.
+        """
+        return [self._list_info(record) for record in self._catalog_records()]
+
+
+class _Words:
+    """
+    Sequence view of the sorted words of a snapshot for bisect.
+    """
+    def __init__(self, snapshot: CatalogSnapshot):
+        self._snapshot = snapshot
+
+    def __len__(self) -> int:
+        return self._snapshot._words
+
+    def __getitem__(self, index: int) -> bytes:
+        return self._snapshot._word(index)
+
+
+_snapshot = None
+
+
+def open_snapshot():
+    """
+    Returns the catalog snapshot set with the LIBRARY_SNAPSHOT
+    environment variable if it is up to date with the books, otherwise
+    None. The snapshot is opened again when the file is replaced.
+    """
+    global _snapshot
+    path = os.environ.get('LIBRARY_SNAPSHOT')
+    if not path or not os.path.exists(path):
+        return None
+    stamp = (path, file_stamps(path))
+    if _snapshot is None or _snapshot[0] != stamp:
+        _snapshot = (stamp, CatalogSnapshot(path))
+    snapshot = _snapshot[1]
+    return snapshot if snapshot.is_current() else None
+
+
+def main():
+    parser = ArgumentParser(description='Export a catalog snapshot.')
+    parser.add_argument('--output', default='catalog.snap')
+    args = parser.parse_args()
+    count = write_snapshot(args.output)
+    print(f'{count} books exported to {args.output}.')
+
+
+if __name__ == "__main__":
+    main()
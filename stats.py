@@ -0,0 +1,126 @@
+from argparse import ArgumentParser
+from heapq import nlargest
+from operator import itemgetter
+from class_library import Library, FACET_ERRORS
+from json_methods import iter_records
+
+# Number of bars in a chart, the remaining values are summed up as other.
+TOP_STATS = 20
+OTHER = 'Other'
+
+CHARTS = {
+    'books': ('Books stats', 'Titles', 'Total loans'),
+    'users': ('Users stats', 'Names', 'Borrowed books'),
+    'genre': ('Loans by genre', 'Genres', 'Total loans'),
+    'author': ('Loans by author', 'Authors', 'Total loans'),
+    'release_year': ('Loans by release year', 'Release years', 'Total loans'),
+    'month': ('Borrowed books by due month', 'Months', 'Books due'),
+}
+
+
+def reduce_series(counts: dict, n: int = TOP_STATS) -> dict:
+    """
+    Returns the n highest counts, with the sum of the
+    remaining ones (if any) under OTHER.
+    """
+    ordered = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+    series = dict(ordered[:n])
+    rest = sum(count for _, count in ordered[n:])
+    if rest:
+        series[OTHER] = rest
+    return series
+
+
+def stats_series(library: Library, chart: str, n: int = TOP_STATS) -> dict:
+    """
+    Returns the data of a chart, reduced to at most n + 1 bars.
+    Months are kept in order, only the last n are shown.
+    """
+    if chart == 'books':
+        return library.top_books(n)
+    if chart == 'users':
+        return library.top_users(n)
+    if chart == 'month':
+        return dict(list(library.due_by_month().items())[-n:])
+    return reduce_series(library.loans_by(chart), n)
+
+
+def stream_series(chart: str, n: int = TOP_STATS) -> dict:
+    """
+    Returns the same data as stats_series, computed in a single pass
+    over the streamed records without loading the library, so that
+    only the n bars (or one total per value) are kept in memory.
+    """
+    if chart in ('books', 'users'):
+        file, label, field = {
+            'books': ('books.json', 'title', 'loan_history'),
+            'users': ('users.json', 'name', 'borrowing_history'),
+        }[chart]
+        counts = ((f'{info[label]} ({info["id"]})', len(info[field] or ()))
+                  for info in iter_records(file))
+        return dict(nlargest(n, counts, key=itemgetter(1)))
+    totals = {}
+    for info in iter_records('books.json'):
+        if chart == 'month':
+            if not info["current_owner"] or not info["return_date"]:
+                continue
+            value = str(info["return_date"])[:7]
+            count = 1
+        else:
+            value = info[chart]
+            value = str(value) if chart == 'release_year' else value
+            count = len(info["loan_history"] or ())
+        totals[value] = totals.get(value, 0) + count
+    if chart == 'month':
+        return dict(sorted(totals.items())[-n:])
+    if not totals:
+        raise FACET_ERRORS[chart][0]
+    return reduce_series(totals, n)
+
+
+def plot_series(series: dict, chart: str, output=None):
+    """
+    Draws a bar chart of the series. With an output file the chart
+    is rendered without a display to PNG or SVG (by the file extension),
+    otherwise it is shown in a window.
+    """
+    import matplotlib
+    if output:
+        matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+    from matplotlib.ticker import MaxNLocator
+    title, labels, values = CHARTS[chart]
+    plt.figure()
+    plt.barh([str(label) for label in series], list(series.values()))
+    plt.ylabel(labels)
+    plt.xlabel(values)
+    plt.title(title)
+    plt.gca().xaxis.set_major_locator(MaxNLocator(integer=True))
+    plt.tight_layout()
+    if output:
+        plt.savefig(output)
+        plt.close()
+    else:
+        plt.show()
+
+
+def plot_stats(library: Library, chart: str, n: int = TOP_STATS, output=None):
+    """
+    Draws one of the library charts.
+    """
+    plot_series(stats_series(library, chart, n), chart, output)
+
+
+def main():
+    parser = ArgumentParser(description='Render library stats charts.')
+    parser.add_argument('chart', choices=CHARTS)
+    parser.add_argument('--top', type=int, default=TOP_STATS)
+    parser.add_argument('--output', help='PNG or SVG file to write')
+    args = parser.parse_args()
+    plot_series(stream_series(args.chart, args.top), args.chart, args.output)
+    if args.output:
+        print(f'{CHARTS[args.chart][0]} written to {args.output}.')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1008 @@
+import json
+import os
+import re
+from contextlib import contextmanager
+from copy import deepcopy
+from array import array
+from datetime import date
+from threading import RLock
+from errors import UnknownStorageError
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Scalar columns and list fields of every collection in the SQLite backend.
+# Each list field is kept in its own table ordered by position.
+TABLES = {
+    'books.json': (
+        'books',
+        ('title', 'author', 'release_year', 'genre',
+         'current_owner', 'extensions', 'return_date'),
+        ('loan_history', 'reservations'),
+    ),
+    'users.json': (
+        'users',
+        ('name', 'password'),
+        ('borrowed_books', 'reservations', 'borrowing_history'),
+    ),
+    'librarians.json': (
+        'librarians',
+        ('name', 'password'),
+        (),
+    ),
+}
+
+# File with metadata kept next to the JSON data files.
+META_FILE = 'meta.json'
+
+# Number of IDs queried at once, below the SQLite limit of parameters.
+BATCH_SIZE = 500
+
+# Number of characters read at once when streaming a JSON file.
+READ_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r'\s*')
+
+INDEXED_COLUMNS = {
+    'books': ('title', 'author', 'release_year', 'genre',
+              'current_owner', 'return_date'),
+    'users': ('name',),
+    'librarians': ('name',),
+}
+
+
+class JSONStorage:
+    """
+    Storage backend keeping every collection
+    as a list of records in a JSON file.
+    Changes are made under an advisory lock of the file,
+    so several processes can write to the same files.
+    """
+    def __init__(self):
+        self._thread_lock = RLock()
+        self._held = {}
+
+    @contextmanager
+    def lock(self, files):
+        """
+        Holds exclusive locks of the given files (on a <file>.lock file
+        next to each of them) until the end of the block. The files are
+        locked in sorted order and a process may lock a file again.
+        """
+        with self._thread_lock:
+            acquired = []
+            try:
+                for file in sorted(set(files)):
+                    if file in self._held:
+                        continue
+                    handle = open(f'{file}.lock', 'a')
+                    if fcntl:
+                        fcntl.flock(handle, fcntl.LOCK_EX)
+                    self._held[file] = handle
+                    acquired.append(file)
+                yield
+            finally:
+                for file in reversed(acquired):
+                    handle = self._held.pop(file)
+                    if fcntl:
+                        fcntl.flock(handle, fcntl.LOCK_UN)
+                    handle.close()
+
+    def load(self, file: str) -> list:
+        """
+        Returns all records stored in the file.
+        """
+        with open(file) as file_handle:
+            return json.load(file_handle)
+
+    def save(self, file: str, records: list):
+        """
+        Replaces the content of the file with the given records.
+        The data goes to a temporary file first which is flushed to disk
+        and then replaces the original, so an interrupted write leaves
+        the file intact.
+        """
+        temp_file = f'{file}.{os.getpid()}.tmp'
+        with open(temp_file, 'w') as file_handle:
+            json.dump(records, file_handle, indent=4, default=encode_value)
+            file_handle.flush()
+            os.fsync(file_handle.fileno())
+        os.replace(temp_file, file)
+
+    def iter_records(self, file: str):
+        """
+        Yields the records stored in the file one by one, without
+        holding the whole list in memory.
+        """
+        with open(file) as file_handle:
+            yield from iter_json_array(file_handle)
+
+    def get(self, file: str, id: int):
+        """
+        Returns the record with the given ID or None.
+        """
+        for record in self.iter_records(file):
+            if record["id"] == id:
+                return record
+        return None
+
+    def get_many(self, file: str, ids) -> dict:
+        """
+        Returns the records with the given IDs by ID, reading the file once.
+        """
+        wanted = set(ids)
+        return {record["id"]: record
+                for record in self.iter_records(file)
+                if record["id"] in wanted}
+
+    def update(self, file: str, records):
+        """
+        Updates the records with matching IDs
+        with a single read and a single write.
+        """
+        updates = {record["id"]: record for record in records}
+        with self.lock([file]):
+            data = self.load(file)
+            for record in data:
+                if record["id"] in updates:
+                    record.update(updates[record["id"]])
+            self.save(file, data)
+
+    def load_meta(self, key: str):
+        """
+        Returns a value stored in the metadata file or None.
+        """
+        try:
+            return JSONStorage.load(self, META_FILE).get(key)
+        except FileNotFoundError:
+            return None
+
+    def save_meta(self, key: str, value):
+        """
+        Stores a value in the metadata file.
+        """
+        with self.lock([META_FILE]):
+            try:
+                meta = JSONStorage.load(self, META_FILE)
+            except FileNotFoundError:
+                meta = {}
+            meta[key] = value
+            JSONStorage.save(self, META_FILE, meta)
+
+    def insert(self, file: str, record: dict):
+        """
+        Appends a new record to the file.
+        """
+        with self.lock([file]):
+            data = self.load(file)
+            data.append(record)
+            self.save(file, data)
+
+    def delete(self, file: str, id: int):
+        """
+        Removes the record with the given ID from the file.
+        """
+        with self.lock([file]):
+            data = self.load(file)
+            self.save(file, [record for record in data if record["id"] != id])
+
+    def version(self, file: str):
+        """
+        Returns a stamp (modification time and size) which
+        changes whenever the file is written, or None.
+        """
+        try:
+            stat = os.stat(file)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+
+class JournalStorage(JSONStorage):
+    """
+    JSON storage backend appending every change to a journal file
+    (one JSON record per line) next to the data file instead of
+    rewriting it. The current state is the data file with the journal
+    replayed on top of it. Once the journal grows past compact_size
+    bytes it is folded back into the data file.
+    """
+    def __init__(self, compact_size: int = 1024 * 1024):
+        super().__init__()
+        self._compact_size = compact_size
+        self._state = {}
+
+    def _journal(self, file: str) -> str:
+        return f'{file}.journal'
+
+    def _stamp(self, file: str) -> tuple:
+        """
+        Returns the modification stamp of the data file and its journal.
+        """
+        return file_stamps(file, self._journal(file))
+
+    def _records(self, file: str) -> dict:
+        """
+        Returns the current records of the file by ID, replaying the
+        journal only if the files have changed since the last call.
+        """
+        stamp = self._stamp(file)
+        if file in self._state and self._state[file][0] == stamp:
+            return self._state[file][1]
+        records = {record["id"]: record for record in super().load(file)}
+        try:
+            with open(self._journal(file)) as journal:
+                for line in journal:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    _replay(records, entry)
+        except FileNotFoundError:
+            pass
+        self._state[file] = (stamp, records)
+        return records
+
+    def _append(self, file: str, entry: dict):
+        """
+        Appends an entry to the journal and applies it to the cached state.
+        """
+        with self.lock([file]):
+            records = self._records(file)
+            with open(self._journal(file), 'a') as journal:
+                journal.write(json.dumps(entry, default=encode_value) + '\n')
+                journal.flush()
+                os.fsync(journal.fileno())
+            entry = json.loads(json.dumps(entry, default=encode_value))
+            _replay(records, entry)
+            stamp = self._stamp(file)
+            self._state[file] = (stamp, records)
+            if stamp[1][1] > self._compact_size:
+                self.compact(file)
+
+    def version(self, file: str):
+        """
+        Returns a stamp which changes whenever
+        the file or its journal is written.
+        """
+        return self._stamp(file)
+
+    def load(self, file: str) -> list:
+        """
+        Returns all records of the file with the journal applied.
+        """
+        return deepcopy(list(self._records(file).values()))
+
+    def save(self, file: str, records: list):
+        """
+        Replaces the content of the file and clears its journal.
+        """
+        super().save(file, records)
+        if os.path.exists(self._journal(file)):
+            os.remove(self._journal(file))
+        self._state.pop(file, None)
+
+    def iter_records(self, file: str):
+        """
+        Yields copies of the records of the file with the journal applied.
+        """
+        for record in list(self._records(file).values()):
+            yield deepcopy(record)
+
+    def get(self, file: str, id: int):
+        """
+        Returns the record with the given ID or None.
+        """
+        return deepcopy(self._records(file).get(id))
+
+    def get_many(self, file: str, ids) -> dict:
+        """
+        Returns the records with the given IDs by ID.
+        """
+        records = self._records(file)
+        return {id: deepcopy(records[id]) for id in set(ids) if id in records}
+
+    def update(self, file: str, records):
+        """
+        Appends updated records to the journal.
+        """
+        self._append(file, {"op": "update", "records": list(records)})
+
+    def insert(self, file: str, record: dict):
+        """
+        Appends a new record to the journal.
+        """
+        self._append(file, {"op": "insert", "record": record})
+
+    def delete(self, file: str, id: int):
+        """
+        Appends a removal of the record to the journal.
+        """
+        self._append(file, {"op": "delete", "id": id})
+
+    def compact(self, file: str):
+        """
+        Folds the journal back into the data file.
+        """
+        with self.lock([file]):
+            self.save(file, list(self._records(file).values()))
+
+
+def _replay(records: dict, entry: dict):
+    """
+    Applies a journal entry to records by ID. Replaying an entry
+    twice gives the same result, so a crash during compaction
+    does not corrupt the data.
+    """
+    if entry["op"] == "update":
+        for record in entry["records"]:
+            if record["id"] in records:
+                records[record["id"]].update(record)
+    elif entry["op"] == "insert":
+        records[entry["record"]["id"]] = entry["record"]
+    elif entry["op"] == "delete":
+        records.pop(entry["id"], None)
+
+
+class JSONLinesStorage(JSONStorage):
+    """
+    Storage backend keeping every collection in a JSON Lines file
+    (books.json in books.jsonl, one record per line) with a sidecar
+    index of the offset and length of every line (books.jsonl.idx).
+    Single records are read by seeking to their line. A changed record
+    which fits into its line is patched in place, otherwise it is
+    appended and its old line blanked. Index changes are appended to
+    the sidecar, and the file is rewritten once it is mostly blank.
+    Lines are also read under the lock, as they may be patched.
+    """
+    def __init__(self):
+        super().__init__()
+        self._state = {}
+
+    def _path(self, file: str) -> str:
+        return os.path.splitext(file)[0] + '.jsonl'
+
+    def _index_path(self, file: str) -> str:
+        return f'{self._path(file)}.idx'
+
+    def _offsets(self, file: str) -> dict:
+        """
+        Returns the offset and length of the line of every record by ID,
+        in the order the records were added. Lines appended after the
+        last index entry (e.g. after a crash) are found by scanning.
+        """
+        with self.lock([file]):
+            stamp = self.version(file)
+            if file in self._state and self._state[file][0] == stamp:
+                return self._state[file][1]
+            return self._read_offsets(file)
+
+    def _read_offsets(self, file: str) -> dict:
+        offsets = {}
+        try:
+            with open(self._index_path(file)) as index:
+                for line in index:
+                    entry = line.split()
+                    if len(entry) != 3:
+                        break
+                    id, offset, length = map(int, entry)
+                    if offset < 0:
+                        offsets.pop(id, None)
+                    else:
+                        offsets[id] = (offset, length)
+        except FileNotFoundError:
+            pass
+        covered = max((offset + length + 1
+                       for offset, length in offsets.values()), default=0)
+        if os.path.getsize(self._path(file)) > covered:
+            with open(self._path(file), 'rb') as data:
+                data.seek(covered)
+                for line in iter(data.readline, b''):
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        record = None
+                    if record is not None and line.endswith(b'\n'):
+                        offsets[record["id"]] = (covered, len(line) - 1)
+                    covered += len(line)
+            self._write_index(file, offsets)
+        self._state[file] = (self.version(file), offsets)
+        return offsets
+
+    def _write_index(self, file: str, offsets: dict):
+        temp_file = f'{self._index_path(file)}.{os.getpid()}.tmp'
+        with open(temp_file, 'w') as index:
+            for id, (offset, length) in offsets.items():
+                index.write(f'{id} {offset} {length}\n')
+        os.replace(temp_file, self._index_path(file))
+
+    def _written(self, file: str, offsets: dict):
+        """
+        Caches the offsets after a change and rewrites
+        the file if most of it is blank lines.
+        """
+        self._state[file] = (self.version(file), offsets)
+        live = sum(length + 1 for _, length in offsets.values())
+        if os.path.getsize(self._path(file)) > 2 * live + READ_SIZE:
+            self.save(file, self.load(file))
+
+    def version(self, file: str):
+        """
+        Returns a stamp which changes whenever
+        the file or its index is written.
+        """
+        return file_stamps(self._path(file), self._index_path(file))
+
+    def load(self, file: str) -> list:
+        """
+        Returns all records of the file in the order they were added.
+        """
+        with self.lock([file]):
+            offsets = self._offsets(file)
+            with open(self._path(file), 'rb') as data:
+                content = data.read()
+        return [json.loads(content[offset:offset + length])
+                for offset, length in offsets.values()]
+
+    def iter_records(self, file: str):
+        """
+        Yields the records of the file one by one,
+        reading BATCH_SIZE of them at once.
+        """
+        ids = list(self._offsets(file))
+        for start in range(0, len(ids), BATCH_SIZE):
+            batch = ids[start:start + BATCH_SIZE]
+            records = self.get_many(file, batch)
+            for id in batch:
+                if id in records:
+                    yield records[id]
+
+    def save(self, file: str, records):
+        """
+        Replaces the content of the file and its index.
+        """
+        with self.lock([file]):
+            offsets = {}
+            temp_file = f'{self._path(file)}.{os.getpid()}.tmp'
+            with open(temp_file, 'wb') as data:
+                for record in records:
+                    line = _line(record)
+                    offsets[record["id"]] = (data.tell(), len(line))
+                    data.write(line + b'\n')
+                data.flush()
+                os.fsync(data.fileno())
+            if os.path.exists(self._index_path(file)):
+                os.remove(self._index_path(file))
+            os.replace(temp_file, self._path(file))
+            self._write_index(file, offsets)
+            self._state[file] = (self.version(file), offsets)
+
+    def get(self, file: str, id: int):
+        """
+        Returns the record with the given ID or None.
+        """
+        with self.lock([file]):
+            position = self._offsets(file).get(id)
+            if position is None:
+                return None
+            with open(self._path(file), 'rb') as data:
+                data.seek(position[0])
+                return json.loads(data.read(position[1]))
+
+    def get_many(self, file: str, ids) -> dict:
+        """
+        Returns the records with the given IDs by ID,
+        reading their lines in the order of the file.
+        """
+        records = {}
+        with self.lock([file]):
+            offsets = self._offsets(file)
+            positions = sorted((offsets[id], id) for id in set(ids)
+                               if id in offsets)
+            with open(self._path(file), 'rb') as data:
+                for (offset, length), id in positions:
+                    data.seek(offset)
+                    records[id] = json.loads(data.read(length))
+        return records
+
+    def update(self, file: str, records):
+        """
+        Patches the lines of the updated records in place,
+        or appends the records which have grown.
+        """
+        with self.lock([file]):
+            offsets = self._offsets(file)
+            with open(self._path(file), 'r+b') as data, \
+                    open(self._index_path(file), 'a') as index:
+                for record in records:
+                    if record["id"] not in offsets:
+                        continue
+                    offset, length = offsets[record["id"]]
+                    data.seek(offset)
+                    current = json.loads(data.read(length))
+                    current.update(json.loads(_line(record)))
+                    line = _line(current)
+                    if len(line) <= length:
+                        data.seek(offset)
+                        data.write(line.ljust(length))
+                        continue
+                    data.seek(0, os.SEEK_END)
+                    offsets[record["id"]] = (data.tell(), len(line))
+                    data.write(line + b'\n')
+                    data.seek(offset)
+                    data.write(b' ' * length)
+                    index.write(f'{record["id"]} {offsets[record["id"]][0]} ' +
+                                f'{len(line)}\n')
+                _sync(data, index)
+            self._written(file, offsets)
+
+    def insert(self, file: str, record: dict):
+        """
+        Appends a new record to the file.
+        """
+        with self.lock([file]):
+            offsets = self._offsets(file)
+            line = _line(record)
+            with open(self._path(file), 'ab') as data, \
+                    open(self._index_path(file), 'a') as index:
+                offset = data.seek(0, os.SEEK_END)
+                data.write(line + b'\n')
+                offsets[record["id"]] = (offset, len(line))
+                index.write(f'{record["id"]} {offset} {len(line)}\n')
+                _sync(data, index)
+            self._written(file, offsets)
+
+    def delete(self, file: str, id: int):
+        """
+        Blanks the line of the record with the given ID.
+        """
+        with self.lock([file]):
+            offsets = self._offsets(file)
+            if id not in offsets:
+                return
+            offset, length = offsets.pop(id)
+            with open(self._path(file), 'r+b') as data, \
+                    open(self._index_path(file), 'a') as index:
+                data.seek(offset)
+                data.write(b' ' * length)
+                index.write(f'{id} -1 0\n')
+                _sync(data, index)
+            self._written(file, offsets)
+
+    def import_from(self, storage):
+        """
+        Copies books, users and librarians from another storage backend.
+        """
+        for file in TABLES:
+            self.save(file, storage.iter_records(file))
+
+
+def _line(record: dict) -> bytes:
+    """
+    Returns the record as a single line of compact JSON.
+    """
+    return json.dumps(
+        record, separators=(',', ':'), default=encode_value
+    ).encode()
+
+
+def _sync(*file_handles):
+    for file_handle in file_handles:
+        file_handle.flush()
+        os.fsync(file_handle.fileno())
+
+
+def file_stamps(*paths) -> tuple:
+    """
+    Returns the modification time and size of every file (or None).
+    """
+    stamps = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stamps.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            stamps.append(None)
+    return tuple(stamps)
+
+
+class SQLiteStorage:
+    """
+    Storage backend keeping every collection in indexed SQLite tables.
+    Single records are inserted, updated and deleted row by row.
+    """
+    def __init__(self, path: str = 'library.db'):
+        import sqlite3
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._thread_lock = RLock()
+        self._lock_depth = 0
+        self._create_tables()
+
+    @contextmanager
+    def lock(self, files):
+        """
+        Holds the write lock of the database until the end of the block.
+        All changes made in the block are committed together at its end,
+        or rolled back on error.
+        """
+        with self._thread_lock:
+            if self._lock_depth:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            self._connection.execute('BEGIN IMMEDIATE')
+            self._lock_depth = 1
+            try:
+                yield
+            except BaseException:
+                self._connection.rollback()
+                raise
+            else:
+                self._connection.commit()
+            finally:
+                self._lock_depth = 0
+
+    @contextmanager
+    def _writing(self):
+        """
+        Runs the block in a transaction of its own,
+        or in the one of the lock being held.
+        """
+        with self._thread_lock:
+            if self._lock_depth:
+                yield
+            else:
+                with self._connection:
+                    yield
+
+    def _create_tables(self):
+        with self._writing():
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS meta '
+                '(key TEXT PRIMARY KEY, value TEXT)'
+            )
+            for table, columns, lists in TABLES.values():
+                self._connection.execute(
+                    f'CREATE TABLE IF NOT EXISTS {table} '
+                    f'(id INTEGER NOT NULL UNIQUE, {", ".join(columns)})'
+                )
+                for column in INDEXED_COLUMNS[table]:
+                    self._connection.execute(
+                        f'CREATE INDEX IF NOT EXISTS {table}_{column} '
+                        f'ON {table} ({column})'
+                    )
+                for field in lists:
+                    self._connection.execute(
+                        f'CREATE TABLE IF NOT EXISTS {table}_{field} '
+                        '(owner_id INTEGER NOT NULL, position INTEGER '
+                        'NOT NULL, value, PRIMARY KEY (owner_id, position))'
+                    )
+                    self._connection.execute(
+                        f'CREATE INDEX IF NOT EXISTS {table}_{field}_value '
+                        f'ON {table}_{field} (value)'
+                    )
+
+    def _schema(self, file: str):
+        try:
+            return TABLES[file]
+        except KeyError:
+            raise UnknownStorageError(file)
+
+    def _row_to_record(self, file: str, row: tuple, lists: dict) -> dict:
+        table, columns, fields = self._schema(file)
+        record = {"id": row[0]}
+        record.update(zip(columns, row[1:]))
+        for field in fields:
+            record[field] = lists[field].get(row[0], [])
+        return record
+
+    def _lists(self, table: str, fields: tuple, ids=None) -> dict:
+        lists = {}
+        for field in fields:
+            query = f'SELECT owner_id, value FROM {table}_{field}'
+            params = ()
+            if ids is not None:
+                query += f' WHERE owner_id IN ({", ".join("?" * len(ids))})'
+                params = tuple(ids)
+            query += ' ORDER BY owner_id, position'
+            values = lists[field] = {}
+            for owner_id, value in self._connection.execute(query, params):
+                values.setdefault(owner_id, []).append(value)
+        return lists
+
+    def _write_lists(self, table: str, fields: tuple, record: dict):
+        for field in fields:
+            if field not in record:
+                continue
+            self._connection.execute(
+                f'DELETE FROM {table}_{field} WHERE owner_id = ?',
+                (record["id"],)
+            )
+            self._connection.executemany(
+                f'INSERT INTO {table}_{field} VALUES (?, ?, ?)',
+                [(record["id"], position, value)
+                 for position, value in enumerate(record[field])]
+            )
+
+    def _insert(self, file: str, record: dict):
+        table, columns, fields = self._schema(file)
+        values = [_column_value(record.get(column)) for column in columns]
+        self._connection.execute(
+            f'INSERT INTO {table} (id, {", ".join(columns)}) '
+            f'VALUES ({", ".join("?" * (len(columns) + 1))})',
+            [record["id"], *values]
+        )
+        self._write_lists(table, fields, record)
+
+    def load(self, file: str) -> list:
+        """
+        Returns all records of the collection in insertion order.
+        """
+        table, columns, fields = self._schema(file)
+        lists = self._lists(table, fields)
+        rows = self._connection.execute(
+            f'SELECT id, {", ".join(columns)} FROM {table} ORDER BY rowid'
+        )
+        return [self._row_to_record(file, row, lists) for row in rows]
+
+    def iter_records(self, file: str):
+        """
+        Yields the records of the collection in insertion order,
+        querying BATCH_SIZE of them at once.
+        """
+        table, columns, fields = self._schema(file)
+        last = 0
+        while True:
+            rows = self._connection.execute(
+                f'SELECT rowid, id, {", ".join(columns)} FROM {table} '
+                'WHERE rowid > ? ORDER BY rowid LIMIT ?',
+                (last, BATCH_SIZE)
+            ).fetchall()
+            if not rows:
+                return
+            lists = self._lists(table, fields, [row[1] for row in rows])
+            for row in rows:
+                yield self._row_to_record(file, row[1:], lists)
+            last = rows[-1][0]
+
+    def save(self, file: str, records):
+        """
+        Replaces the whole collection with the given records.
+        """
+        table, columns, fields = self._schema(file)
+        with self._writing():
+            self._connection.execute(f'DELETE FROM {table}')
+            for field in fields:
+                self._connection.execute(f'DELETE FROM {table}_{field}')
+            for record in records:
+                self._insert(file, record)
+
+    def get(self, file: str, id: int):
+        """
+        Returns the record with the given ID or None.
+        """
+        table, columns, fields = self._schema(file)
+        row = self._connection.execute(
+            f'SELECT id, {", ".join(columns)} FROM {table} WHERE id = ?',
+            (id,)
+        ).fetchone()
+        if not row:
+            return None
+        lists = self._lists(table, fields, [id])
+        return self._row_to_record(file, row, lists)
+
+    def get_many(self, file: str, ids) -> dict:
+        """
+        Returns the records with the given IDs by ID,
+        querying them in batches.
+        """
+        table, columns, fields = self._schema(file)
+        ids = list(set(ids))
+        records = {}
+        for start in range(0, len(ids), BATCH_SIZE):
+            batch = ids[start:start + BATCH_SIZE]
+            lists = self._lists(table, fields, batch)
+            rows = self._connection.execute(
+                f'SELECT id, {", ".join(columns)} FROM {table} '
+                f'WHERE id IN ({", ".join("?" * len(batch))})',
+                batch
+            )
+            for row in rows:
+                records[row[0]] = self._row_to_record(file, row, lists)
+        return records
+
+    def update(self, file: str, records):
+        """
+        Updates the rows of the given records in a single transaction.
+        """
+        table, columns, fields = self._schema(file)
+        with self._writing():
+            for record in records:
+                changed = [column for column in columns if column in record]
+                if changed:
+                    self._connection.execute(
+                        f'UPDATE {table} SET ' +
+                        ', '.join(f'{column} = ?' for column in changed) +
+                        ' WHERE id = ?',
+                        [*(_column_value(record[column])
+                           for column in changed), record["id"]]
+                    )
+                exists = self._connection.execute(
+                    f'SELECT 1 FROM {table} WHERE id = ?', (record["id"],)
+                ).fetchone()
+                if exists:
+                    self._write_lists(table, fields, record)
+
+    def insert(self, file: str, record: dict):
+        """
+        Inserts a new record.
+        """
+        with self._writing():
+            self._insert(file, record)
+
+    def delete(self, file: str, id: int):
+        """
+        Deletes the record with the given ID.
+        """
+        table, columns, fields = self._schema(file)
+        with self._writing():
+            self._connection.execute(
+                f'DELETE FROM {table} WHERE id = ?', (id,)
+            )
+            for field in fields:
+                self._connection.execute(
+                    f'DELETE FROM {table}_{field} WHERE owner_id = ?', (id,)
+                )
+
+    def load_meta(self, key: str):
+        """
+        Returns a value stored in the meta table or None.
+        """
+        row = self._connection.execute(
+            'SELECT value FROM meta WHERE key = ?', (key,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_meta(self, key: str, value):
+        """
+        Stores a value in the meta table.
+        """
+        with self._writing():
+            self._connection.execute(
+                'INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                (key, json.dumps(value))
+            )
+
+    def version(self, file: str):
+        """
+        Returns a number which changes whenever another connection
+        commits to the database (for any of the tables).
+        """
+        return self._connection.execute('PRAGMA data_version').fetchone()[0]
+
+    def import_from(self, storage):
+        """
+        Copies books, users and librarians from another storage backend.
+        """
+        for file in TABLES:
+            self.save(file, storage.iter_records(file))
+
+    def close(self):
+        self._connection.close()
+
+
+def iter_json_array(file_handle, read_size: int = READ_SIZE):
+    """
+    Yields the items of a JSON array read from a file one by one.
+    The file is read in chunks, so only the current item and
+    a chunk of the text are kept in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    expected = '['
+    while True:
+        position = _WHITESPACE.match(buffer, position).end()
+        if position == len(buffer):
+            chunk = file_handle.read(read_size)
+            if not chunk:
+                raise json.JSONDecodeError(
+                    'Unexpected end of data', buffer, position
+                )
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        char = buffer[position]
+        if expected == '[':
+            if char != '[':
+                raise json.JSONDecodeError('Expecting "["', buffer, position)
+            position += 1
+            expected = 'item or ]'
+        elif char == ']' and expected != 'item':
+            return
+        elif expected == ', or ]':
+            if char != ',':
+                raise json.JSONDecodeError('Expecting ","', buffer, position)
+            position += 1
+            expected = 'item'
+        else:
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    end = None
+                # An item is complete once it is followed by "," or "]",
+                # otherwise it may continue in the next chunk.
+                if end is not None:
+                    after = _WHITESPACE.match(buffer, end).end()
+                    if buffer[after:after + 1] in (',', ']'):
+                        break
+                chunk = file_handle.read(read_size)
+                if not chunk:
+                    if end is None:
+                        raise json.JSONDecodeError(
+                            'Unexpected end of data', buffer, position
+                        )
+                    break
+                buffer, position = buffer[position:] + chunk, 0
+            yield item
+            position = end
+            expected = ', or ]'
+
+
+def encode_value(value):
+    """
+    Converts values which JSON does not support: dates
+    to ISO strings and arrays of IDs to lists.
+    """
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, array):
+        return value.tolist()
+    raise TypeError(f'Cannot store a value of type {type(value).__name__}.')
+
+
+def _column_value(value):
+    """
+    Converts dates to ISO strings, the same way they are stored in JSON.
+    """
+    return encode_value(value) if isinstance(value, date) else value
+
+
+BACKENDS = {
+    'json': JSONStorage,
+    'journal': JournalStorage,
+    'jsonl': JSONLinesStorage,
+    'sqlite': lambda: SQLiteStorage(
+        os.environ.get('LIBRARY_DB', 'library.db')
+    ),
+}
+
+_storage = None
+
+
+def get_storage():
+    """
+    Returns the storage backend in use. The backend is chosen with the
+    LIBRARY_STORAGE environment variable ('json' by default,
+    'journal', 'jsonl' or 'sqlite'), and its writes are grouped
+    if LIBRARY_DURABILITY asks for it (see write_buffer).
+    """
+    global _storage
+    if _storage is None:
+        from write_buffer import buffered
+        name = os.environ.get('LIBRARY_STORAGE', 'json')
+        if name not in BACKENDS:
+            raise UnknownStorageError(name)
+        _storage = buffered(BACKENDS[name]())
+    return _storage
+
+
+def set_storage(storage):
+    """
+    Replaces the storage backend in use.
+    """
+    global _storage
+    _storage = storage
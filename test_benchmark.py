@@ -0,0 +1,15 @@
+from benchmark import time_to_first_prompt
+import subprocess
+import sys
+
+
+def test_time_to_first_prompt():
+    assert 0 < time_to_first_prompt() < 30
+
+
+def test_main_defers_heavy_imports():
+    check = ('import sys, main; ' +
+             'print(sorted({"matplotlib", "prettytable", "sqlite3"} & ' +
+             'set(sys.modules)), main.library._library)')
+    output = subprocess.check_output([sys.executable, '-c', check], text=True)
+    assert output.strip() == '[] None'
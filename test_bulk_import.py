@@ -0,0 +1,90 @@
+from bulk_import import read_rows, book_from_row, import_books
+from json_methods import read_json
+from generate_id import load_allocator
+from errors import (
+    EmptyTitleError,
+    NoGenreError,
+    InvalidRowError,
+    InvalidReleaseYearError,
+)
+import json
+import pytest
+
+
+CSV_ROWS = '''title,author,release_year,genre
+Nineteen Eighty-Four,George Orwell,1949,Dystopian fiction
+,Albert Camus,1947,Novel
+Animal Farm,George Orwell,1945,Satire
+'''
+
+
+def test_read_rows_jsonl(tmp_path):
+    path = tmp_path / 'books.jsonl'
+    path.write_text('{"title": "1984"}\n\nnot json\n[1]\n')
+    assert list(read_rows(str(path))) == [
+        (1, {"title": '1984'}),
+        (3, None),
+        (4, None),
+    ]
+
+
+def test_book_from_row():
+    book = book_from_row({"title": ' 1984 ', "author": 'George Orwell',
+                          "release_year": '1949', "genre": 'Dystopian'})
+    assert (book.title, book.release_year) == ('1984', 1949)
+    with pytest.raises(EmptyTitleError):
+        book_from_row({"title": '', "author": 'George Orwell',
+                       "release_year": '1949', "genre": 'Dystopian'})
+    with pytest.raises(NoGenreError):
+        book_from_row({"title": '1984', "author": 'George Orwell',
+                       "release_year": 1949})
+    with pytest.raises(InvalidRowError):
+        book_from_row(None)
+
+
+@pytest.mark.parametrize('year', ['19x9', '-1949', 1949.0, -1949, True])
+def test_book_from_row_invalid_year(year):
+    with pytest.raises(InvalidReleaseYearError):
+        book_from_row({"title": '1984', "author": 'George Orwell',
+                       "release_year": year, "genre": 'Dystopian'})
+
+
+def test_import_books_csv(library, tmp_path):
+    path = tmp_path / 'books.csv'
+    path.write_text(CSV_ROWS)
+    count = len(library.books)
+    imported, errors = import_books(str(path), library)
+    assert imported == 2
+    assert errors == [(3, 'The title cannot be empty.')]
+    books = read_json('books.json')
+    assert len(books) == count + 2
+    assert [book["title"] for book in books[-2:]] == \
+        ['Nineteen Eighty-Four', 'Animal Farm']
+    assert len({book["id"] for book in books}) == len(books)
+    assert books[-1]["release_year"] == 1945
+    assert library.search_book_by_keyword('animal farm')[0][0] == \
+        books[-1]["id"]
+    assert 'Satire' in library.facet_counts('genre')
+    assert library.refresh() == []
+
+
+def test_import_books_dry_run(library, tmp_path):
+    path = tmp_path / 'books.jsonl'
+    path.write_text(json.dumps({"title": '1984', "author": 'George Orwell',
+                                "release_year": 1949, "genre": 'Novel'}))
+    books = read_json('books.json')
+    assert import_books(str(path), library, dry_run=True) == (1, [])
+    assert read_json('books.json') == books
+
+
+def test_import_books_releases_ids(library, tmp_path, monkeypatch):
+    path = tmp_path / 'books.csv'
+    path.write_text(CSV_ROWS)
+    free = load_allocator('books.json').state()
+
+    def add_new_books(books):
+        raise OSError
+    monkeypatch.setattr(library, 'add_new_books', add_new_books)
+    with pytest.raises(OSError):
+        import_books(str(path), library)
+    assert load_allocator('books.json').state() == free
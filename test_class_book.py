@@ -1,4 +1,5 @@
 from class_book import Book
+from array import array
 from generate_id import generate_book_id
 import pytest
 from class_library import Library
@@ -11,10 +12,13 @@ from errors import (
     NegativeExtensionsError,
 )
 
+# IDs are allocated and saved with the data, so the tests run on copies
+# of the data files.
+pytestmark = pytest.mark.usefixtures('library_dir')
+
 
 def test_generate_book_id(monkeypatch):
-    def return_id(range1, range2): return 1111
-    monkeypatch.setattr('generate_id.randint', return_id)
+    monkeypatch.setattr('generate_id.allocate_id', lambda file: 1111)
     id = generate_book_id()
     book = Book(id, '1984', 'George Orwell', 1949, 'Dystopian fiction')
     assert book.id == 1111
@@ -208,6 +212,17 @@ def test_book_set_return_dates_default():
     assert book.return_date == date.today() + timedelta(days=30)
 
 
+def test_book_set_return_date_on_call(monkeypatch):
+    class Tomorrow(date):
+        @classmethod
+        def today(cls):
+            return date.today() + timedelta(days=1)
+    book = Book(1111, '1984', 'George Orwell', 1949, 'Dystopian fiction')
+    monkeypatch.setattr('class_book.date', Tomorrow)
+    book.set_return_date()
+    assert book.return_date == date.today() + timedelta(days=31)
+
+
 def test_book_set_return_dates_none():
     id = generate_book_id()
     book = Book(id, '1984', 'George Orwell', 1949, 'Dystopian fiction')
@@ -258,3 +273,49 @@ def test_book_reservation_info():
                                            'George Orwell',
                                            1,
                                            None]
+
+
+def test_book_slots():
+    book = Book(1111, '1984', 'George Orwell', 1949, 'Dystopian fiction')
+    with pytest.raises(AttributeError):
+        book.publisher = 'Secker & Warburg'
+
+
+def test_book_compact():
+    book = Book(1111,
+                '1984',
+                'George Orwell',
+                1949,
+                'Dystopian fiction',
+                loan_history=[2222, 3333],
+                reservations=[4444, 5555],
+                compact=True)
+    assert isinstance(book.loan_history, array)
+    assert book.reservation_info(5555)[3] == 2
+    book._reservations.remove(4444)
+    assert book.__dict__()["loan_history"] == [2222, 3333]
+    assert book.__dict__()["reservations"] == [5555]
+
+
+def test_book_return_date_parsed_lazily():
+    book = Book(1111,
+                '1984',
+                'George Orwell',
+                1949,
+                'Dystopian fiction',
+                return_date='2024-01-30')
+    assert book.__dict__()["return_date"] == '2024-01-30'
+    assert book._return_date == '2024-01-30'
+    assert book.return_date == date(2024, 1, 30)
+    assert book._return_date == date(2024, 1, 30)
+
+
+def test_book_extend_unparsed_return_date():
+    book = Book(1111,
+                '1984',
+                'George Orwell',
+                1949,
+                'Dystopian fiction',
+                return_date='2024-01-30')
+    book.extend_return_date()
+    assert book.return_date == date(2024, 2, 29)
@@ -6,10 +6,13 @@ from errors import (
     ShortPasswordError,
 )
 
+# IDs are allocated and saved with the data, so the tests run on copies
+# of the data files.
+pytestmark = pytest.mark.usefixtures('library_dir')
+
 
 def test_generate_librarian_id(monkeypatch):
-    def return_id(range1, range2): return 1111
-    monkeypatch.setattr('generate_id.randint', return_id)
+    monkeypatch.setattr('generate_id.allocate_id', lambda file: 1111)
     id = generate_librarian_id()
     librarian = Librarian(id, 'Adam Nowak', 'admin123')
     assert librarian.id == 1111
@@ -1,4 +1,5 @@
-from class_library import Library
+from class_library import Library, LazyLibrary
+from storage import JSONStorage
 from class_book import Book
 from class_user import User, Librarian
 from json_methods import read_json, write_json
@@ -7,7 +8,11 @@ from generate_id import (
     generate_user_id,
     generate_librarian_id
 )
+import class_library
 import pytest
+from datetime import date, timedelta
+from threading import Thread
+from time import sleep
 from errors import (
     NoBookIDError,
     NoUserIDError,
@@ -25,6 +30,10 @@ from errors import (
     RemoveYourselfError,
 )
 
+# IDs are allocated and saved with the data, so the tests run on copies
+# of the data files.
+pytestmark = pytest.mark.usefixtures('library_dir')
+
 
 def test_create_library():
     library = Library()
@@ -496,6 +505,36 @@ def test_library_get_users_stats():
     write_json('users.json', library.users)
 
 
+def test_library_top_books_and_users():
+    id = generate_book_id()
+    book = Book(id, '1984', 'George Orwell', 1949, 'Dystopian fiction',
+                loan_history=[2222, 3333])
+    id2 = generate_book_id()
+    book2 = Book(id2, 'The Plague', 'A. Camus', 1947, 'Philosophical novel',
+                 loan_history=[4444])
+    id3 = generate_user_id()
+    user = User(id3, 'Jan Kowalski', 'haslo123', borrowing_history=[1111])
+    library = Library()
+    library._books = []
+    library._users = []
+    library.add_new_book(book2)
+    library.add_new_book(book)
+    library.add_new_user(user)
+    assert library.top_books(1) == {f'1984 ({id})': 2}
+    assert library.top_books() == {
+        f'1984 ({id})': 2,
+        f'The Plague ({id2})': 1
+    }
+    assert library.top_users() == {f'Jan Kowalski ({id3})': 1}
+    assert library.book_loans(id) == 2
+    assert library.user_loans(id3) == 1
+    library.update_data()
+    del library._books[-2:]
+    del library._users[-1]
+    write_json('books.json', library.books)
+    write_json('users.json', library.users)
+
+
 def test_library_login_user_check():
     id = generate_user_id()
     user = User(id, 'Jan Kowalski', 'haslo123')
@@ -577,3 +616,245 @@ def test_library_search_user_not_found():
     library._users = []
     with pytest.raises(KeywordNotFoundError):
         library.search_user('test')
+
+
+def test_library_get_book():
+    id = generate_book_id()
+    book = Book(id, '1984', 'George Orwell', 1949, 'Dystopian fiction')
+    library = Library()
+    library.add_new_book(book)
+    assert library.get_book(id) == book.__dict__()
+    library.remove_book(id)
+    assert library.get_book(id) is None
+
+
+def test_library_get_book_replaced_list():
+    library = Library()
+    library._books = [{"id": 1111, "title": '1984'}]
+    assert library.get_book(1111) == {"id": 1111, "title": '1984'}
+
+
+def test_library_get_user_and_librarian():
+    id = generate_user_id()
+    user = User(id, 'Jan Kowalski', 'haslo123')
+    id2 = generate_librarian_id()
+    librarian = Librarian(id2, 'Adam Nowak', 'admin123')
+    library = Library()
+    library.add_new_user(user)
+    library.add_new_librarian(librarian)
+    assert library.get_user(id) == user.__dict__()
+    assert library.get_librarian(id2) == librarian.__dict__()
+    assert library.get_user(id2) is None
+    library.remove_user(id)
+    library.remove_librarian(id2, generate_librarian_id())
+    assert library.get_user(id) is None
+    assert library.get_librarian(id2) is None
+
+
+def test_library_search_book_by_keyword_terms():
+    id = generate_book_id()
+    book = Book(id, 'Animal Farm', 'George Orwell', 1945, 'Political satire')
+    library = Library()
+    library.add_new_book(book)
+    assert library.search_book_by_keyword('orw anim') == [book.list_info()]
+    with pytest.raises(KeywordNotFoundError):
+        library.search_book_by_keyword('orwell plague')
+    library.remove_book(id)
+    with pytest.raises(KeywordNotFoundError):
+        library.search_book_by_keyword('animal farm')
+
+
+def test_library_facet_counts():
+    id = generate_book_id()
+    book = Book(id, '1984', 'George Orwell', 1949, 'Dystopian fiction')
+    id2 = generate_book_id()
+    book2 = Book(id2, 'Animal Farm', 'George Orwell', 1945, 'Political satire')
+    library = Library()
+    library._books = []
+    library.add_new_book(book)
+    library.add_new_book(book2)
+    assert library.facet_counts('author') == {'George Orwell': 2}
+    assert library.facet_counts('release_year') == {'1949': 1, '1945': 1}
+    assert library.search_book_by_author('George Orwell') == [
+        book.list_info(),
+        book2.list_info()
+    ]
+    library.remove_book(id)
+    library.remove_book(id2)
+    with pytest.raises(GenresNotFoundError):
+        library.facet_counts('genre')
+
+
+def test_library_is_librarian():
+    id = generate_librarian_id()
+    librarian = Librarian(id, 'Adam Nowak', 'admin123')
+    library = Library()
+    library.add_new_librarian(librarian)
+    assert library.is_librarian(id)
+    library.remove_librarian(id, generate_librarian_id())
+    assert not library.is_librarian(id)
+
+
+def test_library_follows_borrow_and_return():
+    id = generate_user_id()
+    user = User(id, 'Jan Kowalski', 'haslo123')
+    id2 = generate_book_id()
+    book = Book(id2, '1984', 'George Orwell', 1949, 'Dystopian fiction')
+    library = Library()
+    library.add_new_user(user)
+    library.add_new_book(book)
+    assert library.book_loans(id2) == 0
+    user.borrow_book(id2)
+    assert library.book_loans(id2) == 1
+    assert library.user_loans(id) == 1
+    return_date = date.today() + timedelta(days=30)
+    assert library.get_book(id2)["current_owner"] == id
+    assert library.get_book(id2)["return_date"] == str(return_date)
+    assert library.get_user(id)["borrowed_books"] == [id2]
+    today = return_date - timedelta(days=3)
+    approaching = library.approaching_books(today)
+    assert [id2, '1984', id, return_date, 3] in approaching
+    user.return_book(id2)
+    assert library.get_book(id2)["current_owner"] is None
+    assert id2 not in [info[0] for info in library.approaching_books(today)]
+    library.remove_book(id2)
+    library.remove_user(id)
+
+
+def test_library_overdue_books():
+    id = generate_book_id()
+    book = Book(id,
+                '1984',
+                'George Orwell',
+                1949,
+                'Dystopian fiction',
+                current_owner=2222,
+                return_date='2024-01-30')
+    library = Library()
+    library._books = []
+    library.add_new_book(book)
+    today = date(2024, 2, 1)
+    assert library.overdue_books(today) == [
+        [id, '1984', 2222, date(2024, 1, 30), -2]
+    ]
+    assert library.approaching_books(today) == []
+    assert library.overdue_books(date(2024, 1, 30)) == []
+    assert library.approaching_books(date(2024, 1, 25)) == [
+        [id, '1984', 2222, date(2024, 1, 30), 5]
+    ]
+    library.update_data()
+    del library._books[-1]
+    write_json('books.json', library.books)
+
+
+def test_library_return_date_check_overdue():
+    id = generate_user_id()
+    id2 = generate_book_id()
+    user = User(id, 'Jan Kowalski', 'haslo123', borrowed_books=[id2])
+    yesterday = date.today() - timedelta(days=1)
+    book = Book(id2,
+                '1984',
+                'George Orwell',
+                1949,
+                'Dystopian fiction',
+                current_owner=id,
+                return_date=str(yesterday))
+    library = Library()
+    library.add_new_user(user)
+    library.add_new_book(book)
+    assert str(id2) in library.return_date_check(id)
+    assert 'has passed' in library.return_date_check(id)
+    library.update_data()
+    del library._books[-1]
+    del library._users[-1]
+    write_json('books.json', library.books)
+    write_json('users.json', library.users)
+
+
+def test_lazy_library():
+    lazy = LazyLibrary()
+    assert lazy._library is None
+    assert lazy.is_librarian(-1) is False
+    assert isinstance(lazy._library, Library)
+
+
+def test_library_refresh(library_dir):
+    library = Library()
+    id = generate_user_id()
+    user = User(id, 'Jan Kowalski', 'haslo123')
+    id2 = generate_book_id()
+    book = Book(id2, '1984', 'George Orwell', 1949, 'Dystopian fiction')
+    library.add_new_user(user)
+    library.add_new_book(book)
+    user.borrow_book(id2)
+    assert library.refresh() == []
+    assert library.get_book(id2)["current_owner"] == id
+    books = read_json('books.json')
+    books[-1]["title"] = 'Nineteen Eighty-Four'
+    write_json('books.json', books)
+    assert library.refresh() == ['books']
+    assert library.get_book(id2)["title"] == 'Nineteen Eighty-Four'
+    assert library.refresh() == []
+
+
+def test_library_refresh_applies_changed_records(library_dir):
+    library = Library()
+    first, second = library.books[0], library.books[1]
+    genres = library.facet_counts('genre')
+    books = read_json('books.json')
+    books[0]["genre"] = 'Graphic novel'
+    del books[1]
+    books.append(dict(books[-1], id=generate_book_id(), title='Copy'))
+    write_json('books.json', books)
+    assert library.refresh() == ['books']
+    assert library.books[0] is first
+    assert first["genre"] == 'Graphic novel'
+    assert second not in library.books
+    assert library.get_book(second["id"]) is None
+    assert library.books[-1]["title"] == 'Copy'
+    assert library.facet_counts('genre')['Graphic novel'] == 1
+    assert sum(library.facet_counts('genre').values()) == sum(genres.values())
+
+
+def test_library_write_does_not_skip_other_changes(library_dir, monkeypatch):
+    library = Library()
+    other_terminal = JSONStorage()
+    books = read_json('books.json')
+    books[0]["title"] = 'Nineteen Eighty-Four'
+
+    def write_books():
+        with other_terminal.lock(['books.json']):
+            other_terminal.save('books.json', books)
+    writer = Thread(target=write_books)
+
+    def data_version(file):
+        version = read_version(file)
+        if writer.ident is None:
+            writer.start()
+            sleep(0.1)
+        return version
+    read_version = class_library.data_version
+    monkeypatch.setattr(class_library, 'data_version', data_version)
+    library.add_new_book(Book(1111, '1984', 'George Orwell', 1949, 'Novel'))
+    writer.join()
+    assert library.refresh() == ['books']
+    assert library.get_book(books[0]["id"])["title"] == 'Nineteen Eighty-Four'
+
+
+def test_remove_book_borrowed_elsewhere(library_dir):
+    library = Library()
+    book = library.get_book(4631)
+    JSONStorage().update('books.json', [dict(book, current_owner=9876)])
+    with pytest.raises(BorrowedBookError):
+        library.remove_book(4631)
+    assert JSONStorage().get('books.json', 4631) is not None
+
+
+def test_remove_user_borrowing_elsewhere(library_dir):
+    library = Library()
+    library.add_new_user(User(2222, 'Jan Kowalski', 'haslo123'))
+    user = library.get_user(2222)
+    JSONStorage().update('users.json', [dict(user, borrowed_books=[4631])])
+    with pytest.raises(UserWithBooksError):
+        library.remove_user(2222)
+    assert JSONStorage().get('users.json', 2222) is not None
@@ -3,6 +3,7 @@ from class_book import Book
 from class_library import Library
 from generate_id import generate_user_id, generate_book_id
 from json_methods import write_json
+import transaction
 import pytest
 from datetime import date, timedelta
 from errors import (
@@ -19,10 +20,13 @@ from errors import (
     NotReservedError,
 )
 
+# IDs are allocated and saved with the data, so the tests run on copies
+# of the data files.
+pytestmark = pytest.mark.usefixtures('library_dir')
+
 
 def test_generate_user_id(monkeypatch):
-    def return_id(range1, range2): return 2222
-    monkeypatch.setattr('generate_id.randint', return_id)
+    monkeypatch.setattr('generate_id.allocate_id', lambda file: 2222)
     id = generate_user_id()
     user = User(id, 'Jan Kowalski', 'haslo123')
     assert user.id == 2222
@@ -662,3 +666,68 @@ def test_user_search_info():
     user = User(id, 'Jan Kowalski', 'haslo123')
     result = [id, 'Jan Kowalski', 'haslo123', None, None, None]
     assert user.search_info() == result
+
+
+def test_user_borrow_book_single_write(monkeypatch):
+    id = generate_user_id()
+    user = User(id, 'Jan Kowalski', 'haslo123')
+    id2 = generate_book_id()
+    book = Book(id2, '1984', 'George Orwell', 1949, 'Dystopian fiction')
+    library = Library()
+    library.add_new_user(user)
+    library.add_new_book(book)
+    writes = []
+
+    def update_records(file, records):
+        writes.append(file)
+        write_records(file, records)
+    write_records = transaction.update_records
+    monkeypatch.setattr(transaction, 'update_records', update_records)
+    user.borrow_book(id2)
+    assert sorted(writes) == ['books.json', 'users.json']
+    writes.clear()
+    user.return_book(id2)
+    assert sorted(writes) == ['books.json', 'users.json']
+    monkeypatch.setattr(transaction, 'update_records', write_records)
+    library.update_data()
+    library.remove_user(id)
+    library.remove_book(id2)
+
+
+def test_user_get_history_single_read(monkeypatch):
+    id = generate_user_id()
+    id2 = generate_book_id()
+    book = Book(id2, '1984', 'George Orwell', 1949, 'Dystopian fiction')
+    user = User(id, 'Jan Kowalski', 'haslo123',
+                borrowing_history=[id2, 1, id2])
+    library = Library()
+    library.add_new_book(book)
+    reads = []
+
+    def iter_records(storage, file):
+        reads.append(file)
+        yield book.__dict__()
+    with monkeypatch.context() as patch:
+        patch.setattr('storage.JSONStorage.iter_records', iter_records)
+        assert user.get_history() == [book.history_info(),
+                                      book.history_info()]
+    assert reads == ['books.json']
+    library.remove_book(id2)
+
+
+def test_user_compact():
+    user = User(2222, 'Jan Kowalski', 'haslo123',
+                borrowed_books=[1111],
+                borrowing_history=[1111, 3333],
+                compact=True)
+    user._borrowed_books.append(3333)
+    assert user.__dict__() == {
+        "id": 2222,
+        "name": 'Jan Kowalski',
+        "password": 'haslo123',
+        "borrowed_books": [1111, 3333],
+        "reservations": [],
+        "borrowing_history": [1111, 3333],
+    }
+    with pytest.raises(AttributeError):
+        user.email = 'jan@example.com'
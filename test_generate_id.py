@@ -1,51 +1,198 @@
 from generate_id import (
+    IdAllocator,
     generate_id,
     generate_book_id,
     generate_librarian_id,
     generate_user_id,
+    load_allocator,
+    reserved_id,
+    id_ranges,
+    MAX_ID,
+    MAX_BRANCH,
+    BRANCH_SIZE,
 )
+from class_book import Book
+from class_user import User
+from json_methods import read_json
+from storage import BACKENDS, set_storage
+from errors import (
+    IdRangeExhaustedError,
+    UnknownIdSpaceError,
+    ShortPasswordError,
+    InvalidBranchError,
+)
+import multiprocessing
+import pytest
+
+# IDs are allocated and saved with the data, so the tests run on copies
+# of the data files.
+pytestmark = pytest.mark.usefixtures('library_dir')
+
+
+def test_generate_id():
+    assert generate_id(1000, 10000, []) == 1000
+
+
+def test_generate_id_used():
+    books = [Book(1000, '1984', 'George Orwell', 1949, 'Dystopian fiction'),
+             Book(1001, '1984', 'George Orwell', 1949, 'Dystopian fiction')]
+    assert generate_id(1000, 1002, books) == 1002
+
+
+def test_generate_id_exhausted():
+    books = [Book(1000, '1984', 'George Orwell', 1949, 'Dystopian fiction')]
+    with pytest.raises(IdRangeExhaustedError):
+        generate_id(1000, 1000, books)
 
 
-def test_generate_id(monkeypatch):
-    def return_id(range1, range2): return 1111
-    monkeypatch.setattr('generate_id.randint', return_id)
-    assert generate_id(1000, 10000, []) == 1111
+def test_id_allocator_from_ids():
+    allocator = IdAllocator.from_ids(1, 10, [3, 4, 7, 12])
+    assert allocator.state()["free"] == [[1, 2], [5, 6], [8, 10]]
+    assert [allocator.allocate() for _ in range(7)] == [8, 9, 10, 5, 6, 1, 2]
+    with pytest.raises(IdRangeExhaustedError):
+        allocator.allocate()
 
 
-def test_generate_id_wrong(monkeypatch):
-    def return_id(range1, range2): return 1111
-    monkeypatch.setattr('generate_id.randint', return_id)
-    assert not generate_id(1000, 10000, []) == 2222
+def test_id_allocator_release():
+    allocator = IdAllocator(1, 2)
+    assert allocator.allocate() == 1
+    assert allocator.allocate() == 2
+    allocator.release(1)
+    allocator.release(1)
+    allocator.release(5)
+    assert allocator.allocate() == 1
+    with pytest.raises(IdRangeExhaustedError):
+        allocator.allocate()
 
 
-def test_generate_book_id(monkeypatch):
-    def return_id(range1, range2): return 1111
-    monkeypatch.setattr('generate_id.randint', return_id)
-    assert generate_book_id() == 1111
+def test_id_allocator_state():
+    allocator = IdAllocator.from_ids(1, 10, [3])
+    allocator.allocate()
+    state = allocator.state()
+    copy = IdAllocator(state["min_id"], state["max_id"], state["free"])
+    assert copy.allocate() == allocator.allocate()
+
+
+def test_load_allocator_without_state(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'books.json').write_text('[{"id": 1000}, {"id": 1002}]')
+    allocator = load_allocator('books.json')
+    assert not allocator.is_free(1000)
+    assert allocator.is_free(1001)
+    assert not allocator.is_free(1002)
+
+
+def test_generate_book_id_unused():
+    ids = [book_info["id"] for book_info in read_json('books.json')]
+    id = generate_book_id()
+    assert id not in ids
+    assert generate_book_id() != id
 
 
 def test_generate_book_id_range():
     id = generate_book_id()
-    assert 1000 <= id <= 9999
+    assert 1000 <= id <= MAX_ID
 
 
-def test_generate_user_id(monkeypatch):
-    def return_id(range1, range2): return 2222
-    monkeypatch.setattr('generate_id.randint', return_id)
-    assert generate_user_id() == 2222
+def test_generate_user_id_unused():
+    ids = [user_info["id"] for user_info in read_json('users.json')]
+    assert generate_user_id() not in ids
 
 
 def test_generate_user_id_range():
     id = generate_user_id()
-    assert 2000 <= id <= 9999
+    assert 2000 <= id <= MAX_ID
 
 
-def test_generate_librarian_id(monkeypatch):
-    def return_id(range1, range2): return 1234
-    monkeypatch.setattr('generate_id.randint', return_id)
-    assert generate_librarian_id() == 1234
+def test_generate_librarian_id_unused():
+    ids = [info["id"] for info in read_json('librarians.json')]
+    assert generate_librarian_id() not in ids
 
 
 def test_generate_librarian_id_range():
     id = generate_librarian_id()
     assert 1000 <= id <= 1999
+
+
+def test_id_ranges_legacy(monkeypatch):
+    monkeypatch.setenv('LIBRARY_ID_SPACE', 'legacy')
+    assert id_ranges() == {
+        'books.json': (1000, 9999),
+        'users.json': (2000, 9999),
+        'librarians.json': (1000, 1999),
+    }
+
+
+def test_id_ranges_branch(monkeypatch):
+    monkeypatch.setenv('LIBRARY_BRANCH', '3')
+    ranges = id_ranges()
+    assert ranges['books.json'] == (3 * BRANCH_SIZE, 4 * BRANCH_SIZE - 1)
+    assert ranges['users.json'] == (3 * BRANCH_SIZE, 4 * BRANCH_SIZE - 1)
+    assert ranges['librarians.json'] == (1000, 1999)
+
+
+@pytest.mark.parametrize('branch', ['0', '-1', 'x', str(MAX_BRANCH + 1)])
+def test_id_ranges_invalid_branch(monkeypatch, branch):
+    monkeypatch.setenv('LIBRARY_BRANCH', branch)
+    with pytest.raises(InvalidBranchError):
+        id_ranges()
+
+
+def test_id_ranges_last_branch(monkeypatch):
+    monkeypatch.setenv('LIBRARY_BRANCH', str(MAX_BRANCH))
+    assert id_ranges()['users.json'][1] <= MAX_ID
+
+
+def test_id_ranges_unknown(monkeypatch):
+    monkeypatch.setenv('LIBRARY_ID_SPACE', 'tiny')
+    with pytest.raises(UnknownIdSpaceError):
+        id_ranges()
+
+
+def test_load_allocator_range_changed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'books.json').write_text('[{"id": 9999}]')
+    monkeypatch.setenv('LIBRARY_ID_SPACE', 'legacy')
+    allocator = load_allocator('books.json')
+    assert allocator.max_id == 9999
+    monkeypatch.setenv('LIBRARY_ID_SPACE', 'wide')
+    assert load_allocator('books.json').allocate() == 10000
+
+
+def allocate_user_ids(name, count, ids):
+    set_storage(BACKENDS[name]())
+    for _ in range(count):
+        ids.put(generate_user_id())
+
+
+@pytest.mark.parametrize('name', ['json', 'sqlite'])
+def test_concurrent_allocation(name, monkeypatch):
+    monkeypatch.setenv('LIBRARY_DB', 'library.db')
+    context = multiprocessing.get_context('fork')
+    ids = context.Queue()
+    workers = [context.Process(target=allocate_user_ids,
+                               args=(name, 20, ids)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    allocated = [ids.get(timeout=30) for _ in range(80)]
+    for worker in workers:
+        worker.join()
+    assert len(set(allocated)) == 80
+
+
+def test_release_merges_range():
+    allocator = IdAllocator(1, 10)
+    id = allocator.allocate()
+    allocator.release(id)
+    assert allocator.state()["free"] == [[1, 10]]
+
+
+def test_reserved_id_released_on_error():
+    free = load_allocator('users.json').state()
+    with pytest.raises(ShortPasswordError):
+        with reserved_id('users.json') as id:
+            User(id, 'Jan Kowalski', 'haslo')
+    assert load_allocator('users.json').state() == free
+    with reserved_id('users.json') as id:
+        pass
+    assert not load_allocator('users.json').is_free(id)
@@ -0,0 +1,147 @@
+from indexes import (
+    tokenize,
+    IdIndex,
+    InvertedIndex,
+    FacetIndex,
+    DueDateIndex,
+    CountIndex,
+)
+from datetime import date
+
+BOOKS = [
+    {"id": 1111, "title": '1984', "author": 'George Orwell',
+     "genre": 'Dystopian fiction', "release_year": 1949},
+    {"id": 2222, "title": 'The Plague', "author": 'Albert Camus',
+     "genre": 'Philosophical novel', "release_year": 1947},
+    {"id": 3333, "title": 'Animal Farm', "author": 'George Orwell',
+     "genre": 'Political satire', "release_year": 1945},
+]
+
+
+def search_index():
+    index = InvertedIndex(('title', 'author', 'genre', 'release_year'))
+    for book in BOOKS:
+        index.add(book)
+    return index
+
+
+def test_tokenize():
+    assert tokenize('The Plague, A. Camus') == ['the', 'plague', 'a', 'camus']
+    assert tokenize(1984) == ['1984']
+
+
+def test_id_index():
+    index = IdIndex()
+    index.add(BOOKS[0])
+    assert index[1111] == BOOKS[0]
+    index.remove(BOOKS[0])
+    assert index == {}
+
+
+def test_inverted_index_word():
+    assert search_index().search('orwell') == [1111, 3333]
+
+
+def test_inverted_index_prefix():
+    assert search_index().search('Phil') == [2222]
+    assert search_index().search('194') == [1111, 2222, 3333]
+
+
+def test_inverted_index_all_terms():
+    assert search_index().search('george farm') == [3333]
+    assert search_index().search('george plague') == []
+
+
+def test_inverted_index_remove():
+    index = search_index()
+    index.remove(BOOKS[2])
+    assert index.search('orwell') == [1111]
+    assert index.search('farm') == []
+
+
+def test_inverted_index_empty_query():
+    assert search_index().search('...') == []
+
+
+def test_facet_index():
+    index = FacetIndex('author')
+    for book in BOOKS:
+        index.add(book)
+    assert index.counts() == {'George Orwell': 2, 'Albert Camus': 1}
+    assert index.ids('George Orwell') == [1111, 3333]
+    assert 'Albert Camus' in index
+    index.remove(BOOKS[1])
+    assert 'Albert Camus' not in index
+    assert index.ids('Albert Camus') == []
+
+
+def test_facet_index_key():
+    index = FacetIndex('release_year', str)
+    index.add(BOOKS[0])
+    assert index.counts() == {'1949': 1}
+
+
+def test_due_date_index():
+    index = DueDateIndex()
+    index.add({"id": 1111, "current_owner": 2222, "return_date": '2024-01-30'})
+    index.add({"id": 3333, "current_owner": 2222, "return_date": '2024-01-10'})
+    index.add({"id": 4444, "current_owner": None, "return_date": None})
+    index.add({"id": 5555, "current_owner": 6666,
+               "return_date": date(2024, 1, 20)})
+    assert index.due_date(5555) == '2024-01-20'
+    assert index.due_date(4444) is None
+    assert index.due_between() == [3333, 5555, 1111]
+    assert index.due_between(last=date(2024, 1, 20)) == [3333]
+    assert index.due_between(date(2024, 1, 10), '2024-01-31') == [5555, 1111]
+
+
+def test_due_date_index_update():
+    index = DueDateIndex()
+    old = {"id": 1111, "current_owner": 2222, "return_date": '2024-01-30'}
+    index.add(old)
+    index.update(old, dict(old, return_date='2024-02-29'))
+    assert index.due_between(last='2024-02-01') == []
+    index.update(old, dict(old, current_owner=None, return_date=None))
+    assert index.due_between() == []
+
+
+def test_facet_index_update_keeps_order():
+    index = FacetIndex('genre')
+    for book in BOOKS:
+        index.add(book)
+    index.update(BOOKS[0], dict(BOOKS[0], current_owner=2222))
+    assert list(index.counts()) == [
+        'Dystopian fiction', 'Philosophical novel', 'Political satire'
+    ]
+
+
+def test_inverted_index_update():
+    index = search_index()
+    index.update(BOOKS[0], dict(BOOKS[0], title='Nineteen Eighty-Four'))
+    assert index.search('nineteen') == [1111]
+    assert index.search('orwell') == [1111, 3333]
+
+
+def test_count_index():
+    index = CountIndex('loan_history')
+    index.add({"id": 1111, "loan_history": [2222, 3333]})
+    index.add({"id": 2222, "loan_history": []})
+    index.add({"id": 3333, "loan_history": [4444]})
+    assert index.count(1111) == 2
+    assert index.count(4444) == 0
+    assert list(index.items()) == [(1111, 2), (2222, 0), (3333, 1)]
+    assert index.top(2) == [(1111, 2), (3333, 1)]
+    index.update({"id": 2222, "loan_history": []},
+                 {"id": 2222, "loan_history": [1, 2, 3]})
+    assert index.top(1) == [(2222, 3)]
+    index.remove({"id": 2222})
+    assert index.count(2222) == 0
+
+
+def test_due_date_index_months():
+    index = DueDateIndex()
+    index.add({"id": 1111, "current_owner": 2222, "return_date": '2024-02-03'})
+    index.add({"id": 3333, "current_owner": 2222, "return_date": '2024-01-30'})
+    index.add({"id": 4444, "current_owner": 5555, "return_date": '2024-02-20'})
+    index.add({"id": 6666, "current_owner": None, "return_date": None})
+    assert index.months() == {'2024-01': 1, '2024-02': 2}
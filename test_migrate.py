@@ -0,0 +1,68 @@
+from migrate import migrate_ids, convert_to_jsonl, convert_to_json
+from generate_id import BRANCH_SIZE, generate_book_id
+from json_methods import read_json, write_json
+from errors import InvalidBranchError
+import pytest
+
+
+@pytest.fixture
+def data_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_json('books.json', [{
+        "id": 1111,
+        "title": '1984',
+        "current_owner": 2222,
+        "loan_history": [3333, 2222],
+        "reservations": [3333],
+    }])
+    write_json('users.json', [
+        {"id": 2222, "borrowed_books": [1111],
+         "reservations": [], "borrowing_history": [1111]},
+        {"id": 3333, "borrowed_books": [],
+         "reservations": [1111], "borrowing_history": [1111]},
+    ])
+
+
+def test_migrate_ids(data_files):
+    offset = 2 * BRANCH_SIZE
+    migrate_ids(2)
+    migrate_ids(2)
+    assert read_json('books.json') == [{
+        "id": offset + 1111,
+        "title": '1984',
+        "current_owner": offset + 2222,
+        "loan_history": [offset + 3333, offset + 2222],
+        "reservations": [offset + 3333],
+    }]
+    assert read_json('users.json') == [
+        {"id": offset + 2222, "borrowed_books": [offset + 1111],
+         "reservations": [], "borrowing_history": [offset + 1111]},
+        {"id": offset + 3333, "borrowed_books": [],
+         "reservations": [offset + 1111],
+         "borrowing_history": [offset + 1111]},
+    ]
+
+
+def test_migrate_ids_invalid_branch(data_files):
+    books = read_json('books.json')
+    with pytest.raises(InvalidBranchError):
+        migrate_ids(0)
+    assert read_json('books.json') == books
+
+
+def test_migrate_ids_allocator(data_files, monkeypatch):
+    generate_book_id()
+    migrate_ids(2)
+    monkeypatch.setenv('LIBRARY_BRANCH', '2')
+    assert generate_book_id() == 2 * BRANCH_SIZE + 1112
+
+
+def test_convert_to_jsonl_and_back(data_files, tmp_path):
+    write_json('librarians.json', [{"id": 1, "name": 'Anna'}])
+    books = read_json('books.json')
+    convert_to_jsonl()
+    assert (tmp_path / 'books.jsonl').read_text().count('\n') == 1
+    (tmp_path / 'books.json').unlink()
+    convert_to_json()
+    assert read_json('books.json') == books
+    assert read_json('librarians.json') == [{"id": 1, "name": 'Anna'}]
@@ -0,0 +1,47 @@
+from overdue_notices import loan_notices, write_notices
+from json_methods import write_json
+from datetime import date
+import json
+
+
+BOOKS = [
+    {"id": 1111, "title": '1984', "current_owner": 2222,
+     "return_date": '2024-01-30'},
+    {"id": 3333, "title": 'The Plague', "current_owner": 2222,
+     "return_date": '2024-02-03'},
+    {"id": 4444, "title": 'Animal Farm', "current_owner": 5555,
+     "return_date": '2024-02-20'},
+    {"id": 6666, "title": 'The Stranger', "current_owner": None,
+     "return_date": None},
+    {"id": 7777, "title": 'Ulysses', "current_owner": 5555,
+     "return_date": '2024-02-01'},
+]
+
+
+def test_loan_notices():
+    notices = list(loan_notices(BOOKS, date(2024, 2, 1)))
+    assert [(n["book_id"], n["status"], n["days_left"]) for n in notices] == [
+        (1111, 'overdue', -2),
+        (3333, 'approaching', 2),
+    ]
+
+
+def test_write_notices(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_json('books.json', BOOKS)
+    write_json('users.json', [{"id": 2222, "name": 'Jan Kowalski'}])
+    assert write_notices('outbox.jsonl', date(2024, 2, 1)) == 2
+    with open('outbox.jsonl') as outbox:
+        notices = [json.loads(line) for line in outbox]
+    assert notices[0] == {
+        "user_id": 2222,
+        "book_id": 1111,
+        "title": '1984',
+        "return_date": '2024-01-30',
+        "days_left": -2,
+        "status": 'overdue',
+        "name": 'Jan Kowalski',
+        "date": '2024-02-01',
+    }
+    assert write_notices('outbox.jsonl', date(2024, 1, 1)) == 0
+    assert (tmp_path / 'outbox.jsonl').read_text() == ''
@@ -0,0 +1,130 @@
+from server import LibraryService, LibraryClient, serve
+from class_library import Library
+from class_book import Book
+from class_user import User, Librarian
+from generate_id import generate_book_id
+from storage import encode_value
+import asyncio
+import json
+from time import sleep
+import pytest
+
+
+@pytest.fixture
+def library(library_dir):
+    library = Library()
+    library.add_new_user(User(2222, 'Jan Kowalski', 'haslo123'))
+    library.add_new_librarian(Librarian(3333, 'Anna Nowak', 'haslo123'))
+    return library
+
+
+def with_client(library, test):
+    async def run():
+        server = await serve(LibraryService(library), port=0)
+        client = LibraryClient(port=server.sockets[0].getsockname()[1])
+        await client.connect()
+        try:
+            return await test(client)
+        finally:
+            await client.close()
+            server.close()
+            await server.wait_closed()
+    return asyncio.run(run())
+
+
+def test_server_borrow_and_return(library):
+    id = generate_book_id()
+    library.add_new_book(
+        Book(id, '1984', 'George Orwell', 1949, 'Dystopian fiction'))
+
+    async def test(client):
+        login = await client.request('login', id=2222, password='haslo123')
+        token = login["result"]["token"]
+        assert login["result"]["role"] == 'user'
+        borrow = await client.request('borrow', token=token, book_id=id)
+        assert borrow["ok"]
+        again = await client.request('borrow', token=token, book_id=id)
+        assert again["type"] == 'UsersBookError'
+        borrowed = await client.request('borrowed_books', token=token)
+        assert [row[0] for row in borrowed["result"]] == [id]
+        back = await client.request('return_book', token=token, book_id=id)
+        assert back["ok"]
+    with_client(library, test)
+    assert library.get_book(id)["loan_history"] == [2222]
+    assert library.get_user(2222)["borrowed_books"] == []
+
+
+def test_server_serializes_writes(library):
+    ids = [generate_book_id() for _ in range(5)]
+    for id in ids:
+        library.add_new_book(
+            Book(id, '1984', 'George Orwell', 1949, 'Dystopian fiction'))
+
+    async def test():
+        service = LibraryService(library)
+        service.start()
+        login = await service.login(2222, 'haslo123')
+        responses = await asyncio.gather(*(
+            service.handle({"op": 'borrow', "args": {
+                "token": login["token"], "book_id": id}})
+            for id in ids
+        ))
+        await service.stop()
+        return responses
+    assert all(response["ok"] for response in asyncio.run(test()))
+    assert sorted(library.get_user(2222)["borrowed_books"]) == sorted(ids)
+
+
+def test_server_reads(library):
+    async def test(client):
+        search = await client.request('search', keyword='a')
+        rows = library.search_book_by_keyword('a')
+        assert search["result"] == json.loads(
+            json.dumps(rows, default=encode_value))
+        facets = await client.request('facets', field='genre')
+        assert facets["result"] == library.facet_counts('genre')
+        empty = await client.request('search', keyword='')
+        assert empty["type"] == 'NoKeywordError'
+    with_client(library, test)
+
+
+def test_server_sessions(library):
+    async def test(client):
+        user = await client.request('login', id=2222, password='haslo123')
+        stats = await client.request('stats', token=user["result"]["token"])
+        assert stats["type"] == 'LibrarianOnlyError'
+        librarian = await client.request('login', id=3333,
+                                         password='haslo123')
+        stats = await client.request('stats',
+                                     token=librarian["result"]["token"])
+        assert stats["result"]["books"] == library.top_books(10)
+        wrong = await client.request('login', id=2222, password='wrong')
+        assert wrong["type"] == 'WrongPasswordError'
+        missing = await client.request('borrow', token='x', book_id=1)
+        assert missing["type"] == 'NotLoggedInError'
+        unknown = await client.request('_write', operation=None)
+        assert unknown["type"] == 'UnknownOperationError'
+    with_client(library, test)
+
+
+def test_server_invalid_request(library):
+    async def test(client):
+        client._writer.write(b'not json\n')
+        return await client._reader.readline()
+    assert b'Invalid request' in with_client(library, test)
+
+
+def test_server_reads_during_write(library):
+    async def test():
+        service = LibraryService(library)
+        service.start()
+        done = []
+        write = asyncio.ensure_future(
+            service._write(lambda: sleep(0.5) or done.append('write')))
+        await asyncio.sleep(0.05)
+        await service.handle({"op": 'search', "args": {"keyword": 'a'}})
+        done.append('read')
+        await write
+        await service.stop()
+        return done
+    assert asyncio.run(test()) == ['read', 'write']
@@ -0,0 +1,86 @@
+from snapshot import write_snapshot, CatalogSnapshot, open_snapshot
+from json_methods import read_json, write_json
+from class_book import Book
+from errors import (
+    NoKeywordError,
+    KeywordNotFoundError,
+    UnavailableGenreError,
+    UnavailableYearError,
+)
+import pytest
+
+
+@pytest.fixture
+def snapshot(library):
+    write_snapshot('catalog.snap')
+    snapshot = CatalogSnapshot('catalog.snap')
+    yield snapshot
+    snapshot.close()
+
+
+def test_snapshot_get_book(library, snapshot):
+    assert len(snapshot) == len(library.books)
+    for book_info in read_json('books.json'):
+        assert snapshot.get_book(book_info["id"]) == book_info
+    assert snapshot.get_book(-1) is None
+
+
+def test_snapshot_matches_library(library, snapshot):
+    assert snapshot.available_books_info() == library.available_books_info()
+    for field in ('genre', 'author', 'release_year'):
+        counts = library.facet_counts(field)
+        assert snapshot.facet_counts(field) == counts
+        for value in counts:
+            assert snapshot.search_book_by_facet(field, value) == (
+                library.search_book_by_facet(field, value))
+
+
+def test_snapshot_keyword_search(library, snapshot):
+    book_info = library.books[0]
+    keywords = [
+        book_info["title"],
+        book_info["author"][:3],
+        f'{book_info["genre"]} {book_info["release_year"]}',
+        'a',
+    ]
+    for keyword in keywords:
+        assert snapshot.search_book_by_keyword(keyword) == (
+            library.search_book_by_keyword(keyword))
+    with pytest.raises(NoKeywordError):
+        snapshot.search_book_by_keyword('')
+    with pytest.raises(KeywordNotFoundError):
+        snapshot.search_book_by_keyword('qqqqqq')
+    with pytest.raises(KeywordNotFoundError):
+        snapshot.search_book_by_keyword('!')
+
+
+def test_snapshot_unavailable_values(snapshot):
+    with pytest.raises(UnavailableGenreError):
+        snapshot.search_book_by_genre('No such genre')
+    with pytest.raises(UnavailableYearError):
+        snapshot.search_book_by_year('0')
+
+
+def test_open_snapshot(library, snapshot, monkeypatch):
+    assert open_snapshot() is None
+    monkeypatch.setenv('LIBRARY_SNAPSHOT', 'catalog.snap')
+    assert open_snapshot().is_current()
+    books = read_json('books.json')
+    books[0]["title"] = 'Nineteen Eighty-Four'
+    write_json('books.json', books)
+    assert open_snapshot() is None
+    write_snapshot('catalog.snap')
+    current = open_snapshot()
+    assert current.get_book(books[0]["id"])["title"] == 'Nineteen Eighty-Four'
+
+
+def test_snapshot_string_year(library):
+    library.add_new_book(Book(1111, '1984', 'George Orwell', '1949', 'Novel'))
+    write_snapshot('catalog.snap')
+    snapshot = CatalogSnapshot('catalog.snap')
+    assert snapshot.get_book(1111)["release_year"] == '1949'
+    assert snapshot.search_book_by_year('1949') == (
+        library.search_book_by_year('1949'))
+    assert snapshot.facet_counts('release_year') == (
+        library.facet_counts('release_year'))
+    snapshot.close()
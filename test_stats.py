@@ -0,0 +1,87 @@
+from stats import reduce_series, stats_series, stream_series, OTHER, CHARTS
+from class_library import Library
+from json_methods import write_json
+from errors import GenresNotFoundError
+import pytest
+
+
+BOOKS = [
+    {"id": 1111, "title": '1984', "author": 'George Orwell',
+     "release_year": 1949, "genre": 'Dystopian fiction',
+     "loan_history": [2222, 3333], "current_owner": 2222,
+     "extensions": 0, "reservations": [], "return_date": '2024-01-30'},
+    {"id": 4444, "title": 'The Plague', "author": 'Albert Camus',
+     "release_year": 1947, "genre": 'Philosophical novel',
+     "loan_history": [2222], "current_owner": None,
+     "extensions": 0, "reservations": [], "return_date": None},
+    {"id": 5555, "title": 'Animal Farm', "author": 'George Orwell',
+     "release_year": 1945, "genre": 'Political satire',
+     "loan_history": [3333, 2222, 3333], "current_owner": 3333,
+     "extensions": 0, "reservations": [], "return_date": '2024-02-20'},
+]
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_json('books.json', BOOKS)
+    write_json('users.json', [])
+    write_json('librarians.json', [])
+    return Library()
+
+
+def test_reduce_series():
+    counts = {'a': 1, 'b': 5, 'c': 3, 'd': 2}
+    assert reduce_series(counts, 2) == {'b': 5, 'c': 3, OTHER: 3}
+    assert reduce_series(counts, 4) == {'b': 5, 'c': 3, 'd': 2, 'a': 1}
+
+
+def test_reduce_series_skips_empty_rest():
+    assert reduce_series({'a': 1, 'b': 0}, 1) == {'a': 1}
+
+
+def test_stats_series_top_books(library):
+    assert stats_series(library, 'books', 2) == {
+        'Animal Farm (5555)': 3,
+        '1984 (1111)': 2,
+    }
+
+
+def test_stats_series_grouped(library):
+    assert stats_series(library, 'author') == {
+        'George Orwell': 5,
+        'Albert Camus': 1,
+    }
+    assert stats_series(library, 'genre', 1) == {
+        'Political satire': 3,
+        OTHER: 3,
+    }
+    assert stats_series(library, 'release_year', 1) == {'1945': 3, OTHER: 3}
+
+
+def test_stats_series_month(library):
+    assert stats_series(library, 'month') == {'2024-01': 1, '2024-02': 1}
+    assert stats_series(library, 'month', 1) == {'2024-02': 1}
+
+
+def test_stats_series_empty(library):
+    library._books = []
+    with pytest.raises(GenresNotFoundError):
+        stats_series(library, 'genre')
+
+
+def test_stream_series_matches_library(library):
+    write_json('users.json', [
+        {"id": 2222, "name": 'Jan Kowalski', "borrowing_history": [1111]},
+        {"id": 3333, "name": 'Adam Nowak', "borrowing_history": []},
+    ])
+    library.update_data()
+    for chart in CHARTS:
+        for n in (1, 2, 20):
+            assert stream_series(chart, n) == stats_series(library, chart, n)
+
+
+def test_stream_series_empty(library):
+    write_json('books.json', [])
+    with pytest.raises(GenresNotFoundError):
+        stream_series('genre')
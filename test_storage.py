@@ -0,0 +1,317 @@
+from storage import (
+    JSONStorage,
+    JournalStorage,
+    JSONLinesStorage,
+    SQLiteStorage,
+    get_storage,
+    set_storage,
+    encode_value,
+    iter_json_array,
+)
+from class_library import Library
+from class_book import Book
+from class_user import User
+from migrate import migrate_to_sqlite
+from errors import UnknownStorageError
+from datetime import date, timedelta
+from array import array
+import io
+import json
+import pytest
+
+
+BOOK = {
+    "id": 1111,
+    "title": '1984',
+    "author": 'George Orwell',
+    "release_year": 1949,
+    "genre": 'Dystopian fiction',
+    "loan_history": [2222, 3333],
+    "current_owner": 3333,
+    "extensions": 2,
+    "reservations": [4444],
+    "return_date": '2024-01-30'
+}
+
+
+@pytest.fixture
+def sqlite_storage(tmp_path):
+    database = SQLiteStorage(str(tmp_path / 'library.db'))
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def sqlite_library(library_dir):
+    migrate_to_sqlite('library.db')
+    database = SQLiteStorage('library.db')
+    set_storage(database)
+    yield database
+    set_storage(None)
+    database.close()
+
+
+def test_sqlite_insert_get(sqlite_storage):
+    sqlite_storage.insert('books.json', BOOK)
+    assert sqlite_storage.get('books.json', 1111) == BOOK
+    assert sqlite_storage.get('books.json', 2222) is None
+
+
+def test_sqlite_load_keeps_order(sqlite_storage):
+    second = dict(BOOK, id=1000, loan_history=[], reservations=[])
+    sqlite_storage.save('books.json', [BOOK, second])
+    assert sqlite_storage.load('books.json') == [BOOK, second]
+
+
+def test_sqlite_update(sqlite_storage):
+    sqlite_storage.insert('books.json', BOOK)
+    sqlite_storage.update('books.json', [{
+        "id": 1111,
+        "current_owner": None,
+        "reservations": [],
+        "return_date": date(2024, 2, 29),
+    }])
+    book = sqlite_storage.get('books.json', 1111)
+    assert book["current_owner"] is None
+    assert book["reservations"] == []
+    assert book["return_date"] == '2024-02-29'
+    assert book["loan_history"] == [2222, 3333]
+
+
+def test_sqlite_update_missing(sqlite_storage):
+    sqlite_storage.update('books.json', [BOOK])
+    assert sqlite_storage.load('books.json') == []
+
+
+def test_sqlite_delete(sqlite_storage):
+    sqlite_storage.insert('books.json', BOOK)
+    sqlite_storage.delete('books.json', 1111)
+    assert sqlite_storage.load('books.json') == []
+    sqlite_storage.insert('books.json', dict(BOOK, loan_history=[]))
+    assert sqlite_storage.get('books.json', 1111)["loan_history"] == []
+
+
+def test_sqlite_unknown_file(sqlite_storage):
+    with pytest.raises(UnknownStorageError):
+        sqlite_storage.load('loans.json')
+
+
+def test_unknown_storage(monkeypatch):
+    monkeypatch.setenv('LIBRARY_STORAGE', 'xml')
+    set_storage(None)
+    with pytest.raises(UnknownStorageError):
+        get_storage()
+    set_storage(None)
+
+
+def test_migrate_to_sqlite(sqlite_library):
+    json_storage = JSONStorage()
+    for file in ('books.json', 'users.json', 'librarians.json'):
+        assert sqlite_library.load(file) == json_storage.load(file)
+
+
+def test_library_with_sqlite(sqlite_library):
+    library = Library()
+    user = User(2222, 'Jan Kowalski', 'haslo123')
+    book = Book(1111, '1984', 'George Orwell', 1949, 'Dystopian fiction')
+    library.add_new_user(user)
+    library.add_new_book(book)
+    user.borrow_book(1111)
+    user.use_extension(1111)
+    library.update_data()
+    assert library.get_book(1111)["current_owner"] == 2222
+    assert library.get_book(1111)["return_date"] == str(
+        date.today() + 2 * timedelta(days=30))
+    assert library.get_user(2222)["borrowed_books"] == [1111]
+    user.return_book(1111)
+    library.update_data()
+    library.remove_book(1111)
+    library.remove_user(2222)
+    assert sqlite_library.get('books.json', 1111) is None
+    assert sqlite_library.get('users.json', 2222) is None
+
+
+@pytest.fixture
+def journal_storage(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    JSONStorage().save('books.json', [BOOK])
+    return JournalStorage()
+
+
+def test_journal_update_does_not_rewrite_file(journal_storage):
+    journal_storage.update('books.json', [{"id": 1111, "current_owner": None}])
+    assert JSONStorage().load('books.json') == [BOOK]
+    assert journal_storage.get('books.json', 1111)["current_owner"] is None
+
+
+def test_journal_replay(journal_storage):
+    second = dict(BOOK, id=2222)
+    journal_storage.insert('books.json', second)
+    journal_storage.update('books.json', [{"id": 2222, "extensions": 0}])
+    journal_storage.delete('books.json', 1111)
+    assert JournalStorage().load('books.json') == [dict(second, extensions=0)]
+
+
+def test_journal_ignores_torn_entry(journal_storage):
+    journal_storage.update('books.json', [{"id": 1111, "extensions": 0}])
+    with open('books.json.journal', 'a') as journal:
+        journal.write('{"op": "delete", "id"')
+    assert JournalStorage().get('books.json', 1111)["extensions"] == 0
+
+
+def test_journal_compaction(tmp_path, journal_storage):
+    storage = JournalStorage(compact_size=1)
+    for extensions in range(3):
+        storage.update('books.json', [{"id": 1111, "extensions": extensions}])
+    assert not (tmp_path / 'books.json.journal').exists()
+    assert JSONStorage().load('books.json') == [dict(BOOK, extensions=2)]
+
+
+def test_journal_get_returns_copy(journal_storage):
+    journal_storage.get('books.json', 1111)["loan_history"].append(5555)
+    assert journal_storage.get('books.json', 1111) == BOOK
+
+
+@pytest.fixture
+def jsonl_storage(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    storage = JSONLinesStorage()
+    storage.save('books.json', [BOOK])
+    return storage
+
+
+def test_jsonl_files(tmp_path, jsonl_storage):
+    assert not (tmp_path / 'books.json').exists()
+    line = json.dumps(BOOK, separators=(',', ':'))
+    assert (tmp_path / 'books.jsonl').read_text() == line + '\n'
+    assert (tmp_path / 'books.jsonl.idx').read_text() == (
+        f'1111 0 {len(line)}\n')
+
+
+def test_jsonl_update_in_place(tmp_path, jsonl_storage):
+    size = (tmp_path / 'books.jsonl').stat().st_size
+    jsonl_storage.update('books.json', [{"id": 1111, "current_owner": None}])
+    assert (tmp_path / 'books.jsonl').stat().st_size == size
+    assert JSONLinesStorage().get('books.json', 1111) == dict(
+        BOOK, current_owner=None)
+
+
+def test_jsonl_update_appends_grown_record(jsonl_storage):
+    second = dict(BOOK, id=2222)
+    jsonl_storage.insert('books.json', second)
+    jsonl_storage.update('books.json', [
+        {"id": 1111, "loan_history": list(range(100))},
+        {"id": 3333, "title": 'Missing'},
+    ])
+    first = dict(BOOK, loan_history=list(range(100)))
+    assert JSONLinesStorage().load('books.json') == [first, second]
+    with open('books.jsonl') as data:
+        assert data.readline().strip() == ''
+
+
+def test_jsonl_delete(jsonl_storage):
+    jsonl_storage.insert('books.json', dict(BOOK, id=2222))
+    jsonl_storage.delete('books.json', 1111)
+    jsonl_storage.delete('books.json', 3333)
+    assert JSONLinesStorage().load('books.json') == [dict(BOOK, id=2222)]
+    assert JSONLinesStorage().get('books.json', 1111) is None
+
+
+def test_jsonl_rebuilds_index(tmp_path, jsonl_storage):
+    jsonl_storage.insert('books.json', dict(BOOK, id=2222))
+    (tmp_path / 'books.jsonl.idx').unlink()
+    assert JSONLinesStorage().get('books.json', 2222) == dict(BOOK, id=2222)
+    assert (tmp_path / 'books.jsonl.idx').exists()
+
+
+def test_jsonl_indexes_unindexed_lines(tmp_path, jsonl_storage):
+    with open('books.jsonl', 'a') as data:
+        data.write(json.dumps(dict(BOOK, id=2222)) + '\n')
+        data.write('{"id": 3333, "title"')
+    assert [record["id"] for record in JSONLinesStorage().load(
+        'books.json')] == [1111, 2222]
+
+
+def test_jsonl_compaction(tmp_path, jsonl_storage, monkeypatch):
+    monkeypatch.setattr('storage.READ_SIZE', 0)
+    for length in range(1, 4):
+        jsonl_storage.update('books.json', [
+            {"id": 1111, "loan_history": list(range(10 * length))}
+        ])
+    with open('books.jsonl') as data:
+        assert len(data.readlines()) < 3
+    assert jsonl_storage.get('books.json', 1111)["loan_history"] == (
+        list(range(30)))
+
+
+def test_get_many(sqlite_storage, journal_storage):
+    second = dict(BOOK, id=2222, loan_history=[])
+    storages = (JSONStorage(), journal_storage, JSONLinesStorage(),
+                sqlite_storage)
+    for storage in storages:
+        storage.save('books.json', [BOOK, second])
+        assert storage.get_many('books.json', [2222, 1111, 3333, 1111]) == {
+            1111: BOOK,
+            2222: second,
+        }
+        assert storage.get_many('books.json', []) == {}
+
+
+def test_meta(sqlite_storage, journal_storage):
+    for storage in (journal_storage, sqlite_storage):
+        assert storage.load_meta('ids') is None
+        storage.save_meta('ids', {"books.json": [[1000, 9999]]})
+        assert storage.load_meta('ids') == {"books.json": [[1000, 9999]]}
+
+
+def test_encode_value():
+    assert encode_value(date(2024, 1, 30)) == '2024-01-30'
+    assert encode_value(array('q', [1111, 2222])) == [1111, 2222]
+    with pytest.raises(TypeError):
+        encode_value({1111})
+
+
+def test_version(journal_storage):
+    JSONLinesStorage().save('books.json', [BOOK])
+    for storage in (JSONStorage(), journal_storage, JSONLinesStorage()):
+        version = storage.version('books.json')
+        storage.update('books.json', [{"id": 1111, "current_owner": None}])
+        assert storage.version('books.json') != version
+    assert JSONStorage().version('missing.json') is None
+
+
+def test_sqlite_version(tmp_path, sqlite_storage):
+    version = sqlite_storage.version('books.json')
+    sqlite_storage.insert('books.json', BOOK)
+    assert sqlite_storage.version('books.json') == version
+    other = SQLiteStorage(str(tmp_path / 'library.db'))
+    other.delete('books.json', 1111)
+    other.close()
+    assert sqlite_storage.version('books.json') != version
+
+
+@pytest.mark.parametrize('read_size', [1, 2, 7, 4096])
+def test_iter_json_array(read_size):
+    items = [BOOK, 12345, 'text', [1, [2]], {}, None, 1.5]
+    text = json.dumps(items, indent=4)
+    file_handle = io.StringIO(text)
+    assert list(iter_json_array(file_handle, read_size)) == items
+    assert list(iter_json_array(io.StringIO(' [ ] '), read_size)) == []
+
+
+@pytest.mark.parametrize(
+    'text', ['', '{}', '[1,', '[1 2]', '[{"id": 1}', '[,]']
+)
+def test_iter_json_array_invalid(text):
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_array(io.StringIO(text), 2))
+
+
+def test_iter_records(sqlite_storage, journal_storage, monkeypatch):
+    monkeypatch.setattr('storage.BATCH_SIZE', 2)
+    books = [dict(BOOK, id=id) for id in (5555, 1111, 3333, 2222, 4444)]
+    storages = (JSONStorage(), journal_storage, JSONLinesStorage(),
+                sqlite_storage)
+    for storage in storages:
+        storage.save('books.json', books)
+        assert list(storage.iter_records('books.json')) == books
@@ -0,0 +1,143 @@
+from transaction import transaction, get_record, save_record
+from json_methods import read_json, write_json, update_records, find_record
+from class_user import User
+from storage import BACKENDS, get_storage, set_storage
+from errors import RecordConflictError
+import multiprocessing
+import pytest
+
+
+@pytest.fixture
+def books_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_json('books.json', [
+        {"id": 1111, "title": '1984', "current_owner": None},
+        {"id": 2222, "title": 'The Plague', "current_owner": None},
+    ])
+    return 'books.json'
+
+
+def test_save_record_without_transaction(books_file):
+    save_record(books_file, {"id": 1111, "current_owner": 2222})
+    assert read_json(books_file)[0]["current_owner"] == 2222
+
+
+def test_transaction_single_write(books_file, monkeypatch):
+    writes = []
+
+    def count_writes(file, records):
+        writes.append((file, list(records)))
+    monkeypatch.setattr('transaction.update_records', count_writes)
+    with transaction():
+        save_record(books_file, {"id": 1111, "current_owner": 2222})
+        save_record(books_file, {"id": 2222, "current_owner": 3333})
+        save_record(books_file, {"id": 1111, "current_owner": 4444})
+    assert writes == [(books_file, [
+        {"id": 1111, "current_owner": 4444},
+        {"id": 2222, "current_owner": 3333},
+    ])]
+
+
+def test_transaction_reads_staged_changes(books_file):
+    with transaction():
+        save_record(books_file, {"id": 1111, "current_owner": 2222})
+        assert get_record(books_file, 1111) == {
+            "id": 1111, "current_owner": 2222
+        }
+        assert read_json(books_file)[0]["current_owner"] is None
+    assert read_json(books_file)[0]["current_owner"] == 2222
+
+
+def test_transaction_rollback(books_file):
+    with pytest.raises(ValueError):
+        with transaction():
+            save_record(books_file, {"id": 1111, "current_owner": 2222})
+            raise ValueError
+    assert read_json(books_file)[0]["current_owner"] is None
+
+
+def test_nested_transaction(books_file):
+    with transaction() as outer:
+        with transaction() as inner:
+            save_record(books_file, {"id": 1111, "current_owner": 2222})
+        assert inner is outer
+        assert read_json(books_file)[0]["current_owner"] is None
+    assert read_json(books_file)[0]["current_owner"] == 2222
+
+
+def test_get_record_missing(books_file):
+    assert get_record(books_file, 3333) is None
+
+
+def test_transaction_conflict(books_file):
+    with pytest.raises(RecordConflictError):
+        with transaction():
+            record = get_record(books_file, 1111)
+            update_records(books_file, [{"id": 1111, "current_owner": 3333}])
+            save_record(books_file, dict(record, current_owner=2222))
+    assert read_json(books_file)[0]["current_owner"] == 3333
+
+
+def test_transaction_removed_record_conflict(books_file):
+    with pytest.raises(RecordConflictError):
+        with transaction():
+            record = get_record(books_file, 1111)
+            write_json(books_file, read_json(books_file)[1:])
+            save_record(books_file, dict(record, current_owner=2222))
+
+
+def add_loans(name, loans):
+    set_storage(BACKENDS[name]())
+    while loans:
+        try:
+            with transaction():
+                record = get_record('books.json', 1111)
+                history = record.get("loan_history", []) + [loans[0]]
+                save_record('books.json', dict(record, loan_history=history))
+            loans.pop(0)
+        except RecordConflictError:
+            pass
+
+
+@pytest.mark.parametrize('name', ['json', 'journal', 'jsonl', 'sqlite'])
+def test_concurrent_transactions(books_file, monkeypatch, name):
+    monkeypatch.setenv('LIBRARY_DB', 'library.db')
+    storage = BACKENDS[name]()
+    storage.save(books_file, read_json(books_file))
+    set_storage(storage)
+    context = multiprocessing.get_context('fork')
+    workers = [
+        context.Process(target=add_loans, args=(name, list(range(i, 40, 4))))
+        for i in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert sorted(get_storage().get(books_file, 1111)["loan_history"]) == (
+        list(range(40)))
+    set_storage(None)
+
+
+def test_stale_user_keeps_other_changes(library_dir):
+    anna = User(**find_record('users.json', 9876))
+    zofia = User(**find_record('users.json', 9659))
+    zofia.return_book(2138)
+    assert find_record('books.json', 2138)["current_owner"] == 9876
+    anna.borrow_book(4631)
+    anna_info = find_record('users.json', 9876)
+    assert anna_info["borrowed_books"] == [8765, 2138, 4631]
+    assert anna_info["reservations"] == []
+    assert anna.borrowed_books == [8765, 2138, 4631]
+
+
+def test_user_record_conflict(library_dir):
+    anna = User(**find_record('users.json', 9876))
+    with pytest.raises(RecordConflictError):
+        with transaction():
+            anna.reload()
+            update_records('users.json', [
+                dict(find_record('users.json', 9876), reservations=[])
+            ])
+            anna.borrowed_append(4631)
+    assert find_record('users.json', 9876)["borrowed_books"] == [8765]
@@ -0,0 +1,84 @@
+from watcher import Watcher
+from class_library import Library
+from class_user import User
+from json_methods import read_json, write_json
+from migrate import convert_to_jsonl
+from storage import JSONLinesStorage, set_storage
+from queue import Queue
+from threading import Event, Thread
+
+
+def change_first_title(title):
+    books = read_json('books.json')
+    books[0]["title"] = title
+    write_json('books.json', books)
+    return books[0]["id"]
+
+
+def test_watcher_check(library):
+    watcher = Watcher(library)
+    assert watcher.check() == []
+    id = change_first_title('Nineteen Eighty-Four')
+    assert watcher.check() == ['books']
+    assert library.get_book(id)["title"] == 'Nineteen Eighty-Four'
+    assert watcher.check() == []
+
+
+def test_watcher_thread(library):
+    changes = Queue()
+    watcher = Watcher(library, interval=0.01, on_change=changes.put)
+    watcher.start()
+    id = change_first_title('Nineteen Eighty-Four')
+    assert changes.get(timeout=5) == ['books']
+    watcher.stop()
+    assert library.get_book(id)["title"] == 'Nineteen Eighty-Four'
+
+
+def test_read_during_refresh(library):
+    books = read_json('books.json')
+    new_book = dict(books[0], id=1111, loan_history=[2222, 3333])
+    done = Event()
+
+    def refresh():
+        for i in range(200):
+            write_json('books.json', books + [new_book] if i % 2 else books)
+            library.refresh()
+        done.set()
+    thread = Thread(target=refresh)
+    thread.start()
+    while not done.is_set():
+        library.get_books_stats()
+        library.available_books_info()
+        library.facet_counts('genre')
+    thread.join()
+
+
+def test_refresh_during_commit(library_dir):
+    convert_to_jsonl()
+    set_storage(JSONLinesStorage())
+    try:
+        library = Library()
+        other_terminal = JSONLinesStorage()
+        user = User(**library.get_user(9876))
+        book = library.books[0]
+
+        def borrow():
+            for _ in range(50):
+                user.borrow_book(4631)
+                user.return_book(4631)
+
+        def refresh():
+            for i in range(50):
+                other_terminal.update('books.json', [dict(book, title=str(i))])
+                library.refresh()
+        threads = [Thread(target=borrow, daemon=True),
+                   Thread(target=refresh, daemon=True)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=30)
+        assert not any(thread.is_alive() for thread in threads)
+        library.refresh()
+        assert library.get_book(book["id"])["title"] == '49'
+    finally:
+        set_storage(None)
@@ -0,0 +1,132 @@
+from write_buffer import BufferedStorage, buffered
+from storage import JSONStorage, get_storage, set_storage
+from class_library import Library
+from json_methods import update_records, find_record, lock_files
+from errors import UnknownDurabilityError
+from transaction import transaction, get_record, save_record
+from threading import Thread
+from time import sleep
+import pytest
+
+
+def first_book(storage):
+    return storage.load('books.json')[0]
+
+
+def test_buffer_merges_updates(library_dir):
+    backend = JSONStorage()
+    storage = BufferedStorage(backend, 'exit')
+    book = first_book(backend)
+    storage.update('books.json', [dict(book, title='Animal Farm')])
+    storage.update('books.json', [dict(book, title='Nineteen Eighty-Four')])
+    assert first_book(backend)["title"] == book["title"]
+    assert storage.get('books.json', book["id"])["title"] == \
+        'Nineteen Eighty-Four'
+    assert first_book(storage)["title"] == 'Nineteen Eighty-Four'
+    storage.flush()
+    assert first_book(backend)["title"] == 'Nineteen Eighty-Four'
+    storage.close()
+
+
+def test_buffer_group_size(library_dir):
+    backend = JSONStorage()
+    storage = BufferedStorage(backend, 'grouped', group_ms=10000,
+                              group_size=2)
+    books = backend.load('books.json')[:2]
+    storage.update('books.json', [dict(books[0], extensions=1)])
+    assert first_book(backend)["extensions"] == books[0]["extensions"]
+    storage.update('books.json', [dict(books[1], extensions=1)])
+    assert [book["extensions"] for book in backend.load('books.json')[:2]] \
+        == [1, 1]
+    storage.close()
+
+
+def test_buffer_group_window(library_dir):
+    backend = JSONStorage()
+    storage = BufferedStorage(backend, 'grouped', group_ms=10)
+    book = first_book(backend)
+    storage.update('books.json', [dict(book, title='Animal Farm')])
+    for _ in range(100):
+        if first_book(backend)["title"] == 'Animal Farm':
+            break
+        sleep(0.05)
+    assert first_book(backend)["title"] == 'Animal Farm'
+    storage.close()
+
+
+def test_buffer_insert_flushes(library_dir):
+    backend = JSONStorage()
+    storage = BufferedStorage(backend, 'exit')
+    book = first_book(backend)
+    storage.update('books.json', [dict(book, title='Animal Farm')])
+    storage.insert('books.json', dict(book, id=1111))
+    assert backend.get('books.json', book["id"])["title"] == 'Animal Farm'
+    assert backend.get('books.json', 1111) is not None
+    storage.close()
+
+
+def test_buffer_keeps_version(library_dir):
+    storage = BufferedStorage(JSONStorage(), 'exit')
+    version = storage.version('books.json')
+    book = first_book(storage)
+    storage.update('books.json', [dict(book, title='Animal Farm')])
+    storage.flush()
+    assert storage.version('books.json') == version
+    storage.close()
+
+
+def test_buffered_from_environment(monkeypatch):
+    backend = JSONStorage()
+    assert buffered(backend) is backend
+    monkeypatch.setenv('LIBRARY_DURABILITY', 'grouped')
+    monkeypatch.setenv('LIBRARY_GROUP_SIZE', '10')
+    storage = buffered(backend)
+    assert isinstance(storage, BufferedStorage)
+    assert storage._group_size == 10
+    storage.close()
+    monkeypatch.setenv('LIBRARY_DURABILITY', 'never')
+    with pytest.raises(UnknownDurabilityError):
+        buffered(backend)
+
+
+def test_library_with_buffer(library_dir, monkeypatch):
+    monkeypatch.setenv('LIBRARY_DURABILITY', 'exit')
+    set_storage(None)
+    try:
+        storage = get_storage()
+        assert isinstance(storage, BufferedStorage)
+        library = Library()
+        book = library.books[0]
+        update_records('books.json', [dict(book, title='Animal Farm')])
+        assert find_record('books.json', book["id"])["title"] == \
+            'Animal Farm'
+        assert library.get_book(book["id"])["title"] == 'Animal Farm'
+        assert library.refresh() == []
+        storage.close()
+    finally:
+        set_storage(None)
+
+
+def test_commits_while_timer_flushes(library_dir):
+    storage = BufferedStorage(JSONStorage(), 'grouped', group_ms=5)
+    set_storage(storage)
+    ids = [book["id"] for book in storage.load('books.json')[:2]]
+
+    def commit():
+        for i in range(100):
+            with lock_files(['books.json']):
+                for id in ids:
+                    with transaction():
+                        book = get_record('books.json', id)
+                        save_record('books.json', dict(book, extensions=i))
+                    sleep(0.002)
+    thread = Thread(target=commit, daemon=True)
+    try:
+        thread.start()
+        thread.join(timeout=30)
+    finally:
+        set_storage(None)
+    assert not thread.is_alive()
+    storage.close()
+    assert [JSONStorage().get('books.json', id)["extensions"]
+            for id in ids] == [99, 99]
@@ -0,0 +1,107 @@
+from contextlib import contextmanager
+from copy import deepcopy
+from json_methods import (
+    find_record,
+    find_records,
+    update_records,
+    lock_files,
+)
+from errors import RecordConflictError
+
+_current = None
+
+
+class Transaction:
+    """
+    Unit of work collecting the record updates of a single library
+    operation (borrow, return, extension, reservation).
+    Every record is read at most once and every file is written
+    once on commit. The transaction is optimistic: on commit the
+    records it has read are compared with their current versions
+    and nothing is written if any of them has been changed.
+    """
+    def __init__(self):
+        self._loaded = {}
+        self._read = {}
+        self._changes = {}
+
+    def get_record(self, file: str, id: int):
+        """
+        Returns the record with the given ID, including staged changes.
+        """
+        changes = self._changes.get(file, {})
+        if id in changes:
+            return changes[id]
+        if (file, id) not in self._loaded:
+            record = find_record(file, id)
+            self._loaded[(file, id)] = record
+            self._read.setdefault(file, {})[id] = deepcopy(record)
+        return self._loaded[(file, id)]
+
+    def update_record(self, file: str, record: dict):
+        """
+        Stages an updated record to be written on commit.
+        """
+        self._changes.setdefault(file, {})[record["id"]] = record
+
+    def check(self):
+        """
+        Raises RecordConflictError if a record read by the transaction
+        has been changed or removed since it was read.
+        """
+        for file, read in self._read.items():
+            current = find_records(file, read)
+            for id, record in read.items():
+                if current.get(id) != record:
+                    raise RecordConflictError(file, id)
+
+    def commit(self):
+        """
+        Checks the records read and writes all staged records, once per
+        modified file, holding the locks of the files in the meantime.
+        """
+        if self._changes:
+            with lock_files([*self._read, *self._changes]):
+                self.check()
+                for file, changes in self._changes.items():
+                    update_records(file, changes.values())
+        self._changes = {}
+
+
+@contextmanager
+def transaction():
+    """
+    Runs the enclosed block as a single transaction. Nested blocks join
+    the outer transaction. Staged changes are discarded on error.
+    """
+    global _current
+    if _current is not None:
+        yield _current
+        return
+    _current = Transaction()
+    try:
+        yield _current
+        _current.commit()
+    finally:
+        _current = None
+
+
+def get_record(file: str, id: int):
+    """
+    Returns the record with the given ID from a data file
+    (or from the current transaction) or None.
+    """
+    if _current is not None:
+        return _current.get_record(file, id)
+    return find_record(file, id)
+
+
+def save_record(file: str, record: dict):
+    """
+    Saves an updated record, either immediately
+    or on commit of the current transaction.
+    """
+    if _current is not None:
+        _current.update_record(file, record)
+    else:
+        update_records(file, [record])
@@ -0,0 +1,65 @@
+from threading import Thread, Event
+
+# Seconds between checks of the data files for changes.
+WATCH_INTERVAL = 1.0
+
+
+def _inotify(path: str):
+    """
+    Returns an inotify instance watching the directory for written
+    and replaced files, or None when inotify_simple is not installed.
+    """
+    try:
+        from inotify_simple import INotify, flags
+    except ImportError:
+        return None
+    inotify = INotify()
+    inotify.add_watch(path, flags.CLOSE_WRITE | flags.MOVED_TO | flags.DELETE)
+    return inotify
+
+
+class Watcher(Thread):
+    """
+    Background thread keeping a library in sync with the changes made
+    to the data by other processes (such as other terminals). The data
+    file versions are checked every interval, or as soon as a file in
+    the data directory is written when inotify is available, and only
+    the changed records are applied to the library.
+    """
+    def __init__(self, library, interval: float = WATCH_INTERVAL,
+                 on_change=None, path: str = '.'):
+        super().__init__(daemon=True)
+        self._library = library
+        self._interval = interval
+        self._on_change = on_change
+        self._path = path
+        self._stopped = Event()
+
+    def check(self) -> list:
+        """
+        Applies the changes made since the last check to the library.
+        Returns the names of the changed collections.
+        """
+        changed = self._library.refresh()
+        if changed and self._on_change:
+            self._on_change(changed)
+        return changed
+
+    def run(self):
+        inotify = _inotify(self._path)
+        while not self._stopped.is_set():
+            if inotify:
+                inotify.read(timeout=int(self._interval * 1000))
+            else:
+                self._stopped.wait(self._interval)
+            if not self._stopped.is_set():
+                self.check()
+        if inotify:
+            inotify.close()
+
+    def stop(self):
+        """
+        Stops the thread after the current check.
+        """
+        self._stopped.set()
+        self.join()
@@ -0,0 +1,201 @@
+import atexit
+import json
+import os
+from threading import RLock, Timer
+from time import monotonic
+from storage import encode_value
+from errors import UnknownDurabilityError
+
+# Durability levels: every update written at once, updates of a short
+# window written together, or updates written only on exit.
+DURABILITY_LEVELS = ('immediate', 'grouped', 'exit')
+
+# Default window (in milliseconds) and number of updates of a group.
+GROUP_MS = 50
+GROUP_SIZE = 100
+
+
+class BufferedStorage:
+    """
+    Write-behind buffer over a storage backend. Updated records are
+    kept in memory and merged by ID, and the updates of a group are
+    written to the backend together, in a single write per file.
+    With the 'grouped' durability a group is written once GROUP_MS
+    milliseconds have passed since its first update or once it has
+    GROUP_SIZE updates, with 'exit' on flush or exit of the process.
+    Reads see the buffered updates, while other processes see them
+    only once written, so the buffer is meant for a single process
+    owning the data (such as the library server).
+    The buffer lock is never held while calling the backend, and
+    writes take the file locks of the backend first, so a flush from
+    the timer thread cannot deadlock with a transaction commit.
+    """
+    def __init__(self, storage, durability: str = 'grouped',
+                 group_ms: float = GROUP_MS, group_size: int = GROUP_SIZE):
+        if durability not in DURABILITY_LEVELS[1:]:
+            raise UnknownDurabilityError(durability)
+        self._storage = storage
+        self._durability = durability
+        self._group_ms = group_ms
+        self._group_size = group_size
+        self._lock = RLock()
+        self._pending = {}
+        self._writing = {}
+        self._count = 0
+        self._started = None
+        self._timer = None
+        self._versions = {}
+        atexit.register(self.flush)
+
+    def __getattr__(self, name: str):
+        return getattr(self._storage, name)
+
+    def _changes(self, file: str) -> dict:
+        """
+        Returns the buffered updates of the file by ID, including
+        those being written. Taken before reading the backend, so
+        the updates are not missed if they are written in between.
+        """
+        with self._lock:
+            changes = {}
+            for buffer in (self._writing, self._pending):
+                for id, update in buffer.get(file, {}).items():
+                    changes[id] = dict(changes.get(id, {}), **update)
+            return changes
+
+    def _merged(self, changes: dict, record):
+        """
+        Returns a copy of the record with its buffered updates.
+        """
+        update = changes.get(record["id"]) if record else None
+        return dict(record, **update) if update else record
+
+    def update(self, file: str, records):
+        """
+        Buffers updated records, writing the group if it is full.
+        """
+        with self._lock:
+            pending = self._pending.setdefault(file, {})
+            for record in records:
+                record = json.loads(json.dumps(record, default=encode_value))
+                pending.setdefault(record["id"], {}).update(record)
+                self._count += 1
+            if self._started is None:
+                self._started = monotonic()
+                if self._durability == 'grouped':
+                    self._timer = Timer(self._group_ms / 1000, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+            full = self._durability == 'grouped' and (
+                self._count >= self._group_size or
+                monotonic() - self._started >= self._group_ms / 1000)
+        if full:
+            self.flush()
+
+    def flush(self, file: str = None):
+        """
+        Writes the buffered updates (of one file or of all of them),
+        a single write per file, and waits for the writes in progress.
+        """
+        while True:
+            with self._lock:
+                files = [file] if file else [*self._pending, *self._writing]
+                if not any(name in self._pending or name in self._writing
+                           for name in files):
+                    return
+            with self._storage.lock(files):
+                with self._lock:
+                    batch = {name: self._pending.pop(name) for name in files
+                             if name in self._pending}
+                    self._writing.update(batch)
+                    if not self._pending:
+                        self._count = 0
+                        self._started = None
+                        if self._timer:
+                            self._timer.cancel()
+                            self._timer = None
+                try:
+                    for name, records in batch.items():
+                        before = self.version(name)
+                        self._storage.update(name, list(records.values()))
+                        self._versions[name] = (
+                            self._storage.version(name), before
+                        )
+                finally:
+                    with self._lock:
+                        for name in batch:
+                            self._writing.pop(name, None)
+            if file:
+                return
+
+    def version(self, file: str):
+        """
+        Returns the version of the file in the backend. Writes of the
+        buffer do not change it, so only changes made by other
+        processes are noticed.
+        """
+        version = self._storage.version(file)
+        written, before = self._versions.get(file, (None, None))
+        return before if written is not None and version == written \
+            else version
+
+    def load(self, file: str) -> list:
+        changes = self._changes(file)
+        return [self._merged(changes, record)
+                for record in self._storage.load(file)]
+
+    def iter_records(self, file: str):
+        changes = self._changes(file)
+        for record in self._storage.iter_records(file):
+            yield self._merged(changes, record)
+
+    def get(self, file: str, id: int):
+        changes = self._changes(file)
+        return self._merged(changes, self._storage.get(file, id))
+
+    def get_many(self, file: str, ids) -> dict:
+        changes = self._changes(file)
+        return {id: self._merged(changes, record) for id, record
+                in self._storage.get_many(file, ids).items()}
+
+    def save(self, file: str, records):
+        with self._storage.lock([file]):
+            with self._lock:
+                self._pending.pop(file, None)
+            self._storage.save(file, records)
+
+    def insert(self, file: str, record: dict):
+        with self._storage.lock([file]):
+            self.flush(file)
+            self._storage.insert(file, record)
+
+    def delete(self, file: str, id: int):
+        with self._storage.lock([file]):
+            self.flush(file)
+            self._storage.delete(file, id)
+
+    def close(self):
+        self.flush()
+        atexit.unregister(self.flush)
+        if hasattr(self._storage, 'close'):
+            self._storage.close()
+
+
+def buffered(storage):
+    """
+    Returns the storage backend wrapped in a write buffer if the
+    LIBRARY_DURABILITY environment variable asks for one ('immediate'
+    by default, 'grouped' or 'exit'). LIBRARY_GROUP_MS and
+    LIBRARY_GROUP_SIZE set the window and size of a group.
+    """
+    durability = os.environ.get('LIBRARY_DURABILITY', 'immediate')
+    if durability not in DURABILITY_LEVELS:
+        raise UnknownDurabilityError(durability)
+    if durability == 'immediate':
+        return storage
+    return BufferedStorage(
+        storage,
+        durability,
+        float(os.environ.get('LIBRARY_GROUP_MS', GROUP_MS)),
+        int(os.environ.get('LIBRARY_GROUP_SIZE', GROUP_SIZE)),
+    )